@@ -13,136 +13,119 @@ Setup:
 2. Pull a model: ollama pull llama3.2:1b
 3. Start server: ollama serve (auto-starts on most systems)
 4. That's it! 100% free forever.
+
+Model routing:
+- model_router.py scores each request and picks FAST_MODEL (e.g. llama3.2:1b)
+  or LARGE_MODEL (e.g. llama3) when MODEL_ROUTER_ENABLED=True
+
+Prompt caching:
+- Prompts are assembled by prompt_builder.py (canonical system prompt,
+  stable history order) and carry the session_id, so follow-up turns go
+  back to the same backend and Ollama only evaluates the new tokens
+
+Backends:
+- Requests go through llm_backends.py (LLM_BACKEND=ollama, openai or dummy),
+  so a faster inference server (llama.cpp server, vLLM) is one setting away
+- The Ollama backend keeps circuit breakers, retries on other servers and
+  optional hedging (see llm_backends.py and ollama_pool.py)
 """
-import os
-import requests
+import time
 
 # Import with compatibility for both local and package mode
 try:
     from .logger import logger
+    from .model_router import model_router
+    from .prompt_builder import prompt_builder
+    from .llm_dispatcher import llm_dispatcher, INTERACTIVE
+    from .llm_backends import llm_backend
+    from . import request_timing
 except ImportError:
     from logger import logger
+    from model_router import model_router
+    from prompt_builder import prompt_builder
+    from llm_dispatcher import llm_dispatcher, INTERACTIVE
+    from llm_backends import llm_backend
+    import request_timing
 
 
-def ollama_response(prompt, timeout=60, max_retries=2):
+async def llm_response(
+    prompt,
+    timeout=None,
+    max_retries=2,
+    model=None,
+    history=None,
+    session_id=None,
+    options=None,
+    priority=INTERACTIVE
+):
     """
-    Query local Ollama AI server with system prompt and retry logic.
-    
+    Ask the configured LLM backend for an answer.
+
     Args:
         prompt: User message/question
-        timeout: Request timeout in seconds (default: 60)
-        max_retries: Number of retries on connection error (default: 2)
-    
+        timeout: Request timeout in seconds (default: OLLAMA_REQUEST_TIMEOUT)
+        max_retries: Number of retries after a server failure (default: 2)
+        model: Model to use (default: the backend's default model)
+        history: Previous conversation messages (see prompt_builder)
+        session_id: Conversation ID - keeps the session on one backend
+        options: Per-request overrides: temperature, top_p, max_tokens
+        priority: llm_dispatcher priority (INTERACTIVE or BATCH)
+
     Returns:
         str: AI response or None if failed
     """
-    ollama_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-    ollama_model = os.getenv("OLLAMA_MODEL", "llama3")
-    
-    # System prompt for Nitro AI
-    system_prompt = (
-        "You are Nitro AI, a personal AI assistant created by Mohamed Akheel. "
-        "You run locally using Ollama. "
-        "You help with coding, AI, productivity and general questions. "
-        "Never invent company information about Nitro AI."
-    )
-    
-    # Retry loop for robustness
-    for attempt in range(max_retries + 1):
-        try:
-            if attempt > 0:
-                logger.info(f"🔄 Retry attempt {attempt}/{max_retries}...")
-            else:
-                logger.info(f"🤖 Querying Ollama ({ollama_model})...")
-            
-            response = requests.post(
-                f"{ollama_url}/api/chat",
-                json={
-                    "model": ollama_model,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "stream": False,
-                    "options": {
-                        "num_predict": 800,  # Max response length
-                        "temperature": 0.7,   # Creativity vs accuracy
-                        "top_p": 0.9,
-                        "num_ctx": 2048      # Context window
-                    }
-                },
-                timeout=timeout
+    # Canonical system prompt + stable history (see prompt_builder.py)
+    messages = prompt_builder.build(prompt, history)
+
+    # Batch requests wait here until the pool has spare capacity
+    async with llm_dispatcher.slot(priority):
+        with request_timing.span("llm"):
+            return await llm_backend.generate(
+                messages,
+                model=model,
+                options=options,
+                session_id=session_id,
+                timeout=timeout,
+                max_retries=max_retries
             )
-            
-            if response.status_code == 200:
-                response_data = response.json()
-                # Extract AI response from chat API format
-                ai_text = response_data.get("message", {}).get("content", "").strip()
-                if ai_text:
-                    logger.info(f"✅ Ollama ({ollama_model}) responded successfully")
-                    return ai_text
-                logger.warning("⚠️ Ollama returned empty response")
-                # Don't retry on empty response, return None
-                return None
-            
-            logger.warning(f"⚠️ Ollama HTTP {response.status_code}")
-            # Don't retry on HTTP errors, return None
-            return None
-            
-        except requests.exceptions.ConnectionError as e:
-            if attempt < max_retries:
-                logger.warning(f"⚠️ Connection failed, retrying... ({attempt + 1}/{max_retries})")
-                continue
-            logger.error("❌ Ollama not running. Please start it with: ollama serve")
-            return None
-            
-        except requests.exceptions.Timeout as e:
-            if attempt < max_retries:
-                logger.warning(f"⏱️ Request timeout, retrying... ({attempt + 1}/{max_retries})")
-                continue
-            logger.error(f"❌ Ollama timeout after {timeout}s. Model may be loading or too slow.")
-            return None
-            
-        except Exception as e:
-            logger.error(f"❌ Ollama error: {type(e).__name__}: {str(e)}")
-            return None
-    
-    # Should never reach here, but return None as fallback
-    return None
-
-
-def get_ai_response(prompt):
+
+
+async def get_ai_response(prompt, history=None, session_id=None):
     """
-    Main AI router - uses Ollama local AI only.
-    
+    Main AI router - picks a model and asks the configured LLM backend.
+
     Args:
         prompt: User message/question
-    
+        history: Previous conversation messages (see prompt_builder)
+        session_id: Conversation ID (backend stickiness)
+
     Returns:
-        dict: {"response": str, "model": str, "source": str}
-    
+        dict: {"response": str, "model": str, "source": str, "route": str}
+
     Raises:
-        Exception: If Ollama is not available
+        Exception: If the LLM backend is not available
     """
-    ollama_model = os.getenv("OLLAMA_MODEL", "llama3")
-    
-    # Try Ollama
-    local_response = ollama_response(prompt)
-    
+    # Pick the fast or the large model for this request
+    decision = model_router.route(
+        prompt,
+        history_depth=len(history or []) // 2,
+        default_model=llm_backend.default_model
+    )
+    model = decision["model"]
+
+    start_time = time.time()
+    local_response = await llm_response(prompt, model=model, history=history, session_id=session_id)
+    model_router.record(decision, time.time() - start_time, success=bool(local_response))
+
     if local_response:
-        logger.info(f"📍 Using FREE local Ollama ({ollama_model})")
+        logger.info("📍 Using local %s (%s, %s route)", llm_backend.name, model, decision["route"])
         return {
             "response": local_response,
-            "model": ollama_model,
-            "source": "ollama_local"
+            "model": model,
+            "source": llm_backend.source,
+            "route": decision["route"]
         }
-    
-    # Ollama unavailable - provide helpful error
-    logger.error("❌ Ollama unavailable")
-    raise Exception(
-        "Ollama AI is not running. Please:\n\n"
-        "1. Install Ollama: https://ollama.com/download\n"
-        "2. Pull a model: ollama pull llama3.2:1b\n"
-        "3. Start server: ollama serve\n\n"
-        "Ollama is 100% free and runs locally on your device!"
-    )
+
+    # Backend unavailable - provide helpful error
+    logger.error("❌ LLM backend '%s' unavailable", llm_backend.name)
+    raise Exception(llm_backend.setup_hint or f"LLM backend '{llm_backend.name}' is not available.")
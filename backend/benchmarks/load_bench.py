@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+load_bench.py - End-to-end load benchmark for the FastAPI app
+Numbers we can compare between commits, without a real model
+
+What runs:
+- The app, either in this process (ASGI calls, no sockets) or a running
+  server over HTTP (--url)
+- A deterministic mock Ollama in a subprocess (mock_ollama.py), so timing
+  noise comes from our code, not from the model
+
+Scenarios:
+- chat:          POST /chat, new session each time
+- chat_session:  POST /chat as a follow-up in a session with history
+- stream:        POST /chat/stream - time to first token and gaps between frames
+- history:       GET /history/{session_id} on the pre-filled store
+- sessions:      GET /sessions/recent
+- search:        POST /search (mock search page + pages + summary)
+
+Every scenario runs at each --concurrency level and (in-process) each
+--store-sizes value (sessions pre-filled in conversation memory). Results
+(p50/p95/p99, throughput, errors) go to a JSON file:
+
+Run from the backend folder:
+    python benchmarks/load_bench.py
+    python benchmarks/load_bench.py --concurrency 1,8,32 --store-sizes 0,1000 --requests 200
+    python benchmarks/load_bench.py --url http://127.0.0.1:8000 --scenarios chat,stream
+        (start that server with OLLAMA_BASE_URLS pointing at mock_ollama.py)
+    python benchmarks/load_bench.py --compare before.json after.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(BENCH_DIR))
+
+from mock_ollama import spawn_mock_ollama
+from synthetic_store import seed_store
+
+SCENARIOS = ["chat", "chat_session", "stream", "history", "sessions", "search"]
+
+QUESTIONS = [
+    "How do I sort a list in Python?",
+    "What is a closure?",
+    "Explain async and await briefly.",
+    "Give me a tip for writing tests.",
+    "What does HTTP 503 mean?",
+]
+
+
+# ============================================================================
+# CLIENTS
+# ============================================================================
+
+class ASGIClient:
+    """
+    Calls the ASGI app directly - no sockets, so only our code is measured.
+
+    Body parts are timestamped as the app sends them (for streaming).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method: str, path: str, body: Optional[Dict] = None) -> Tuple[int, List[Tuple[float, bytes]]]:
+        """
+        Send one request.
+
+        Returns:
+            (status, [(perf_counter time, body part), ...])
+        """
+        path, _, query = path.partition("?")
+        raw = json.dumps(body).encode() if body is not None else b""
+        headers = [(b"host", b"bench"), (b"content-length", str(len(raw)).encode())]
+        if body is not None:
+            headers.append((b"content-type", b"application/json"))
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": headers,
+            "client": ("127.0.0.1", 50000),
+            "server": ("bench", 80),
+        }
+        finished = asyncio.Event()
+        request_sent = False
+        status = 500
+        parts: List[Tuple[float, bytes]] = []
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": raw, "more_body": False}
+            # The client stays connected until the response is complete
+            await finished.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                if message.get("body"):
+                    parts.append((time.perf_counter(), message["body"]))
+                if not message.get("more_body"):
+                    finished.set()
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            finished.set()
+        return status, parts
+
+    async def close(self):
+        pass
+
+
+class HTTPClient:
+    """Same interface as ASGIClient, over HTTP to a running server."""
+
+    def __init__(self, base_url: str, timeout: float = 120):
+        import aiohttp
+        self.base_url = base_url.rstrip("/")
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout))
+
+    async def request(self, method: str, path: str, body: Optional[Dict] = None):
+        parts = []
+        async with self.session.request(method, self.base_url + path, json=body) as response:
+            async for data in response.content.iter_any():
+                parts.append((time.perf_counter(), data))
+            return response.status, parts
+
+    async def close(self):
+        await self.session.close()
+
+
+def _json_body(parts) -> Optional[Dict]:
+    try:
+        return json.loads(b"".join(data for _, data in parts))
+    except ValueError:
+        return None
+
+
+def _sse_chunk_times(parts) -> List[float]:
+    """Arrival times of SSE events that carry answer text."""
+    times = []
+    buffer = b""
+    for arrived, data in parts:
+        buffer += data
+        while b"\n\n" in buffer:
+            event, buffer = buffer.split(b"\n\n", 1)
+            for line in event.split(b"\n"):
+                if line.startswith(b"data:"):
+                    try:
+                        payload = json.loads(line[5:])
+                    except ValueError:
+                        continue
+                    if payload.get("chunk"):
+                        times.append(arrived)
+    return times
+
+
+# ============================================================================
+# STATS
+# ============================================================================
+
+def percentiles(values: List[float]) -> Optional[Dict]:
+    """p50/p95/p99/max/mean in milliseconds (nearest-rank)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[max(0, min(len(ordered) - 1, int(-(-p * len(ordered) // 100)) - 1))]
+
+    return {
+        "p50": round(rank(50) * 1000, 2),
+        "p95": round(rank(95) * 1000, 2),
+        "p99": round(rank(99) * 1000, 2),
+        "max": round(ordered[-1] * 1000, 2),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 2),
+    }
+
+
+async def run_load(make_request: Callable, total: int, concurrency: int) -> Dict:
+    """
+    Run `total` requests with `concurrency` workers.
+
+    Args:
+        make_request: async fn(i) -> {"ok": bool, "latency": s, ["ttft": s, "gaps": [s]]}
+    """
+    samples = []
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            try:
+                samples.append(await make_request(i))
+            except Exception as e:
+                samples.append({"ok": False, "latency": None, "error": type(e).__name__})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    ok = [s for s in samples if s["ok"]]
+    result = {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else None,
+        "latency_ms": percentiles([s["latency"] for s in ok]),
+    }
+    if any("ttft" in s for s in ok):
+        result["ttft_ms"] = percentiles([s["ttft"] for s in ok if s.get("ttft") is not None])
+        result["inter_chunk_ms"] = percentiles([gap for s in ok for gap in s.get("gaps", [])])
+    return result
+
+
+# ============================================================================
+# SCENARIOS
+# ============================================================================
+
+class Scenarios:
+    """Request functions for each scenario; session ids are filled in by prepare()."""
+
+    def __init__(self, client):
+        self.client = client
+        self.history_sessions: List[str] = []  # sessions with a few turns (chat_session)
+        self.store_sessions: List[str] = []  # sessions of the pre-filled store (history)
+        self.rng = random.Random(7)
+
+    async def prepare(self, count: int = 20, turns: int = 3):
+        """Create sessions with real history through the API."""
+        self.history_sessions = []
+        for i in range(count):
+            status, parts = await self.client.request("POST", "/session/create", {"user_id": f"bench-{i}"})
+            session_id = (_json_body(parts) or {}).get("session_id")
+            if status != 200 or not session_id:
+                raise RuntimeError(f"/session/create failed with HTTP {status}")
+            for turn in range(turns):
+                await self.client.request("POST", "/chat", {"message": QUESTIONS[turn % len(QUESTIONS)], "session_id": session_id})
+            self.history_sessions.append(session_id)
+
+    async def chat(self, i):
+        start = time.perf_counter()
+        status, parts = await self.client.request("POST", "/chat", {"message": f"{QUESTIONS[i % len(QUESTIONS)]} ({i})"})
+        body = _json_body(parts) or {}
+        return {"ok": status == 200 and body.get("status") == "success", "latency": time.perf_counter() - start}
+
+    async def chat_session(self, i):
+        session_id = self.history_sessions[i % len(self.history_sessions)]
+        start = time.perf_counter()
+        status, parts = await self.client.request("POST", "/chat", {"message": f"And then? ({i})", "session_id": session_id})
+        body = _json_body(parts) or {}
+        return {"ok": status == 200 and body.get("status") == "success", "latency": time.perf_counter() - start}
+
+    async def stream(self, i):
+        start = time.perf_counter()
+        status, parts = await self.client.request("POST", "/chat/stream", {"message": f"{QUESTIONS[i % len(QUESTIONS)]} ({i})"})
+        chunk_times = _sse_chunk_times(parts)
+        end = parts[-1][0] if parts else time.perf_counter()
+        return {
+            "ok": status == 200 and bool(chunk_times),
+            "latency": end - start,
+            "ttft": chunk_times[0] - start if chunk_times else None,
+            "gaps": [b - a for a, b in zip(chunk_times, chunk_times[1:])],
+        }
+
+    async def history(self, i):
+        sessions = self.store_sessions or self.history_sessions
+        session_id = sessions[self.rng.randrange(len(sessions))]
+        start = time.perf_counter()
+        status, _ = await self.client.request("GET", f"/history/{session_id}")
+        return {"ok": status == 200, "latency": time.perf_counter() - start}
+
+    async def sessions(self, i):
+        start = time.perf_counter()
+        status, _ = await self.client.request("GET", "/sessions/recent?limit=20")
+        return {"ok": status == 200, "latency": time.perf_counter() - start}
+
+    async def search(self, i):
+        start = time.perf_counter()
+        query = quote(f"benchmark topic {i % 10}")
+        status, parts = await self.client.request("POST", f"/search?query={query}&summarize=true")
+        body = _json_body(parts) or {}
+        return {"ok": status == 200 and body.get("status") == "success", "latency": time.perf_counter() - start}
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _load_app(mock_url: str, workdir: Path, log_level: str):
+    """Import the app configured against the mock, with memory in a temp folder."""
+    os.environ.update({
+        "LLM_BACKEND": "ollama",
+        "OLLAMA_BASE_URLS": mock_url,
+        "MODEL_WARMUP_ENABLED": "False",
+        "ENABLE_RATE_LIMIT": "False",
+        "WEB_SEARCH_URL": f"{mock_url}/html/",
+        "LOG_LEVEL": log_level,
+    })
+    # MemoryManager stores in "../memory" relative to the working directory
+    run_dir = workdir / "backend"
+    run_dir.mkdir(parents=True, exist_ok=True)
+    os.chdir(run_dir)
+    sys.path.insert(0, str(BACKEND_DIR))
+    import main
+    return main
+
+
+async def run_benchmarks(args) -> Dict:
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    levels = [int(c) for c in args.concurrency.split(",")]
+    store_sizes = [int(s) for s in args.store_sizes.split(",")]
+
+    mock_options = {
+        "ttft_ms": args.mock_ttft_ms,
+        "tokens_per_sec": args.mock_tokens_per_sec,
+        "response_tokens": args.mock_response_tokens,
+        "parallel": args.mock_parallel,
+        "page_delay_ms": args.mock_page_delay_ms,
+    }
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "target": args.url or "in-process",
+            "requests_per_run": args.requests,
+            "mock": mock_options,
+        },
+        "runs": [],
+    }
+
+    process = None
+    if args.url:
+        client = HTTPClient(args.url)
+        lifespan = None
+        memory_manager = None
+        store_sizes = [0]  # The server's store is whatever it already has
+    else:
+        port = _free_port()
+        process, mock_url = spawn_mock_ollama(port=port, **mock_options)
+        main = _load_app(mock_url, Path(tempfile.mkdtemp(prefix="nitro-bench-")), args.log_level)
+        client = ASGIClient(main.app)
+        lifespan = main.app.router.lifespan_context(main.app)
+        memory_manager = main.memory_manager
+
+    try:
+        if lifespan is not None:
+            await lifespan.__aenter__()
+        bench = Scenarios(client)
+        await bench.prepare()
+
+        seeded = 0
+        for store_size in store_sizes:
+            if memory_manager is not None and store_size > seeded:
+                print(f"📦 Filling store to {store_size} sessions...")
+                bench.store_sessions += seed_store(memory_manager, store_size - seeded, args.messages_per_session, seed=store_size)
+                seeded = store_size
+            for concurrency in levels:
+                for name in scenarios:
+                    make_request = getattr(bench, name)
+                    await run_load(make_request, args.warmup, min(concurrency, args.warmup or 1))
+                    result = await run_load(make_request, args.requests, concurrency)
+                    run = {
+                        "key": f"{name}/c{concurrency}/s{store_size}",
+                        "scenario": name,
+                        "concurrency": concurrency,
+                        "store_size": store_size,
+                        **result,
+                    }
+                    report["runs"].append(run)
+                    latency = result["latency_ms"] or {}
+                    line = (f"{run['key']:28} {result['throughput_rps'] or 0:>8} rps  "
+                            f"p50 {latency.get('p50', '-'):>8}  p95 {latency.get('p95', '-'):>8}  "
+                            f"p99 {latency.get('p99', '-'):>8} ms  errors {result['errors']}")
+                    if "ttft_ms" in result and result["ttft_ms"]:
+                        line += f"  ttft p50 {result['ttft_ms']['p50']} ms"
+                    print(line)
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+        await client.close()
+        if process is not None:
+            process.terminate()
+            process.wait()
+    return report
+
+
+def compare(before_path: str, after_path: str):
+    """Print latency/throughput changes between two result files."""
+    with open(before_path) as f:
+        before = {r["key"]: r for r in json.load(f)["runs"]}
+    with open(after_path) as f:
+        after = {r["key"]: r for r in json.load(f)["runs"]}
+
+    def change(old, new):
+        if old in (None, 0) or new is None:
+            return "-"
+        return f"{(new - old) / old * 100:+.1f}%"
+
+    print(f"{'run':28}{'p50':>10}{'p95':>10}{'p99':>10}{'rps':>10}")
+    for key in sorted(set(before) & set(after)):
+        old, new = before[key], after[key]
+        old_lat, new_lat = old["latency_ms"] or {}, new["latency_ms"] or {}
+        print(f"{key:28}"
+              f"{change(old_lat.get('p50'), new_lat.get('p50')):>10}"
+              f"{change(old_lat.get('p95'), new_lat.get('p95')):>10}"
+              f"{change(old_lat.get('p99'), new_lat.get('p99')):>10}"
+              f"{change(old['throughput_rps'], new['throughput_rps']):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load benchmark (mock Ollama)")
+    parser.add_argument("--url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated: {','.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,8", help="Comma-separated concurrency levels")
+    parser.add_argument("--store-sizes", default="0,1000", help="Sessions pre-filled in memory (in-process only)")
+    parser.add_argument("--messages-per-session", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario and level")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests before each run")
+    parser.add_argument("--mock-ttft-ms", type=float, default=50.0)
+    parser.add_argument("--mock-tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--mock-response-tokens", type=int, default=32)
+    parser.add_argument("--mock-parallel", type=int, default=64)
+    parser.add_argument("--mock-page-delay-ms", type=float, default=20.0)
+    parser.add_argument("--log-level", default="WARNING", help="App log level for in-process runs")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/load_<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = asyncio.run(run_benchmarks(args))
+    output = Path(args.output) if args.output else BENCH_DIR / "results" / f"load_{report['meta']['commit'] or 'local'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,556 @@
+#!/usr/bin/env python3
+"""
+mock_ollama.py - Deterministic stand-in for an Ollama server
+Lets us load-test /chat and /chat/stream without a model, with timing we control
+
+Speaks enough of Ollama's API for Nitro AI:
+- POST /api/chat        (streaming NDJSON and non-streaming)
+- POST /api/generate    (model warm-up / unload from model_keeper.py)
+- POST /api/embeddings  (old API: {"prompt"} -> {"embedding"})
+- POST /api/embed       (new API: {"input"} -> {"embeddings"})
+- GET  /api/tags, /api/ps (pool health checks, model sizes)
+- GET  /mock/stats, POST /mock/reset (benchmark bookkeeping)
+
+And a tiny web for /search benchmarks (WEB_SEARCH_URL=<mock>/html/):
+- POST /html/           DuckDuckGo-style results page linking to /page/<n>
+- GET  /page/<n>        article of page_kb kilobytes after page_delay_ms
+
+Knobs:
+- ttft_ms / tokens_per_sec / jitter: first-token delay, generation speed and
+  +/- variation (jitter 0.1 = +/-10%). Jitter comes from a seeded RNG, so two
+  runs with the same seed and request order see the same delays
+- response_tokens: answer length (capped by options.num_predict)
+- prompt_ms_per_token: prompt evaluation cost. Like Ollama's KV-cache, only
+  the part of the prompt that differs from the previous prompt is evaluated
+- error_rate / error_status: share of requests answered with an HTTP error
+- parallel / max_queue: like OLLAMA_NUM_PARALLEL / OLLAMA_MAX_QUEUE - extra
+  requests wait, and once the queue is full they get HTTP 503
+
+Answers are deterministic: the same model + messages + seed always give the
+same text.
+
+Run as a server (from the backend folder):
+    python benchmarks/mock_ollama.py --port 11435 --ttft-ms 150 --tokens-per-sec 40
+    OLLAMA_BASE_URLS=http://127.0.0.1:11435 python main.py
+
+Use in-process:
+    >>> async with MockOllama(ttft_ms=100, tokens_per_sec=50) as url:
+    ...     ...  # point the app at url
+
+Or as a subprocess from a benchmark:
+    >>> process, url = spawn_mock_ollama(port=11435, ttft_ms=100)
+    >>> ...
+    >>> process.terminate()
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+WORDS = [
+    "the", "model", "answers", "quickly", "and", "clearly", "with", "local", "tokens",
+    "python", "code", "memory", "server", "request", "stream", "cache", "latency", "data",
+]
+
+DEFAULT_MODELS = ["llama3", "llama3.2:1b", "nomic-embed-text"]
+
+
+def _stable_seed(*parts) -> int:
+    """Seed that is the same in every process (unlike hash())."""
+    digest = hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def _common_prefix_length(a: str, b: str) -> int:
+    limit = min(len(a), len(b))
+    i = 0
+    while i < limit and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class MockOllama:
+    """
+    Mock Ollama server with configurable timing, errors and concurrency.
+
+    Usage:
+        >>> mock = MockOllama(ttft_ms=200, tokens_per_sec=30, parallel=4)
+        >>> url = await mock.start(port=0)   # 0 = any free port
+        >>> ...
+        >>> await mock.stop()
+    """
+
+    def __init__(
+        self,
+        ttft_ms: float = 200.0,
+        tokens_per_sec: float = 30.0,
+        jitter: float = 0.0,
+        response_tokens: int = 64,
+        prompt_ms_per_token: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        parallel: int = 4,
+        max_queue: int = 512,
+        embedding_dim: int = 768,
+        models: Optional[List[str]] = None,
+        seed: int = 42,
+        search_results: int = 8,
+        page_kb: int = 30,
+        page_delay_ms: float = 50.0
+    ):
+        """
+        Initialize the mock server.
+
+        Args:
+            ttft_ms: Delay before the first token (plus prompt evaluation)
+            tokens_per_sec: Generation speed per request
+            jitter: Random +/- share applied to every delay (0 = exact)
+            response_tokens: Tokens per answer (num_predict lowers it)
+            prompt_ms_per_token: Cost of each prompt token not in the KV-cache
+            error_rate: Share of chat/generate requests that fail (0-1)
+            error_status: HTTP status of injected failures
+            parallel: Requests generated at once (OLLAMA_NUM_PARALLEL)
+            max_queue: Requests allowed to wait for a slot before HTTP 503
+            embedding_dim: Size of embedding vectors
+            models: Model names listed by /api/tags
+            seed: Seed for answers, jitter and error injection
+            search_results: Results on the mock search page
+            page_kb: Size of each mock web page
+            page_delay_ms: Delay before a mock web page is sent
+        """
+        self.ttft_ms = ttft_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.jitter = jitter
+        self.response_tokens = response_tokens
+        self.prompt_ms_per_token = prompt_ms_per_token
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.parallel = parallel
+        self.max_queue = max_queue
+        self.embedding_dim = embedding_dim
+        self.models = list(models or DEFAULT_MODELS)
+        self.seed = seed
+        self.search_results = search_results
+        self.page_kb = page_kb
+        self.page_delay_ms = page_delay_ms
+
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+        self._slots = asyncio.Semaphore(self.parallel)
+        self._in_flight = 0
+        self._queued = 0
+        self.reset()
+
+    def reset(self):
+        """Clear stats, the simulated KV-cache and the RNGs (between benchmark runs)."""
+        self._jitter_rng = random.Random(self.seed)
+        self._error_rng = random.Random(self.seed + 1)
+        self._cached_prompt: Dict[str, str] = {}  # model -> last prompt text
+        self._loaded: Dict[str, float] = {}  # model -> last used
+        self.stats = {
+            "requests": {},
+            "max_in_flight": 0,
+            "max_queued": 0,
+            "rejected": 0,
+            "injected_errors": 0,
+            "cancelled": 0,
+            "completed": 0,
+            "tokens_sent": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # SIMULATION
+    # ------------------------------------------------------------------
+
+    def _jittered(self, seconds: float) -> float:
+        if not self.jitter or seconds <= 0:
+            return max(0.0, seconds)
+        return max(0.0, seconds * (1 + self._jitter_rng.uniform(-self.jitter, self.jitter)))
+
+    def _answer_tokens(self, model: str, prompt: str, limit: Optional[int]) -> List[str]:
+        """Deterministic answer for this model + prompt."""
+        count = self.response_tokens if not limit or limit < 0 else min(self.response_tokens, limit)
+        rng = random.Random(_stable_seed(self.seed, model, prompt))
+        return [rng.choice(WORDS) if i == 0 else " " + rng.choice(WORDS) for i in range(count)]
+
+    def _prompt_eval(self, model: str, prompt: str) -> Tuple[int, int]:
+        """
+        Simulate Ollama's KV-cache: only the changed part of the prompt is evaluated.
+
+        Returns:
+            (prompt_eval_count, total prompt tokens) - about 4 chars per token
+        """
+        total = max(1, math.ceil(len(prompt) / 4))
+        reused = _common_prefix_length(self._cached_prompt.get(model, ""), prompt) // 4
+        self._cached_prompt[model] = prompt
+        return max(1, total - reused), total
+
+    def _count(self, endpoint: str):
+        self.stats["requests"][endpoint] = self.stats["requests"].get(endpoint, 0) + 1
+
+    def _inject_error(self) -> Optional[web.Response]:
+        if self.error_rate and self._error_rng.random() < self.error_rate:
+            self.stats["injected_errors"] += 1
+            return web.json_response({"error": "mock: injected failure"}, status=self.error_status)
+        return None
+
+    async def _acquire_slot(self) -> bool:
+        """Wait for a generation slot; False if the queue is full."""
+        if self._slots.locked():
+            if self._queued >= self.max_queue:
+                self.stats["rejected"] += 1
+                return False
+            self._queued += 1
+            self.stats["max_queued"] = max(self.stats["max_queued"], self._queued)
+            try:
+                await self._slots.acquire()
+            finally:
+                self._queued -= 1
+        else:
+            await self._slots.acquire()
+        self._in_flight += 1
+        self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self._in_flight)
+        return True
+
+    def _release_slot(self):
+        self._in_flight -= 1
+        self._slots.release()
+
+    def get_stats(self) -> Dict:
+        """Request counts plus what is running and waiting right now."""
+        return {**self.stats, "in_flight": self._in_flight, "queued": self._queued}
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    def _final_fields(self, model, tokens, started, prompt_eval_count, prompt_eval_ns, limited) -> Dict:
+        """Timing/count fields Ollama sends with the last chunk (nanoseconds)."""
+        total_ns = int((time.perf_counter() - started) * 1e9)
+        return {
+            "model": model,
+            "created_at": self._now(),
+            "done": True,
+            "done_reason": "length" if limited else "stop",
+            "total_duration": total_ns,
+            "load_duration": 0,
+            "prompt_eval_count": prompt_eval_count,
+            "prompt_eval_duration": prompt_eval_ns,
+            "eval_count": len(tokens),
+            "eval_duration": max(0, total_ns - prompt_eval_ns),
+        }
+
+    async def _generate(self, request: web.Request, model: str, prompt: str, options: Dict, stream: bool, chat: bool):
+        """Shared body of /api/chat and /api/generate."""
+        error = self._inject_error()
+        if error is not None:
+            return error
+        if not await self._acquire_slot():
+            return web.json_response(
+                {"error": "server busy, please try again.  maximum pending requests exceeded"}, status=503
+            )
+
+        started = time.perf_counter()
+        try:
+            self._loaded[model] = time.time()
+            limit = options.get("num_predict")
+            tokens = self._answer_tokens(model, prompt, limit)
+            prompt_eval_count, _ = self._prompt_eval(model, prompt)
+            prompt_eval_s = prompt_eval_count * self.prompt_ms_per_token / 1000
+            limited = bool(limit) and 0 < limit < self.response_tokens
+            interval = 1 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+
+            def chunk(text: str) -> Dict:
+                if chat:
+                    return {"model": model, "created_at": self._now(),
+                            "message": {"role": "assistant", "content": text}, "done": False}
+                return {"model": model, "created_at": self._now(), "response": text, "done": False}
+
+            # Everything before the first token is reported as prompt evaluation, like Ollama
+            first_token_s = self._jittered(self.ttft_ms / 1000 + prompt_eval_s)
+            await asyncio.sleep(first_token_s)
+
+            if not stream:
+                await asyncio.sleep(sum(self._jittered(interval) for _ in tokens[1:]))
+                body = chunk("".join(tokens))
+                body.update(self._final_fields(model, tokens, started, prompt_eval_count, int(first_token_s * 1e9), limited))
+                self.stats["tokens_sent"] += len(tokens)
+                self.stats["completed"] += 1
+                return web.json_response(body)
+
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(request)
+            try:
+                for i, token in enumerate(tokens):
+                    if i:
+                        await asyncio.sleep(self._jittered(interval))
+                    await response.write((json.dumps(chunk(token)) + "\n").encode())
+                    self.stats["tokens_sent"] += 1
+                last = chunk("")
+                last.update(self._final_fields(model, tokens, started, prompt_eval_count, int(first_token_s * 1e9), limited))
+                await response.write((json.dumps(last) + "\n").encode())
+                await response.write_eof()
+            except (ConnectionResetError, asyncio.CancelledError):
+                # Client closed the connection - Ollama stops generating too
+                self.stats["cancelled"] += 1
+                raise
+            self.stats["completed"] += 1
+            return response
+        finally:
+            self._release_slot()
+
+    # ------------------------------------------------------------------
+    # HANDLERS
+    # ------------------------------------------------------------------
+
+    async def handle_chat(self, request: web.Request):
+        self._count("chat")
+        body = await request.json()
+        model = body.get("model") or self.models[0]
+        messages = body.get("messages") or []
+        # Prompt text as the model would see it, in order (for the KV-cache)
+        prompt = "".join(f"<{m.get('role')}>{m.get('content', '')}" for m in messages)
+        return await self._generate(request, model, prompt, body.get("options") or {}, body.get("stream", True), chat=True)
+
+    async def handle_generate(self, request: web.Request):
+        self._count("generate")
+        body = await request.json()
+        model = body.get("model") or self.models[0]
+        prompt = body.get("prompt") or ""
+        if not prompt:
+            # Empty prompt = load (or with keep_alive 0, unload) the model
+            if body.get("keep_alive") in (0, "0", "0s"):
+                self._loaded.pop(model, None)
+            else:
+                self._loaded[model] = time.time()
+            return web.json_response({"model": model, "created_at": self._now(), "response": "", "done": True})
+        return await self._generate(request, model, prompt, body.get("options") or {}, body.get("stream", True), chat=False)
+
+    def _embedding(self, model: str, text: str) -> List[float]:
+        rng = random.Random(_stable_seed(self.seed, model, text))
+        raw = [rng.uniform(-1, 1) for _ in range(self.embedding_dim)]
+        norm = math.sqrt(sum(v * v for v in raw)) or 1.0
+        return [v / norm for v in raw]
+
+    async def handle_embeddings(self, request: web.Request):
+        self._count("embeddings")
+        body = await request.json()
+        return web.json_response({"embedding": self._embedding(body.get("model", ""), body.get("prompt", ""))})
+
+    async def handle_embed(self, request: web.Request):
+        self._count("embed")
+        body = await request.json()
+        model = body.get("model", "")
+        texts = body.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        return web.json_response({"model": model, "embeddings": [self._embedding(model, t) for t in texts]})
+
+    def _model_entry(self, name: str) -> Dict:
+        return {"name": name, "model": name, "size": 2 * 1024 ** 3, "digest": hashlib.sha256(name.encode()).hexdigest()}
+
+    async def handle_tags(self, request: web.Request):
+        self._count("tags")
+        return web.json_response({"models": [self._model_entry(m) for m in self.models]})
+
+    async def handle_ps(self, request: web.Request):
+        self._count("ps")
+        return web.json_response({"models": [self._model_entry(m) for m in self._loaded]})
+
+    async def handle_search(self, request: web.Request):
+        self._count("search")
+        query = (await request.post()).get("q", "")
+        base = f"{request.scheme}://{request.host}"
+        results = "".join(
+            f'<div class="result"><a class="result__a" href="{base}/page/{i}">Result {i} for {query}</a>'
+            f'<a class="result__snippet">Snippet {i} about {query}.</a></div>'
+            for i in range(self.search_results)
+        )
+        return web.Response(text=f"<html><body>{results}</body></html>", content_type="text/html")
+
+    async def handle_page(self, request: web.Request):
+        self._count("page")
+        number = request.match_info["number"]
+        await asyncio.sleep(self._jittered(self.page_delay_ms / 1000))
+        rng = random.Random(_stable_seed(self.seed, "page", number))
+        paragraphs = []
+        size = 0
+        while size < self.page_kb * 1024:
+            text = " ".join(rng.choice(WORDS) for _ in range(60))
+            paragraphs.append(f"<p>{text}.</p>")
+            size += len(text) + 8
+        html = (
+            f"<html><head><title>Page {number}</title><script>var x = 1;</script>"
+            f"<style>p {{ margin: 0 }}</style></head><body><nav>Home | About</nav>"
+            f"<h1>Page {number}</h1>{''.join(paragraphs)}<footer>Footer</footer></body></html>"
+        )
+        return web.Response(text=html, content_type="text/html")
+
+    async def handle_stats(self, request: web.Request):
+        return web.json_response(self.get_stats())
+
+    async def handle_reset(self, request: web.Request):
+        self.reset()
+        return web.json_response({"status": "reset"})
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/chat", self.handle_chat)
+        app.router.add_post("/api/generate", self.handle_generate)
+        app.router.add_post("/api/embeddings", self.handle_embeddings)
+        app.router.add_post("/api/embed", self.handle_embed)
+        app.router.add_get("/api/tags", self.handle_tags)
+        app.router.add_get("/api/ps", self.handle_ps)
+        app.router.add_post("/html/", self.handle_search)
+        app.router.add_get("/page/{number}", self.handle_page)
+        app.router.add_get("/mock/stats", self.handle_stats)
+        app.router.add_post("/mock/reset", self.handle_reset)
+        return app
+
+    # ------------------------------------------------------------------
+    # IN-PROCESS SERVER
+    # ------------------------------------------------------------------
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Start serving on the current event loop.
+
+        Args:
+            host: Interface to bind
+            port: Port (0 = any free port)
+
+        Returns:
+            Base URL, e.g. http://127.0.0.1:54321
+        """
+        # Fresh slots for the loop that serves requests
+        self._slots = asyncio.Semaphore(self.parallel)
+        self._in_flight = 0
+        self._queued = 0
+        self.reset()
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_host, bound_port = self._runner.addresses[0][:2]
+        self.url = f"http://{bound_host}:{bound_port}"
+        return self.url
+
+    async def stop(self):
+        """Stop serving."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> str:
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+
+# ============================================================================
+# SUBPROCESS HELPER
+# ============================================================================
+
+def spawn_mock_ollama(port: int = 11435, host: str = "127.0.0.1", ready_timeout: float = 10.0, **options):
+    """
+    Start the mock server in a separate process and wait until it answers.
+
+    Keeps the mock's work off the event loop being measured.
+
+    Args:
+        port: Port to listen on
+        host: Interface to bind
+        ready_timeout: Seconds to wait for /api/tags to answer
+        **options: MockOllama arguments (ttft_ms=100, error_rate=0.01, ...)
+
+    Returns:
+        (subprocess.Popen, base_url) - call process.terminate() when done
+    """
+    command = [sys.executable, __file__, "--host", host, "--port", str(port)]
+    for key, value in options.items():
+        if key == "models":
+            value = ",".join(value)
+        command += [f"--{key.replace('_', '-')}", str(value)]
+    process = subprocess.Popen(command)
+
+    url = f"http://{host}:{port}"
+    deadline = time.time() + ready_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Mock Ollama exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{url}/api/tags", timeout=1):
+                return process, url
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"Mock Ollama did not start on {url} within {ready_timeout}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic mock Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--ttft-ms", type=float, default=200.0, help="Delay before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=30.0, help="Generation speed per request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random +/- share on every delay (0.1 = 10%%)")
+    parser.add_argument("--response-tokens", type=int, default=64, help="Tokens per answer")
+    parser.add_argument("--prompt-ms-per-token", type=float, default=0.0, help="Cost of uncached prompt tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests that fail (0-1)")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected failures")
+    parser.add_argument("--parallel", type=int, default=4, help="Requests generated at once")
+    parser.add_argument("--max-queue", type=int, default=512, help="Waiting requests before HTTP 503")
+    parser.add_argument("--embedding-dim", type=int, default=768)
+    parser.add_argument("--models", default=",".join(DEFAULT_MODELS), help="Comma-separated model names")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--search-results", type=int, default=8, help="Results on the mock search page")
+    parser.add_argument("--page-kb", type=int, default=30, help="Size of each mock web page")
+    parser.add_argument("--page-delay-ms", type=float, default=50.0, help="Delay before a web page is sent")
+    args = parser.parse_args()
+
+    mock = MockOllama(
+        ttft_ms=args.ttft_ms,
+        tokens_per_sec=args.tokens_per_sec,
+        jitter=args.jitter,
+        response_tokens=args.response_tokens,
+        prompt_ms_per_token=args.prompt_ms_per_token,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        parallel=args.parallel,
+        max_queue=args.max_queue,
+        embedding_dim=args.embedding_dim,
+        models=[m.strip() for m in args.models.split(",") if m.strip()],
+        seed=args.seed,
+        search_results=args.search_results,
+        page_kb=args.page_kb,
+        page_delay_ms=args.page_delay_ms
+    )
+
+    async def serve():
+        url = await mock.start(args.host, args.port)
+        print(f"Mock Ollama listening on {url} (ttft {args.ttft_ms}ms, {args.tokens_per_sec} tok/s)", flush=True)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await mock.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+parse_bench.py - HTML parsing benchmark for web search
+How long turning a page into text takes, and what it costs the event loop
+
+Runs on the saved pages in benchmarks/fixtures/html/ (or --pages):
+- Output check: html_to_text() and parse_search_results() must give the
+  same result with lxml as with the BeautifulSoup fallback
+- Parse time per page for both parsers (p50/max over --repeat calls)
+- Streamed extraction (PageTextExtractor, fed PAGE_CHUNK_BYTES at a time
+  like a download): same text as html_to_text(), and how much of the page
+  had to be read before enough text was found
+- Event-loop lag while --fetches pages are parsed at once: inline on the
+  loop (BeautifulSoup, the old way, and lxml) versus in the parse pool
+  (thread and process), measured
+  with a 1ms ticker task like loop_monitor.py does
+
+Run from the backend folder:
+    python benchmarks/parse_bench.py
+    python benchmarks/parse_bench.py --repeat 50 --fetches 20
+    python benchmarks/parse_bench.py --pages /path/to/saved/pages --output parse.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(BACKEND_DIR.parent))
+
+from models.ai_modules import web_search_enhanced as search
+
+FIXTURES_DIR = BENCH_DIR / "fixtures" / "html"
+RESULTS_PAGE = "ddg_results.html"  # Parsed with parse_search_results, the rest with html_to_text
+
+
+def _parse(name: str) -> Callable[[str], object]:
+    return search.parse_search_results if name == RESULTS_PAGE else search.html_to_text
+
+
+def _with_bs4(call: Callable, *args):
+    """Run a parse function with the BeautifulSoup fallback."""
+    lxml_available = search.LXML_AVAILABLE
+    search.LXML_AVAILABLE = False
+    try:
+        return call(*args)
+    finally:
+        search.LXML_AVAILABLE = lxml_available
+
+
+def _timings(call: Callable, html: str, repeat: int) -> Dict:
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call(html)
+        latencies.append(time.perf_counter() - start)
+    return {
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+    }
+
+
+def _stream(html: str) -> tuple:
+    """Feed a page to PageTextExtractor like _fetch_page does; (text, bytes read)."""
+    raw = html.encode("utf-8")
+    extractor = search.PageTextExtractor(encoding="utf-8")
+    read = 0
+    for start in range(0, len(raw), search.PAGE_CHUNK_BYTES):
+        chunk = raw[start:start + search.PAGE_CHUNK_BYTES]
+        read += len(chunk)
+        if extractor.feed(chunk):
+            break
+    return extractor.close(), read
+
+
+def bench_pages(pages: Dict[str, str], repeat: int) -> List[Dict]:
+    """Check lxml against BeautifulSoup and time both on every page."""
+    report = []
+    for name, html in pages.items():
+        parse = _parse(name)
+        entry = {"page": name, "kb": round(len(html.encode()) / 1024, 1)}
+        bs4_output = _with_bs4(parse, html)
+        entry["bs4"] = _timings(lambda page: _with_bs4(parse, page), html, repeat)
+        if search.LXML_AVAILABLE:
+            entry["same_output"] = parse(html) == bs4_output
+            entry["lxml"] = _timings(parse, html, repeat)
+            entry["speedup"] = round(entry["bs4"]["p50_ms"] / max(entry["lxml"]["p50_ms"], 1e-6), 1)
+            if name != RESULTS_PAGE:
+                text, read = _stream(html)
+                entry["same_streamed"] = text[:search.PAGE_TEXT_MAX_CHARS] == parse(html)[:search.PAGE_TEXT_MAX_CHARS]
+                entry["streamed_read_kb"] = round(read / 1024, 1)
+                entry["streamed"] = _timings(lambda page: _stream(page), html, repeat)
+        report.append(entry)
+    return report
+
+
+async def _loop_lag(work: Callable) -> Dict:
+    """Run `work()` (a coroutine) while a 1ms ticker measures how late the loop runs it."""
+    loop = asyncio.get_running_loop()
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            expected = loop.time() + 0.001
+            await asyncio.sleep(0.001)
+            lags.append(max(0.0, loop.time() - expected))
+
+    task = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    await work()
+    elapsed = time.perf_counter() - start
+    done.set()
+    await task
+    return {
+        "wall_ms": round(elapsed * 1000, 1),
+        "max_lag_ms": round(max(lags) * 1000, 2) if lags else None,
+        "p99_lag_ms": round(statistics.quantiles(lags, n=100, method="inclusive")[98] * 1000, 2) if len(lags) >= 2 else None,
+    }
+
+
+async def bench_loop(pages: Dict[str, str], fetches: int, workers: int) -> Dict:
+    """Parse `fetches` pages at once inline, then in each kind of pool."""
+    names = [name for name in pages if name != RESULTS_PAGE]
+    batch = [pages[names[i % len(names)]] for i in range(fetches)]
+    report = {}
+
+    async def inline(parse: Callable):
+        for html in batch:
+            parse(html)
+            await asyncio.sleep(0)
+
+    # The old way: BeautifulSoup on the event loop
+    report["inline_bs4"] = await _loop_lag(lambda: inline(lambda html: _with_bs4(search.html_to_text, html)))
+    report["inline"] = await _loop_lag(lambda: inline(search.html_to_text))
+
+    async def streamed():
+        # One chunk per step, like pages arriving over the network
+        for html in batch:
+            raw = html.encode("utf-8")
+            extractor = search.PageTextExtractor(encoding="utf-8")
+            for start in range(0, len(raw), search.PAGE_CHUNK_BYTES):
+                if extractor.feed(raw[start:start + search.PAGE_CHUNK_BYTES]):
+                    break
+                await asyncio.sleep(0)
+            extractor.close()
+
+    if search.LXML_AVAILABLE:
+        report["streamed"] = await _loop_lag(streamed)
+
+    for kind in ("thread", "process"):
+        executor = search.create_parse_executor(workers, kind)
+        loop = asyncio.get_running_loop()
+        # Start the workers first: process start-up is not parse time
+        await asyncio.gather(*[loop.run_in_executor(executor, search.html_to_text, "<p>warm</p>") for _ in range(workers)])
+
+        async def pooled():
+            await asyncio.gather(*[loop.run_in_executor(executor, search.html_to_text, html) for html in batch])
+
+        report[f"{kind}_pool"] = await _loop_lag(pooled)
+        executor.shutdown()
+    return report
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTML parsing benchmark for web search")
+    parser.add_argument("--pages", default=str(FIXTURES_DIR), help="Folder of saved .html pages")
+    parser.add_argument("--repeat", type=int, default=20, help="Parses per page and parser")
+    parser.add_argument("--fetches", type=int, default=10, help="Pages parsed at once in the event-loop test")
+    parser.add_argument("--workers", type=int, default=2, help="Parse pool size")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/parse_<commit>.json)")
+    args = parser.parse_args()
+
+    pages = {
+        path.name: path.read_text(encoding="utf-8")
+        for path in sorted(Path(args.pages).glob("*.html"))
+    }
+    if not pages:
+        sys.exit(f"❌ No .html pages in {args.pages}")
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "lxml": search.LXML_AVAILABLE,
+            "repeat": args.repeat,
+            "fetches": args.fetches,
+            "workers": args.workers,
+        },
+    }
+
+    report["pages"] = bench_pages(pages, args.repeat)
+    print(f"\n{'page':<28}{'KB':>7}{'bs4 ms':>10}{'lxml ms':>10}{'x':>7}{'stream ms':>11}{'read KB':>9}  same")
+    for entry in report["pages"]:
+        lxml = entry.get("lxml", {}).get("p50_ms", "-")
+        streamed = entry.get("streamed", {}).get("p50_ms", "-")
+        same = entry.get("same_output", True) and entry.get("same_streamed", True)
+        print(f"{entry['page']:<28}{entry['kb']:>7}{entry['bs4']['p50_ms']:>10}{lxml:>10}"
+              f"{entry.get('speedup', '-'):>7}{streamed:>11}{entry.get('streamed_read_kb', '-'):>9}  {'✅' if same else '❌'}")
+
+    report["event_loop"] = asyncio.run(bench_loop(pages, args.fetches, args.workers))
+    print(f"\n⏱️ {args.fetches} pages parsed at once ({'lxml' if search.LXML_AVAILABLE else 'bs4'})")
+    for mode, result in report["event_loop"].items():
+        print(f"   {mode:<14} wall {result['wall_ms']:>8}ms   loop lag max {result['max_lag_ms']}ms, p99 {result['p99_lag_ms']}ms")
+
+    output = Path(args.output) if args.output else BENCH_DIR / "results" / f"parse_{report['meta']['commit'] or 'local'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+
+    if not all(entry.get("same_output", True) for entry in report["pages"]):
+        sys.exit("❌ lxml output differs from BeautifulSoup")
+    if not all(entry.get("same_streamed", True) for entry in report["pages"]):
+        sys.exit("❌ Streamed extraction differs from html_to_text()")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+storage_bench.py - Micro-benchmarks for conversation storage
+How MemoryManager operations scale with the size of the store
+
+For each store size (total messages) a synthetic store is generated and these
+operations are timed:
+    create_session, add_message, get_session_history,
+    get_recent_sessions, get_statistics, delete_session
+
+Per operation we record:
+- latency (p50/p95/max over --repeat calls)
+- peak RSS during the call (Linux: VmHWM reset before each call)
+- bytes written per call (Linux: /proc/self/io, write() calls and disk)
+  and the size of store files rewritten by the call
+
+Each size runs in its own subprocess so memory from a bigger store does
+not leak into the numbers of a smaller one.
+
+Any storage backend with the MemoryManager interface can be measured:
+    --backend module:ClassName   (constructed with memory_dir=<temp folder>)
+
+Run from the backend folder:
+    python benchmarks/storage_bench.py
+    python benchmarks/storage_bench.py --sizes 10000,100000 --repeat 10
+    python benchmarks/storage_bench.py --backend memory_manager:MemoryManager --output before.json
+"""
+
+import argparse
+import gc
+import importlib
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(BENCH_DIR))
+
+from synthetic_store import seed_store
+
+OPERATIONS = [
+    "create_session",
+    "add_message",
+    "get_session_history",
+    "get_recent_sessions",
+    "get_statistics",
+    "delete_session",
+]
+
+
+# ============================================================================
+# PROCESS COUNTERS (Linux /proc, with fallbacks)
+# ============================================================================
+
+def _reset_peak_rss() -> bool:
+    """Reset the peak RSS counter to the current RSS (Linux only)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_kb() -> int:
+    """Peak RSS in KB since the last reset (or since start)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _io_counters() -> Optional[Dict[str, int]]:
+    """Bytes written by this process: write() calls and to disk."""
+    try:
+        with open("/proc/self/io") as f:
+            counters = dict(line.split(": ") for line in f.read().splitlines())
+        return {"written": int(counters["wchar"]), "disk_written": int(counters["write_bytes"])}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _snapshot(folder: Path) -> Dict[str, tuple]:
+    """(modified time, size) of every file under a folder."""
+    return {
+        str(f): (f.stat().st_mtime_ns, f.stat().st_size)
+        for f in folder.rglob("*") if f.is_file()
+    }
+
+
+def _rewritten_bytes(before: Dict[str, tuple], after: Dict[str, tuple]) -> int:
+    """Total size of files that were created or changed between two snapshots."""
+    return sum(size for path, (mtime, size) in after.items() if before.get(path) != (mtime, size))
+
+
+def measure(call: Callable, repeat: int, store_dir: Path) -> Dict:
+    """
+    Call `call(i)` `repeat` times and collect latency, peak RSS and bytes written.
+
+    Bytes written comes from the process counters (Linux only); the size of
+    store files that changed is recorded too, which works everywhere and
+    shows how much of the store one call rewrites.
+
+    Returns:
+        Stats for one operation
+    """
+    latencies = []
+    peaks = []
+    written = []
+    disk_written = []
+    rewritten = []
+    for i in range(repeat):
+        gc.collect()
+        rss_reset = _reset_peak_rss()
+        before_files = _snapshot(store_dir)
+        before_io = _io_counters()
+        start = time.perf_counter()
+        call(i)
+        latencies.append(time.perf_counter() - start)
+        peaks.append(_peak_rss_kb())
+        after_io = _io_counters()
+        rewritten.append(_rewritten_bytes(before_files, _snapshot(store_dir)))
+        if before_io and after_io:
+            written.append(after_io["written"] - before_io["written"])
+            disk_written.append(after_io["disk_written"] - before_io["disk_written"])
+
+    latencies.sort()
+    return {
+        "calls": repeat,
+        "latency_ms": {
+            "p50": round(latencies[len(latencies) // 2] * 1000, 3),
+            "p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3),
+        },
+        # Without a reset (non-Linux) this is the process-wide peak so far
+        "peak_rss_mb": round(max(peaks) / 1024, 1),
+        "peak_rss_per_call": rss_reset,
+        "bytes_written_per_call": round(sum(written) / len(written)) if written else None,
+        "disk_bytes_written_per_call": round(sum(disk_written) / len(disk_written)) if disk_written else None,
+        "store_bytes_rewritten_per_call": round(sum(rewritten) / len(rewritten)),
+    }
+
+
+# ============================================================================
+# ONE STORE SIZE (runs in a subprocess)
+# ============================================================================
+
+def load_backend(spec: str, memory_dir: Path):
+    """Create the storage backend from "module:ClassName"."""
+    module_name, _, class_name = spec.partition(":")
+    module = importlib.import_module(module_name)
+    return getattr(module, class_name or "MemoryManager")(memory_dir=str(memory_dir))
+
+
+def run_size(backend_spec: str, messages: int, messages_per_session: int, repeat: int, operations: List[str]) -> Dict:
+    """Build a store with `messages` messages and time each operation on it."""
+    workdir = Path(tempfile.mkdtemp(prefix="nitro-storage-bench-"))
+    # Importing memory_manager creates its singleton in "../memory"; keep that out of the repo
+    run_dir = workdir / "run"
+    run_dir.mkdir()
+    os.chdir(run_dir)
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    store_dir = workdir / "store"
+    manager = load_backend(backend_spec, store_dir)
+    sessions = max(1, messages // messages_per_session)
+
+    start = time.perf_counter()
+    session_ids = seed_store(manager, sessions, messages_per_session)
+    seed_seconds = time.perf_counter() - start
+    gc.collect()
+
+    rng = random.Random(messages)
+    created: List[str] = []
+
+    calls = {
+        "create_session": lambda i: created.append(manager.create_session(f"bench-user-{i}")),
+        "add_message": lambda i: manager.add_message(
+            rng.choice(session_ids), f"Benchmark question {i}", "user", "Benchmark answer " * 20
+        ),
+        "get_session_history": lambda i: manager.get_session_history(rng.choice(session_ids)),
+        "get_recent_sessions": lambda i: manager.get_recent_sessions(limit=20),
+        "get_statistics": lambda i: manager.get_statistics(),
+        # Deletes the sessions made by create_session (or existing ones), keeping the size stable
+        "delete_session": lambda i: manager.delete_session(created.pop() if created else session_ids.pop()),
+    }
+
+    results = {}
+    for name in operations:
+        results[name] = measure(calls[name], repeat, store_dir)
+
+    store_bytes = sum(f.stat().st_size for f in store_dir.rglob("*") if f.is_file())
+    shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "messages": sessions * messages_per_session,
+        "sessions": sessions,
+        "seed_seconds": round(seed_seconds, 2),
+        "store_bytes": store_bytes,
+        "operations": results,
+    }
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _print_size(result: Dict):
+    print(f"\n📦 {result['messages']:,} messages in {result['sessions']:,} sessions "
+          f"({result['store_bytes'] / 1024 / 1024:.1f} MB, seeded in {result['seed_seconds']}s)")
+    print(f"   {'operation':22}{'p50 ms':>12}{'p95 ms':>12}{'peak RSS MB':>14}{'bytes written':>16}{'rewritten':>14}")
+    for name, stats in result["operations"].items():
+        written = stats["bytes_written_per_call"]
+        print(f"   {name:22}{stats['latency_ms']['p50']:>12}{stats['latency_ms']['p95']:>12}"
+              f"{stats['peak_rss_mb']:>14}{written if written is not None else '-':>16}"
+              f"{stats['store_bytes_rewritten_per_call']:>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversation storage micro-benchmarks")
+    parser.add_argument("--backend", default="memory_manager:MemoryManager",
+                        help="Storage class as module:ClassName (takes memory_dir=...)")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated total message counts")
+    parser.add_argument("--messages-per-session", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5, help="Calls per operation and size")
+    parser.add_argument("--operations", default=",".join(OPERATIONS), help="Comma-separated operations to run")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/storage_<commit>.json)")
+    parser.add_argument("--worker-size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    operations = [op.strip() for op in args.operations.split(",") if op.strip()]
+
+    # Keep per-call log lines out of the measurements
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    if args.worker_size is not None:
+        result = run_size(args.backend, args.worker_size, args.messages_per_session, args.repeat, operations)
+        with open(args.worker_output, "w") as f:
+            json.dump(result, f)
+        return
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": args.backend,
+            "messages_per_session": args.messages_per_session,
+            "repeat": args.repeat,
+        },
+        "sizes": [],
+    }
+
+    for size in [int(s) for s in args.sizes.split(",")]:
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as handle:
+            worker_output = handle.name
+        command = [
+            sys.executable, os.path.abspath(__file__),
+            "--backend", args.backend,
+            "--messages-per-session", str(args.messages_per_session),
+            "--repeat", str(args.repeat),
+            "--operations", ",".join(operations),
+            "--worker-size", str(size),
+            "--worker-output", worker_output,
+        ]
+        try:
+            subprocess.run(command, check=True)
+            with open(worker_output) as f:
+                result = json.load(f)
+        except subprocess.CalledProcessError as e:
+            print(f"❌ Size {size:,} failed (exit {e.returncode})")
+            continue
+        finally:
+            os.unlink(worker_output)
+        report["sizes"].append(result)
+        _print_size(result)
+
+    output = Path(args.output) if args.output else BENCH_DIR / "results" / f"storage_{report['meta']['commit'] or 'local'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+stream_bench.py - Benchmark for the /chat/stream pipeline
+Compares the old per-token pipeline with the coalescing pipeline
+
+What is measured (no Ollama needed - tokens come from a fake source):
+1. SSE framing: frames sent (= network writes), json.dumps calls, bytes,
+   and how long a token waits before its frame goes out
+2. NDJSON parsing: readline-per-token (old) vs incremental buffer (new)
+   on an Ollama-like byte stream split at random points
+
+Run from the backend folder:
+    python benchmarks/stream_bench.py
+    python benchmarks/stream_bench.py --tokens 2000 --token-interval-ms 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+# Make backend modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp
+
+from streaming import coalesce_tokens
+from llm_backends import iter_ndjson
+
+WORDS = ["the", " model", " answers", " quickly", ",", " and", " tokens", " arrive", " one", " by", " one", "."]
+
+
+async def fake_tokens(count: int, interval: float, jitter: float, produced: list, seed: int = 42):
+    """Yield `count` tokens roughly every `interval` seconds, recording when each was produced."""
+    rng = random.Random(seed)
+    for i in range(count):
+        await asyncio.sleep(max(0.0, interval + rng.uniform(-jitter, jitter)))
+        produced.append(time.perf_counter())
+        yield WORDS[i % len(WORDS)]
+
+
+async def run_sse(count: int, interval: float, jitter: float, flush_interval: float, max_frame_bytes: int):
+    """Run one SSE pipeline and collect frame/latency numbers."""
+    produced = []
+    source = fake_tokens(count, interval, jitter, produced)
+    frames = coalesce_tokens(source, flush_interval, max_frame_bytes) if flush_interval > 0 else source
+
+    stats = {"frames": 0, "encode_calls": 0, "bytes": 0}
+    delays = []
+    parts = []
+    sent_tokens = 0
+    start = time.perf_counter()
+    async for chunk in frames:
+        now = time.perf_counter()
+        parts.append(chunk)
+        payload = f"data: {json.dumps({'chunk': chunk, 'done': False})}\n\n".encode()
+        stats["frames"] += 1
+        stats["encode_calls"] += 1
+        stats["bytes"] += len(payload)
+        # Every token produced so far but not yet sent goes out in this frame
+        delays.extend(now - t for t in produced[sent_tokens:])
+        sent_tokens = len(produced)
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    stats["chars"] = len("".join(parts))
+    delays.sort()
+    stats["token_wait_ms_avg"] = round(sum(delays) / len(delays) * 1000, 2)
+    stats["token_wait_ms_p99"] = round(delays[int(0.99 * (len(delays) - 1))] * 1000, 2)
+    return stats
+
+
+class _FakeProtocol:
+    """Just enough of a protocol for aiohttp.StreamReader."""
+
+    _reading_paused = False
+
+    def pause_reading(self):
+        pass
+
+    def resume_reading(self):
+        pass
+
+
+def _ndjson_body(count: int) -> bytes:
+    lines = [json.dumps({"model": "llama3", "message": {"role": "assistant", "content": WORDS[i % len(WORDS)]}, "done": False})
+             for i in range(count)]
+    lines.append(json.dumps({"model": "llama3", "message": {"content": ""}, "done": True, "prompt_eval_count": 42}))
+    return ("\n".join(lines) + "\n").encode()
+
+
+def _reader(body: bytes, seed: int = 7):
+    """StreamReader fed with `body` split at random points (like network reads)."""
+    reader = aiohttp.StreamReader(_FakeProtocol(), 2 ** 16, loop=asyncio.get_running_loop())
+    rng = random.Random(seed)
+    pos = 0
+    while pos < len(body):
+        size = rng.randint(20, 400)
+        reader.feed_data(body[pos:pos + size])
+        pos += size
+    reader.feed_eof()
+    return reader
+
+
+async def run_ndjson(count: int, repeat: int):
+    """Time the old (readline + json.loads) and new (iter_ndjson) parsers."""
+    body = _ndjson_body(count)
+    results = {}
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parts = ""
+        async for line in _reader(body):
+            if line:
+                try:
+                    data = json.loads(line)
+                    parts += data.get("message", {}).get("content", "")
+                except json.JSONDecodeError:
+                    continue
+    results["readline_and_concat_ms"] = round((time.perf_counter() - start) / repeat * 1000, 2)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        pieces = []
+        async for data in iter_ndjson(_reader(body)):
+            pieces.append(data.get("message", {}).get("content", ""))
+        "".join(pieces)
+    results["incremental_and_list_ms"] = round((time.perf_counter() - start) / repeat * 1000, 2)
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark the streaming pipeline")
+    parser.add_argument("--tokens", type=int, default=1000, help="Tokens per response")
+    parser.add_argument("--token-interval-ms", type=float, default=5.0, help="Average gap between tokens")
+    parser.add_argument("--jitter-ms", type=float, default=3.0, help="Random +/- gap variation")
+    parser.add_argument("--flush-ms", type=float, default=30.0, help="Coalescing flush interval")
+    parser.add_argument("--max-frame-bytes", type=int, default=512, help="Coalescing frame size limit")
+    parser.add_argument("--repeat", type=int, default=20, help="NDJSON parse repetitions")
+    args = parser.parse_args()
+
+    interval = args.token_interval_ms / 1000
+    jitter = args.jitter_ms / 1000
+
+    print(f"=== SSE framing: {args.tokens} tokens every ~{args.token_interval_ms}ms ===")
+    per_token = await run_sse(args.tokens, interval, jitter, 0, args.max_frame_bytes)
+    coalesced = await run_sse(args.tokens, interval, jitter, args.flush_ms / 1000, args.max_frame_bytes)
+    print(f"{'':24}{'per-token':>12}{'coalesced':>12}")
+    for key in per_token:
+        print(f"{key:24}{per_token[key]:>12}{coalesced[key]:>12}")
+
+    print(f"\n=== NDJSON parsing: {args.tokens} lines x {args.repeat} ===")
+    for key, value in (await run_ndjson(args.tokens, args.repeat)).items():
+        print(f"{key:28}{value:>10} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+"""
+synthetic_store.py - Synthetic conversation data for benchmarks
+Fills a storage backend with realistic-looking sessions, fast
+
+Used by load_bench.py and storage_bench.py so both measure the same data.
+"""
+
+import random
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List
+
+QUESTIONS = [
+    "How do I sort a list in Python?",
+    "What is a closure?",
+    "Explain async and await briefly.",
+    "Give me a tip for writing tests.",
+    "What does HTTP 503 mean?",
+    "Can you summarize the plot of Hamlet?",
+    "What's the difference between a process and a thread?",
+    "Write a haiku about coffee.",
+]
+
+ANSWER = "A synthetic answer with a few sentences of text. " * 4
+
+
+def synthetic_sessions(count: int, messages_per_session: int, seed: int = 0, prefix: str = "bench") -> Iterator[Dict]:
+    """
+    Generate session dicts in the same format MemoryManager stores.
+
+    Sessions are spaced a minute apart (oldest first) and spread over 50 users.
+
+    Args:
+        count: Number of sessions
+        messages_per_session: Messages in each session
+        seed: Random seed (same seed = same data)
+        prefix: Start of each session id
+    """
+    rng = random.Random(seed)
+    base = time.time() - count * 60
+    for n in range(count):
+        stamp = datetime.fromtimestamp(base + n * 60).isoformat()
+        messages = [
+            {
+                "timestamp": stamp,
+                "sender": "user",
+                "message": rng.choice(QUESTIONS),
+                "response": ANSWER,
+            }
+            for _ in range(messages_per_session)
+        ]
+        yield {
+            "session_id": f"{prefix}-{seed}-{n:08d}",
+            "user_id": f"user-{n % 50}",
+            "created_at": stamp,
+            "last_updated": stamp,
+            "messages": messages,
+            "message_count": len(messages),
+        }
+
+
+def seed_store(manager, count: int, messages_per_session: int, seed: int = 0) -> List[str]:
+    """
+    Add synthetic sessions to a storage backend.
+
+    Uses the quickest way the backend offers:
+    - import_sessions(sessions): a bulk loader, if the backend has one
+    - _load_data/_save_data (JSON MemoryManager): one write for everything
+    - create_session/add_message otherwise (slow for big stores)
+
+    Returns:
+        The session ids that were added
+    """
+    sessions = synthetic_sessions(count, messages_per_session, seed)
+
+    if hasattr(manager, "import_sessions"):
+        sessions = list(sessions)
+        manager.import_sessions(sessions)
+        return [s["session_id"] for s in sessions]
+
+    if hasattr(manager, "_save_data"):
+        data = manager._load_data()
+        session_ids = []
+        for session in sessions:
+            data["sessions"].append(session)
+            session_ids.append(session["session_id"])
+        data["metadata"]["total_sessions"] += count
+        data["metadata"]["total_messages"] += count * messages_per_session
+        manager._save_data(data)
+        return session_ids
+
+    session_ids = []
+    for session in sessions:
+        session_id = manager.create_session(session["user_id"])
+        for message in session["messages"]:
+            manager.add_message(session_id, message["message"], "user", message["response"])
+        session_ids.append(session_id)
+    return session_ids
@@ -0,0 +1,163 @@
+"""
+circuit_breaker.py - Circuit breaker for calls to AI backends
+Stops hammering a backend that keeps failing, and fails fast instead
+
+States:
+- closed:    normal operation, every call goes through
+- open:      too many recent failures, calls are rejected immediately
+- half_open: the cool-down is over, a few trial calls are let through;
+             success closes the circuit, failure opens it again
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open."""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Classic three-state circuit breaker.
+
+    Usage:
+        >>> breaker = CircuitBreaker("ollama@localhost")
+        >>> if breaker.allow_request():
+        ...     try:
+        ...         call_backend()
+        ...         breaker.record_success()
+        ...     except Exception:
+        ...         breaker.record_failure()
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        half_open_max_calls: int = 1
+    ):
+        """
+        Initialize the circuit breaker.
+
+        Args:
+            name: Label used in logs and stats
+            failure_threshold: Consecutive failures that open the circuit
+            recovery_timeout: Seconds to stay open before trying again
+            half_open_max_calls: Trial calls allowed while half-open
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.half_open_calls = 0
+
+        # Stats
+        self.times_opened = 0
+        self.rejected_calls = 0
+
+        self._lock = threading.Lock()
+
+    def _refresh_state(self, now: float):
+        """Move from open to half-open once the cool-down has passed."""
+        if self.state == OPEN and now - self.opened_at >= self.recovery_timeout:
+            self.state = HALF_OPEN
+            self.half_open_calls = 0
+
+    def allow_request(self) -> bool:
+        """
+        Check whether a call may go through (and reserve a trial slot
+        when half-open).
+
+        Returns:
+            True if the caller may proceed
+        """
+        with self._lock:
+            self._refresh_state(time.time())
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self.half_open_calls < self.half_open_max_calls:
+                self.half_open_calls += 1
+                return True
+            self.rejected_calls += 1
+            return False
+
+    def is_available(self) -> bool:
+        """Check whether a call would be allowed, without reserving a slot."""
+        with self._lock:
+            self._refresh_state(time.time())
+            if self.state == CLOSED:
+                return True
+            return self.state == HALF_OPEN and self.half_open_calls < self.half_open_max_calls
+
+    def record_success(self):
+        """Record a successful call; closes a half-open circuit."""
+        with self._lock:
+            self.consecutive_failures = 0
+            if self.state != CLOSED:
+                self.state = CLOSED
+                self.opened_at = None
+                self.half_open_calls = 0
+
+    def release_trial(self):
+        """
+        A call ended without an outcome (cancelled by the client or a lost
+        hedge): give its half-open trial slot back, so the next call can
+        try. Without this the circuit would stay half-open with no free
+        slot and reject everything.
+        """
+        with self._lock:
+            if self.state == HALF_OPEN and self.half_open_calls > 0:
+                self.half_open_calls -= 1
+
+    def rearm(self):
+        """
+        The backend passed a health check: free any held trial slot, so
+        real traffic can test it again (the circuit still only closes on a
+        successful call).
+        """
+        with self._lock:
+            self._refresh_state(time.time())
+            if self.state == HALF_OPEN:
+                self.half_open_calls = 0
+
+    def record_failure(self):
+        """Record a failed call; may open the circuit."""
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                self.state = OPEN
+                self.opened_at = time.time()
+                self.half_open_calls = 0
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit will let a trial call through."""
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.recovery_timeout - (time.time() - self.opened_at))
+
+    def get_stats(self) -> Dict:
+        """Get a JSON-friendly snapshot of the breaker."""
+        with self._lock:
+            self._refresh_state(time.time())
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "times_opened": self.times_opened,
+                "rejected_calls": self.rejected_calls,
+            }
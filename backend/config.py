@@ -88,7 +88,6 @@ class Settings:
     # Note: API_KEY moved to PRODUCTION SECURITY SETTINGS above
     
     # AI Service API Keys (optional, not used in local-only mode)
-    # OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     # ANTHROPIC_API_KEY: str = os.getenv("ANTHROPIC_API_KEY", "")
     
     # === DATABASE SETTINGS ===
@@ -97,6 +96,10 @@ class Settings:
     
     # === LOGGING SETTINGS ===
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")  # INFO, DEBUG, WARNING, ERROR
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text").lower()  # text (readable) or json (one object per line, with request id)
+    LOG_ASYNC: bool = os.getenv("LOG_ASYNC", "True").lower() == "true"  # Write logs from a background thread (never blocks requests)
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # Records waiting for the writer; more are dropped and counted
+    LOG_RATE_LIMIT: float = float(os.getenv("LOG_RATE_LIMIT", "20"))  # INFO/DEBUG records per second per line of code (0 = no limit)
     
     # === CHAT SETTINGS ===
     MAX_MESSAGE_LENGTH: int = 1000  # Maximum characters in a user message
@@ -113,7 +116,81 @@ class Settings:
     # Local model settings (Ollama) - FREE and PRIVATE!
     OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     OLLAMA_MODEL: str = os.getenv("OLLAMA_MODEL", "llama2")  # llama2, mistral, phi, etc.
-    
+
+    # Ollama backend pool - comma-separated list of Ollama servers
+    # Example: OLLAMA_BASE_URLS=http://localhost:11434,http://192.168.1.20:11434
+    # Falls back to OLLAMA_BASE_URL when not set (single backend)
+    OLLAMA_BASE_URLS: list = [
+        u.strip().rstrip("/")
+        for u in os.getenv("OLLAMA_BASE_URLS", os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")).split(",")
+        if u.strip()
+    ]
+    OLLAMA_HEALTH_CHECK_INTERVAL: int = int(os.getenv("OLLAMA_HEALTH_CHECK_INTERVAL", "10"))  # Seconds between health checks
+    OLLAMA_EJECT_AFTER_FAILURES: int = int(os.getenv("OLLAMA_EJECT_AFTER_FAILURES", "3"))  # Failed health checks before ejecting
+    OLLAMA_READMIT_AFTER: int = int(os.getenv("OLLAMA_READMIT_AFTER", "30"))  # Seconds an ejected backend sits out
+    OLLAMA_READMIT_SUCCESSES: int = int(os.getenv("OLLAMA_READMIT_SUCCESSES", "5"))  # Successes before full traffic again
+
+    # Ollama request timeouts and circuit breaker
+    OLLAMA_REQUEST_TIMEOUT: int = int(os.getenv("OLLAMA_REQUEST_TIMEOUT", "60"))  # Total seconds per request
+    OLLAMA_CONNECT_TIMEOUT: float = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "3"))  # Seconds to open a connection
+    OLLAMA_CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("OLLAMA_CIRCUIT_FAILURE_THRESHOLD", "3"))  # Failures that open the circuit
+    OLLAMA_CIRCUIT_RECOVERY_TIMEOUT: float = float(os.getenv("OLLAMA_CIRCUIT_RECOVERY_TIMEOUT", "15"))  # Seconds before a trial request
+
+    # Hedged requests - send a duplicate to a second backend if the first is slow
+    OLLAMA_HEDGE_ENABLED: bool = os.getenv("OLLAMA_HEDGE_ENABLED", "False").lower() == "true"
+    OLLAMA_HEDGE_MIN_DELAY: float = float(os.getenv("OLLAMA_HEDGE_MIN_DELAY", "0.5"))  # Never hedge sooner than this
+    OLLAMA_HEDGE_MAX_DELAY: float = float(os.getenv("OLLAMA_HEDGE_MAX_DELAY", "10"))  # Delay used before we have p95 data
+
+    # Model routing - easy requests go to a fast model, hard ones to a large model
+    MODEL_ROUTER_ENABLED: bool = os.getenv("MODEL_ROUTER_ENABLED", "False").lower() == "true"
+    FAST_MODEL: str = os.getenv("FAST_MODEL", "llama3.2:1b")  # Small model for greetings, short questions
+    LARGE_MODEL: str = os.getenv("LARGE_MODEL", os.getenv("OLLAMA_MODEL", "llama3"))  # Big model for code, long/complex prompts
+    MODEL_ROUTER_RULES: str = os.getenv("MODEL_ROUTER_RULES", "")  # Optional JSON overrides, e.g. {"threshold": 3}
+
+    # Model warm-up & keep-alive - avoid multi-second cold starts
+    OLLAMA_KEEP_ALIVE: str = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # How long Ollama keeps a model loaded after a request
+    MODEL_WARMUP_ENABLED: bool = os.getenv("MODEL_WARMUP_ENABLED", "True").lower() == "true"  # Load models on startup
+    MODEL_KEEPALIVE_INTERVAL: int = int(os.getenv("MODEL_KEEPALIVE_INTERVAL", "240"))  # Seconds between keep-alive pings
+    MODEL_IDLE_AFTER: int = int(os.getenv("MODEL_IDLE_AFTER", "1800"))  # Stop pinging models unused for this long
+    MODEL_RAM_BUDGET_MB: int = int(os.getenv("MODEL_RAM_BUDGET_MB", "0"))  # Max RAM for loaded models per backend (0 = no limit)
+
+    # Per-request Ollama options - num_ctx sized to the prompt, rounded to buckets
+    OLLAMA_CTX_BUCKETS: list = [
+        int(b) for b in os.getenv("OLLAMA_CTX_BUCKETS", "1024,2048,4096,8192").split(",") if b.strip()
+    ]  # Allowed num_ctx values (few sizes = Ollama reuses its loaded runner)
+    OLLAMA_PARALLEL_PER_BACKEND: int = int(os.getenv("OLLAMA_PARALLEL_PER_BACKEND", "4"))  # Match OLLAMA_NUM_PARALLEL on the servers
+    OLLAMA_MIN_PREDICT: int = int(os.getenv("OLLAMA_MIN_PREDICT", "128"))  # num_predict never shrinks below this under load
+
+    # Prompt assembly - stable prompt prefix so Ollama can reuse its KV-cache
+    PROMPT_HISTORY_TURNS: int = int(os.getenv("PROMPT_HISTORY_TURNS", "8"))  # Previous turns sent with each message
+    PROMPT_HISTORY_TRIM_STEP: int = int(os.getenv("PROMPT_HISTORY_TRIM_STEP", "4"))  # Turns dropped at once when history is too long
+
+    # Streaming - tokens are grouped into frames to save encode calls and writes
+    STREAM_FLUSH_INTERVAL_MS: int = int(os.getenv("STREAM_FLUSH_INTERVAL_MS", "30"))  # Max delay a token waits in a frame (0 = off)
+    STREAM_MAX_FRAME_BYTES: int = int(os.getenv("STREAM_MAX_FRAME_BYTES", "512"))  # Flush a frame once it is this big
+    STREAM_REPLAY_TTL: int = int(os.getenv("STREAM_REPLAY_TTL", "60"))  # Seconds a finished stream can still be resumed
+    STREAM_RESUME_GRACE: float = float(os.getenv("STREAM_RESUME_GRACE", "10"))  # Seconds a stream keeps generating with no client (0 = stop at once)
+
+    # WebSocket chat (/ws/chat) - many answers over one connection
+    WS_PING_INTERVAL: int = int(os.getenv("WS_PING_INTERVAL", "20"))  # Seconds between server pings (keeps proxies/tunnels open)
+    WS_MAX_CONCURRENT: int = int(os.getenv("WS_MAX_CONCURRENT", "4"))  # Generations running at once per connection
+
+    # LLM backend - which server answers (see llm_backends.py)
+    LLM_BACKEND: str = os.getenv("LLM_BACKEND", os.getenv("AI_MODEL", "ollama")).lower()  # ollama, openai (any OpenAI-compatible server), dummy
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "http://localhost:8080/v1").rstrip("/")  # llama.cpp server, vLLM, LM Studio, api.openai.com
+    OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")  # Only needed by servers that check it (e.g. api.openai.com)
+    OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", os.getenv("OLLAMA_MODEL", "llama3"))  # Model name sent to the server
+    LLM_EMBED_MODEL: str = os.getenv("LLM_EMBED_MODEL", "nomic-embed-text")  # Default model for embeddings
+
+    # Batch chat (/chat/batch) - low priority, only uses spare Ollama capacity
+    BATCH_MAX_LOAD: float = float(os.getenv("BATCH_MAX_LOAD", "0.75"))  # Batch never fills more than this share of Ollama slots
+    BATCH_MAX_PARALLEL: int = int(os.getenv("BATCH_MAX_PARALLEL", "4"))  # Max items of one batch running at once
+    BATCH_MAX_ITEMS: int = int(os.getenv("BATCH_MAX_ITEMS", "1000"))  # Max prompts per batch request
+
+    # Monitoring - Prometheus metrics at /metrics/prometheus
+    LOOP_LAG_INTERVAL_MS: int = int(os.getenv("LOOP_LAG_INTERVAL_MS", "250"))  # How often event-loop lag is sampled (0 = off)
+    LOOP_LAG_THRESHOLD_MS: int = int(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))  # Lag that counts as a stall - the blocking stack is captured (0 = off)
+
     # === MEMORY SETTINGS ===
     MEMORY_DIR: str = "../memory"  # Directory for conversation storage
     MAX_SESSIONS_PER_USER: int = 100  # Maximum sessions to keep per user
@@ -123,6 +200,19 @@ class Settings:
     # === FEATURE FLAGS ===
     # Enable/disable features
     ENABLE_WEB_SEARCH: bool = os.getenv("ENABLE_WEB_SEARCH", "False").lower() == "true"
+    WEB_SEARCH_URL: str = os.getenv("WEB_SEARCH_URL", "https://html.duckduckgo.com/html/")  # DuckDuckGo HTML endpoint (mock_ollama.py serves one for benchmarks)
+    WEB_SEARCH_CONCURRENCY: int = int(os.getenv("WEB_SEARCH_CONCURRENCY", "5"))  # Result pages downloaded at once
+    WEB_SEARCH_PER_HOST: int = int(os.getenv("WEB_SEARCH_PER_HOST", "2"))  # Connections per site at once
+    WEB_SEARCH_DEADLINE: float = float(os.getenv("WEB_SEARCH_DEADLINE", "8"))  # Seconds for a search's page downloads; late pages are skipped
+    WEB_SEARCH_PARSE_WORKERS: int = int(os.getenv("WEB_SEARCH_PARSE_WORKERS", "2"))  # HTML parsing workers (off the event loop)
+    WEB_SEARCH_PARSE_POOL: str = os.getenv("WEB_SEARCH_PARSE_POOL", "thread").lower()  # thread or process
+    WEB_SEARCH_PAGE_READ_KB: int = int(os.getenv("WEB_SEARCH_PAGE_READ_KB", "256"))  # KB read of each result page at most
+    WEB_SEARCH_PAGE_MAX_KB: int = int(os.getenv("WEB_SEARCH_PAGE_MAX_KB", "5120"))  # Pages announcing more are skipped
+    SEARCH_CACHE_ENABLED: bool = os.getenv("SEARCH_CACHE_ENABLED", "True").lower() == "true"  # Persistent search results / page text cache
+    SEARCH_CACHE_PATH: str = os.getenv("SEARCH_CACHE_PATH", "../memory/search_cache.db")  # SQLite file
+    SEARCH_CACHE_RESULTS_TTL: int = int(os.getenv("SEARCH_CACHE_RESULTS_TTL", "3600"))  # Seconds a query's results stay fresh (0 = off)
+    SEARCH_CACHE_PAGE_TTL: int = int(os.getenv("SEARCH_CACHE_PAGE_TTL", "86400"))  # Longest a page text stays fresh (0 = off)
+    SEARCH_CACHE_MAX_MB: int = int(os.getenv("SEARCH_CACHE_MAX_MB", "64"))  # Least recently used entries are evicted above this
     ENABLE_IMAGE_GEN: bool = os.getenv("ENABLE_IMAGE_GEN", "False").lower() == "true"
     ENABLE_VOICE: bool = os.getenv("ENABLE_VOICE", "False").lower() == "true"
     ENABLE_RAG: bool = os.getenv("ENABLE_RAG", "False").lower() == "true"
@@ -147,6 +237,7 @@ class Settings:
     
     # === DEVELOPMENT MODE ===
     DEBUG_MODE: bool = os.getenv("DEBUG_MODE", "False").lower() == "true"  # Default to production mode
+    PROFILER_MAX_SECONDS: int = int(os.getenv("PROFILER_MAX_SECONDS", "60"))  # Longest /debug/profile run (debug mode + API key only)
     
     # === RATE LIMITING ===
     # Prevent abuse
@@ -194,8 +285,9 @@ class Settings:
         issues = []
         
         # Check if AI model requires API key
-        if cls.DEFAULT_AI_MODEL == "openai" and not cls.OPENAI_API_KEY:
-            issues.append("OpenAI model selected but OPENAI_API_KEY not set")
+        # (local OpenAI-compatible servers don't need one)
+        if cls.LLM_BACKEND == "openai" and "api.openai.com" in cls.OPENAI_BASE_URL and not cls.OPENAI_API_KEY:
+            issues.append("OpenAI API selected but OPENAI_API_KEY not set")
         
         # Check memory directory
         if not cls.MEMORY_DIR:
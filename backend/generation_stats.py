@@ -0,0 +1,223 @@
+"""
+generation_stats.py - Real throughput numbers per model, from Ollama itself
+Every Ollama answer ends with timing counters; we keep them instead of dropping them
+
+Ollama's final response (non-streaming reply or the last "done" chunk) carries:
+    prompt_eval_count     prompt tokens evaluated (only the uncached part)
+    prompt_eval_duration  nanoseconds spent on them
+    eval_count            tokens generated
+    eval_duration         nanoseconds spent generating
+    load_duration         nanoseconds spent loading the model
+
+Per generation this becomes prompt tokens/s, generated tokens/s and whether
+the model had to be loaded (a "cold load": load_duration above
+COLD_LOAD_SECONDS). Per model we keep totals plus a window of recent
+generations, so the numbers follow the machine as it gets busier.
+
+Where it shows up:
+- ChatResponse.generation (this request's numbers)
+- /metrics "generation_stats" and /metrics/prometheus (nitro_llm_* per model)
+- model_router's report (measured speed of the fast and large models)
+
+Usage:
+    >>> stats = generation_stats.record("llama3.2:1b", ollama_response)
+    >>> stats["tokens_per_second"]
+    24.3
+    >>> generation_stats.tokens_per_second("llama3.2:1b")
+    23.8
+"""
+
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+# Import with compatibility for both local and package mode
+try:
+    from .metrics import registry
+    from .ollama_pool import normalize_model_name
+    from . import request_timing
+except ImportError:
+    from metrics import registry
+    from ollama_pool import normalize_model_name
+    import request_timing
+
+
+# A warm model reports a few milliseconds of load_duration; a real load takes seconds
+COLD_LOAD_SECONDS = 0.5
+
+
+def _rate(tokens: float, seconds: float) -> Optional[float]:
+    return round(tokens / seconds, 1) if tokens and seconds > 0 else None
+
+
+def parse_ollama_stats(data: Dict) -> Optional[Dict]:
+    """
+    Turn Ollama's final response fields into one generation's numbers.
+
+    Args:
+        data: Non-streaming /api/chat response or the last ("done") chunk
+
+    Returns:
+        Dict with token counts, durations (ms) and rates, or None when the
+        response has no timing fields (e.g. an OpenAI-compatible server)
+    """
+    if not data or "eval_count" not in data and "prompt_eval_count" not in data:
+        return None
+    prompt_tokens = data.get("prompt_eval_count") or 0
+    prompt_seconds = (data.get("prompt_eval_duration") or 0) / 1e9
+    tokens = data.get("eval_count") or 0
+    eval_seconds = (data.get("eval_duration") or 0) / 1e9
+    load_seconds = (data.get("load_duration") or 0) / 1e9
+    return {
+        "prompt_tokens": prompt_tokens,
+        "prompt_ms": round(prompt_seconds * 1000, 1),
+        "prompt_tokens_per_second": _rate(prompt_tokens, prompt_seconds),
+        "generated_tokens": tokens,
+        "generation_ms": round(eval_seconds * 1000, 1),
+        "tokens_per_second": _rate(tokens, eval_seconds),
+        "load_ms": round(load_seconds * 1000, 1),
+        "cold_load": load_seconds >= COLD_LOAD_SECONDS,
+        "total_ms": round((data.get("total_duration") or 0) / 1e6, 1),
+    }
+
+
+class GenerationStats:
+    """
+    Per-model aggregation of Ollama generation statistics.
+
+    Totals go into Prometheus counters (rates over any time range can be
+    computed there); a window of recent generations gives the current
+    tokens/second for the JSON report and for decisions in the app.
+    """
+
+    def __init__(self, registry, window: int = 50):
+        """
+        Args:
+            registry: MetricsRegistry (metrics.py) the counters live in
+            window: Recent generations per model used for current rates
+        """
+        self.window = window
+        self._models: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+        self.generations = registry.counter("nitro_llm_generations_total", "Ollama generations", ["model"])
+        self.prompt_tokens = registry.counter(
+            "nitro_llm_prompt_tokens_total", "Prompt tokens evaluated by Ollama (uncached part)", ["model"]
+        )
+        self.prompt_seconds = registry.counter(
+            "nitro_llm_prompt_eval_seconds_total", "Time Ollama spent evaluating prompts", ["model"]
+        )
+        self.generated_tokens = registry.counter(
+            "nitro_llm_generated_tokens_total", "Tokens generated by Ollama", ["model"]
+        )
+        self.generation_seconds = registry.counter(
+            "nitro_llm_generation_seconds_total", "Time Ollama spent generating tokens", ["model"]
+        )
+        self.load_seconds = registry.counter(
+            "nitro_llm_load_seconds_total", "Time Ollama spent loading models", ["model"]
+        )
+        self.cold_loads = registry.counter(
+            "nitro_llm_cold_loads_total", f"Generations that had to load the model (load >= {COLD_LOAD_SECONDS}s)",
+            ["model"]
+        )
+        registry.gauge_callback(
+            "nitro_llm_prompt_tokens_per_second", "Prompt evaluation speed over recent generations",
+            lambda: self._recent_rates("prompt_tokens", "prompt_seconds"), ["model"]
+        )
+        registry.gauge_callback(
+            "nitro_llm_generated_tokens_per_second", "Generation speed over recent generations",
+            lambda: self._recent_rates("tokens", "eval_seconds"), ["model"]
+        )
+
+    def record(self, model: str, data: Dict) -> Optional[Dict]:
+        """
+        Add one finished Ollama generation.
+
+        The numbers are also attached to the current request's timing, so
+        the endpoint can return them (ChatResponse.generation).
+
+        Args:
+            model: Model that answered
+            data: Ollama's final response (see parse_ollama_stats)
+
+        Returns:
+            This generation's numbers (None if the response had none)
+        """
+        stats = parse_ollama_stats(data)
+        if stats is None:
+            return None
+        model = normalize_model_name(model) or "unknown"
+        stats = {"model": model, **stats}
+
+        prompt_seconds = stats["prompt_ms"] / 1000
+        eval_seconds = stats["generation_ms"] / 1000
+        load_seconds = stats["load_ms"] / 1000
+        self.generations.labels(model).inc()
+        self.prompt_tokens.labels(model).inc(stats["prompt_tokens"])
+        self.prompt_seconds.labels(model).inc(prompt_seconds)
+        self.generated_tokens.labels(model).inc(stats["generated_tokens"])
+        self.generation_seconds.labels(model).inc(eval_seconds)
+        self.load_seconds.labels(model).inc(load_seconds)
+        if stats["cold_load"]:
+            self.cold_loads.labels(model).inc()
+
+        with self._lock:
+            entry = self._models.get(model)
+            if entry is None:
+                entry = self._models[model] = {
+                    "generations": 0,
+                    "cold_loads": 0,
+                    "load_seconds": 0.0,
+                    "recent": deque(maxlen=self.window),
+                }
+            entry["generations"] += 1
+            entry["load_seconds"] += load_seconds
+            if stats["cold_load"]:
+                entry["cold_loads"] += 1
+            entry["recent"].append({
+                "prompt_tokens": stats["prompt_tokens"],
+                "prompt_seconds": prompt_seconds,
+                "tokens": stats["generated_tokens"],
+                "eval_seconds": eval_seconds,
+            })
+
+        request_timing.record_generation(stats)
+        return stats
+
+    def _recent(self, model: str, tokens_key: str, seconds_key: str) -> Optional[float]:
+        entry = self._models.get(model)
+        if entry is None:
+            return None
+        recent = list(entry["recent"])
+        return _rate(sum(g[tokens_key] for g in recent), sum(g[seconds_key] for g in recent))
+
+    def _recent_rates(self, tokens_key: str, seconds_key: str) -> Dict:
+        return {(model,): self._recent(model, tokens_key, seconds_key) for model in list(self._models)}
+
+    def tokens_per_second(self, model: str) -> Optional[float]:
+        """Current generation speed of a model (None until it has answered)."""
+        return self._recent(normalize_model_name(model), "tokens", "eval_seconds")
+
+    def prompt_tokens_per_second(self, model: str) -> Optional[float]:
+        """Current prompt evaluation speed of a model (None until it has answered)."""
+        return self._recent(normalize_model_name(model), "prompt_tokens", "prompt_seconds")
+
+    def get_stats(self) -> Dict:
+        """Per-model rates and load frequency for the JSON /metrics."""
+        report = {"window": self.window, "cold_load_seconds": COLD_LOAD_SECONDS, "models": {}}
+        with self._lock:
+            for model, entry in self._models.items():
+                generations = entry["generations"]
+                report["models"][model] = {
+                    "generations": generations,
+                    "prompt_tokens_per_second": self._recent(model, "prompt_tokens", "prompt_seconds"),
+                    "generated_tokens_per_second": self._recent(model, "tokens", "eval_seconds"),
+                    "cold_loads": entry["cold_loads"],
+                    "cold_load_rate": round(entry["cold_loads"] / generations, 3),
+                    "avg_load_ms": round(entry["load_seconds"] / generations * 1000, 1),
+                }
+        return report
+
+
+# Create a singleton instance
+generation_stats = GenerationStats(registry)
@@ -0,0 +1,949 @@
+"""
+llm_backends.py - One interface for every LLM server
+Endpoints talk to `llm_backend`; which server answers is a setting (LLM_BACKEND)
+
+Backends:
+- "ollama": the Ollama pool (load balancing, circuit breakers, hedging,
+  per-request num_ctx, KV-cache prefix report, model warm-up)
+- "openai": any OpenAI-compatible server - a local llama.cpp server
+  (`llama-server --port 8080`), vLLM (CPU build), LM Studio, or OpenAI itself
+- "dummy": deterministic canned answers, no server needed (tests, benchmarks)
+
+Every backend implements the same four calls:
+- generate(messages, ...) -> answer text (None if the server failed)
+- stream(messages, ...)   -> async generator of text chunks
+- embed(texts, ...)       -> one vector per text
+- health()                -> {"backend", "healthy", ...}
+
+Messages are plain chat messages ({"role", "content"}), built by
+prompt_builder.py, so switching servers never changes the prompt.
+
+Usage:
+    >>> messages = prompt_builder.build("Hello!")
+    >>> answer = await llm_backend.generate(messages)
+    >>> async for chunk in llm_backend.stream(messages):
+    ...     print(chunk, end="")
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import threading
+import time
+from typing import AsyncGenerator, Dict, List, Optional
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+# Import with compatibility for both local and package mode
+try:
+    from .config import settings
+    from .logger import logger
+    from .ollama_pool import ollama_pool
+    from .model_keeper import model_keeper
+    from .ollama_options import options_planner
+    from .prompt_builder import prompt_builder
+    from .generation_stats import generation_stats
+    from . import request_timing
+except ImportError:
+    from config import settings
+    from logger import logger
+    from ollama_pool import ollama_pool
+    from model_keeper import model_keeper
+    from ollama_options import options_planner
+    from prompt_builder import prompt_builder
+    from generation_stats import generation_stats
+    import request_timing
+
+
+class LLMBackendError(Exception):
+    """A stream or embed request failed (connection error, timeout or bad HTTP status)."""
+
+
+class BackendError(Exception):
+    """One pooled Ollama server failed (connection error, timeout or 5xx) - worth retrying elsewhere."""
+
+    def __init__(self, node, message: str):
+        super().__init__(message)
+        self.node = node
+
+
+# ============================================================================
+# STREAM PARSING
+# ============================================================================
+
+async def iter_lines(content) -> AsyncGenerator[bytes, None]:
+    """
+    Split a streamed HTTP body into lines incrementally.
+
+    Reads whatever bytes have arrived (no fixed line-length limit) and
+    keeps one growing buffer, so a line split across network reads is
+    joined without copying the whole stream again.
+
+    Args:
+        content: aiohttp StreamReader (response.content)
+
+    Yields:
+        Non-empty lines (stripped)
+    """
+    buffer = bytearray()
+    async for data in content.iter_any():
+        buffer.extend(data)
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            line = bytes(buffer[start:end]).strip()
+            start = end + 1
+            if line:
+                yield line
+        if start:
+            del buffer[:start]
+    # Last line without a trailing newline
+    line = bytes(buffer).strip()
+    if line:
+        yield line
+
+
+async def iter_ndjson(content) -> AsyncGenerator[Dict, None]:
+    """
+    Parse an NDJSON body (Ollama streaming: one JSON object per line).
+
+    Yields:
+        Parsed JSON objects (malformed lines are skipped)
+    """
+    async for line in iter_lines(content):
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+
+async def iter_sse_json(content) -> AsyncGenerator[Dict, None]:
+    """
+    Parse a Server-Sent Events body (OpenAI streaming: `data: {...}` lines).
+
+    Stops at `data: [DONE]`.
+
+    Yields:
+        Parsed JSON objects (comments, other fields and malformed lines are skipped)
+    """
+    async for line in iter_lines(content):
+        if not line.startswith(b"data:"):
+            continue
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            return
+        try:
+            yield json.loads(data)
+        except json.JSONDecodeError:
+            continue
+
+
+# ============================================================================
+# INTERFACE
+# ============================================================================
+
+class LLMBackend:
+    """
+    Interface every LLM backend implements.
+
+    Options (all optional, per request):
+        temperature, top_p, max_tokens
+    """
+
+    name = "base"
+    source = "unknown"  # ChatResponse.ai_source
+    setup_hint = ""  # Shown to the user when the backend is unavailable
+
+    def __init__(self, default_model: str, default_max_tokens: int = 800):
+        """
+        Initialize the backend.
+
+        Args:
+            default_model: Model used when a request doesn't name one
+            default_max_tokens: Answer length when a request doesn't set max_tokens
+        """
+        self.default_model = default_model
+        self.default_max_tokens = default_max_tokens
+
+    async def generate(
+        self,
+        messages: List[Dict],
+        model: Optional[str] = None,
+        options: Optional[Dict] = None,
+        session_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_retries: int = 2
+    ) -> Optional[str]:
+        """
+        Get a complete answer.
+
+        Args:
+            messages: Chat messages (see prompt_builder.build)
+            model: Model name (default: default_model)
+            options: temperature, top_p, max_tokens
+            session_id: Conversation ID (lets a backend keep a session on one server)
+            timeout: Seconds for the whole request
+            max_retries: Extra attempts after a server failure
+
+        Returns:
+            Answer text, or None if the server failed or answered nothing
+        """
+        raise NotImplementedError
+
+    async def stream(
+        self,
+        messages: List[Dict],
+        model: Optional[str] = None,
+        options: Optional[Dict] = None,
+        session_id: Optional[str] = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        Stream an answer chunk by chunk.
+
+        Closing the generator (client gone) closes the connection, which
+        stops generation on the server.
+
+        Yields:
+            Text chunks
+
+        Raises:
+            LLMBackendError: If the server can't be reached or refuses the request
+        """
+        raise NotImplementedError
+        yield  # Makes this an async generator
+
+    async def embed(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        """
+        Get one embedding vector per text.
+
+        Args:
+            texts: Texts to embed
+            model: Embedding model (default: LLM_EMBED_MODEL)
+
+        Returns:
+            List of vectors, same order as texts
+
+        Raises:
+            LLMBackendError: If the server failed
+        """
+        raise NotImplementedError
+
+    async def health(self) -> Dict:
+        """
+        Check whether the backend can take requests.
+
+        Returns:
+            {"backend": name, "healthy": bool, ...details}
+        """
+        raise NotImplementedError
+
+    def start(self):
+        """Start background work (app startup)."""
+
+    async def stop(self):
+        """Stop background work (app shutdown)."""
+
+    def get_stats(self) -> Dict:
+        """Get request counters."""
+        return {"backend": self.name, "default_model": self.default_model}
+
+    def _max_tokens(self, options: Dict) -> int:
+        return options.get("max_tokens") or self.default_max_tokens
+
+
+# ============================================================================
+# OLLAMA (pooled)
+# ============================================================================
+
+class OllamaBackend(LLMBackend):
+    """
+    Ollama servers behind the load-balanced pool (ollama_pool.py).
+
+    Each attempt goes to a backend picked by the pool. A retry only
+    goes to a backend that hasn't failed this request yet, so a single
+    struggling Ollama never gets the same request piled on twice.
+    """
+
+    name = "ollama"
+    source = "ollama_local"
+    setup_hint = (
+        "Ollama AI is not running. Please:\n\n"
+        "1. Install Ollama: https://ollama.com/download\n"
+        "2. Pull a model: ollama pull llama3.2:1b\n"
+        "3. Start server: ollama serve\n\n"
+        "Ollama is 100% free and runs locally on your device!"
+    )
+
+    def __init__(
+        self,
+        pool,
+        default_model: str,
+        default_max_tokens: int = 800,
+        keeper=None,
+        planner=None,
+        builder=None,
+        stats=None,
+        keep_alive: Optional[str] = None,
+        request_timeout: float = 60,
+        connect_timeout: float = 3,
+        hedge_enabled: bool = False,
+        embed_model: str = "nomic-embed-text"
+    ):
+        """
+        Initialize the Ollama backend.
+
+        Args:
+            pool: OllamaPool (backend selection, circuit breakers, stats)
+            default_model: Model used when a request doesn't name one
+            default_max_tokens: Answer length when a request doesn't set max_tokens
+            keeper: ModelKeeper (warm-up/keep-alive), started with the backend
+            planner: OllamaOptionsPlanner (num_ctx/num_predict per request)
+            builder: PromptBuilder (prefix-reuse report from prompt_eval_count)
+            stats: GenerationStats (per-model tokens/s and load counts)
+            keep_alive: How long Ollama keeps the model loaded (e.g. "30m")
+            request_timeout: Default seconds per request
+            connect_timeout: Seconds to open a connection
+            hedge_enabled: Duplicate slow requests to a second backend
+            embed_model: Default model for embed()
+        """
+        super().__init__(default_model, default_max_tokens)
+        self.pool = pool
+        self.keeper = keeper
+        self.planner = planner
+        self.builder = builder
+        self.stats = stats
+        self.keep_alive = keep_alive
+        self.request_timeout = request_timeout
+        self.connect_timeout = connect_timeout
+        self.hedge_enabled = hedge_enabled
+        self.embed_model = embed_model
+
+    def _payload(self, messages: List[Dict], model: str, options: Dict, stream: bool) -> Dict:
+        """Build the JSON body for /api/chat."""
+        max_tokens = self._max_tokens(options)
+        planned = {"num_predict": max_tokens}
+        if self.planner is not None:
+            # num_ctx / num_predict sized to this prompt and the current load
+            planned = self.planner.plan(messages, model, max_tokens=max_tokens)
+
+        payload = {
+            "model": model,
+            "messages": messages,
+            "stream": stream,
+            "options": {
+                **planned,
+                "temperature": options.get("temperature", 0.7),  # Creativity vs accuracy
+                "top_p": options.get("top_p", 0.9),
+            }
+        }
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive  # Keep the model loaded between requests
+        return payload
+
+    def _record_prompt_eval(self, model: str, messages: List[Dict], data: Dict):
+        """Prefix-reuse report + token estimate calibration."""
+        if self.builder is not None:
+            self.builder.record_prompt_eval(model, messages, data)
+
+    def _record_generation(self, model: str, data: Dict):
+        """Per-model throughput numbers from the final response."""
+        if self.stats is not None:
+            self.stats.record(model, data)
+
+    def _record_timing(self, data: Dict):
+        """Server-side TTFT (model load + prompt evaluation) and tokens for Server-Timing."""
+        nanoseconds = (data.get("load_duration") or 0) + (data.get("prompt_eval_duration") or 0)
+        if nanoseconds:
+            request_timing.record("llm_ttft", nanoseconds / 1e9)
+        if data.get("eval_count"):
+            request_timing.record_value("llm_tokens", data["eval_count"])
+
+    async def _chat_on_node(self, session, node, payload, model):
+        """
+        Send one /api/chat request to one backend and release it afterwards.
+
+        Returns:
+            str: AI response, or None for an empty reply / client error
+
+        Raises:
+            BackendError: If the backend failed
+        """
+        start_time = time.time()
+        error = None
+        cancelled = False
+        client_error = False
+        try:
+            async with session.post(f"{node.url}/api/chat", json=payload) as response:
+                if response.status == 200:
+                    response_data = await response.json()
+                    self._record_prompt_eval(model, payload["messages"], response_data)
+                    self._record_timing(response_data)
+                    self._record_generation(model, response_data)
+                    # Extract AI response from chat API format
+                    ai_text = response_data.get("message", {}).get("content", "").strip()
+                    if ai_text:
+                        return ai_text
+                    logger.warning("⚠️ Ollama returned empty response")
+                    return None
+
+                logger.warning("⚠️ Ollama HTTP %s from %s", response.status, node.url)
+                if response.status >= 500:
+                    # 5xx means the backend itself is struggling
+                    error = f"HTTP {response.status}"
+                    raise BackendError(node, error)
+                # 4xx (e.g. model not pulled) - not the backend's fault, don't retry
+                client_error = True
+                error = f"HTTP {response.status}"
+                return None
+
+        except aiohttp.ClientConnectionError:
+            error = "connection error"
+            raise BackendError(node, error)
+
+        except asyncio.TimeoutError:
+            error = "timeout"
+            raise BackendError(node, error)
+
+        except asyncio.CancelledError:
+            # Losing hedge (or client gone) - free the slot without judging the backend
+            cancelled = True
+            raise
+
+        except Exception as e:
+            error = error or type(e).__name__
+            raise
+
+        finally:
+            if cancelled:
+                self.pool.release(node, cancelled=True)
+            elif client_error:
+                self.pool.release(node, model=model, error=error, client_error=True)
+            else:
+                self.pool.release(node, time.time() - start_time, error is None, model, error)
+
+    async def _hedged_chat(self, session, primary, payload, model):
+        """
+        Run a request on `primary`, hedging to a second backend if it is slow.
+
+        The hedge fires after the primary backend's p95 latency. Whichever
+        backend answers first wins; the other request is cancelled, which
+        closes its connection so Ollama stops generating.
+
+        Returns:
+            str: AI response or None
+
+        Raises:
+            BackendError: If every backend we tried failed
+        """
+        first = asyncio.ensure_future(self._chat_on_node(session, primary, payload, model))
+        if not self.hedge_enabled:
+            return await first
+
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self.pool.hedge_delay(primary))
+        except asyncio.CancelledError:
+            # asyncio.wait() leaves `first` running; cancel it so the primary
+            # is released as cancelled, not failed when the session closes
+            first.cancel()
+            await asyncio.gather(first, return_exceptions=True)
+            raise
+        if done:
+            return first.result()
+
+        backup = self.pool.acquire(model, exclude=[primary])
+        if backup is None:
+            # Nobody to hedge to
+            return await first
+
+        logger.info("🪁 Hedging slow request from %s to %s", primary.url, backup.url)
+        second = asyncio.ensure_future(self._chat_on_node(session, backup, payload, model))
+        pending = {first, second}
+        last_error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.pool.record_hedge(won=task is second)
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def generate(self, messages, model=None, options=None, session_id=None, timeout=None, max_retries=2):
+        model = model or self.default_model
+        timeout = timeout or self.request_timeout
+        payload = self._payload(messages, model, options or {}, stream=False)
+
+        failed_nodes = []
+        client_timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=self.connect_timeout)
+
+        async with aiohttp.ClientSession(timeout=client_timeout) as session:
+            # Retry loop for robustness
+            for attempt in range(max_retries + 1):
+                # Pick a backend that hasn't failed this request (skips open circuits)
+                node = self.pool.acquire(model, exclude=failed_nodes, session_id=session_id)
+                if node is None:
+                    if failed_nodes:
+                        logger.error("❌ All Ollama backends failed for this request")
+                    else:
+                        logger.error("❌ No Ollama backend available (circuits open or backends ejected)")
+                    return None
+
+                try:
+                    if attempt > 0:
+                        logger.info("🔄 Retry attempt %d/%d on %s...", attempt, max_retries, node.url)
+                    else:
+                        logger.info("🤖 Querying Ollama (%s)...", model)
+
+                    ai_text = await self._hedged_chat(session, node, payload, model)
+                    if ai_text:
+                        logger.info("✅ Ollama (%s) responded successfully", model)
+                    # Don't retry on empty response or client errors
+                    return ai_text
+
+                except BackendError as e:
+                    failed_nodes.append(e.node)
+                    if e.node is not node:
+                        failed_nodes.append(node)
+                    if attempt < max_retries:
+                        logger.warning("⚠️ Ollama %s on %s, retrying elsewhere... (%s/%s)", e, e.node.url, attempt + 1, max_retries)
+                        continue
+                    if str(e) == "timeout":
+                        logger.error("❌ Ollama timeout after %ss. Model may be loading or too slow.", timeout)
+                    else:
+                        logger.error("❌ Ollama not running. Please start it with: ollama serve")
+                    return None
+
+                except Exception as e:
+                    logger.error("❌ Ollama error: %s: %s", type(e).__name__, e)
+                    return None
+
+        return None
+
+    async def stream(self, messages, model=None, options=None, session_id=None):
+        model = model or self.default_model
+        payload = self._payload(messages, model, options or {}, stream=True)
+
+        node = self.pool.acquire(model, session_id=session_id)
+        if node is None:
+            raise LLMBackendError("No healthy Ollama backend available")
+
+        start_time = time.time()
+        error = None
+        cancelled = False
+        client_error = False
+        try:
+            client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.connect_timeout)
+            async with aiohttp.ClientSession(timeout=client_timeout) as session:
+                async with session.post(f"{node.url}/api/chat", json=payload) as response:
+                    if response.status != 200:
+                        error = f"HTTP {response.status}"
+                        client_error = response.status < 500
+                        raise LLMBackendError(f"Ollama HTTP {response.status}: {await response.text()}")
+                    async for data in iter_ndjson(response.content):
+                        chunk = data.get("message", {}).get("content", "")
+                        if chunk:
+                            yield chunk
+                        if data.get("done"):
+                            # Final chunk carries the token counts
+                            self._record_prompt_eval(model, messages, data)
+                            self._record_generation(model, data)
+        except (asyncio.CancelledError, GeneratorExit):
+            # Nobody is reading anymore - also while Ollama was still loading
+            # the model or reading the prompt. Leaving the `async with` closes
+            # the connection, which tells Ollama to stop generating
+            cancelled = True
+            raise
+        except aiohttp.ClientError as e:
+            error = type(e).__name__
+            raise LLMBackendError(f"Cannot reach Ollama at {node.url}: {e}")
+        finally:
+            if cancelled:
+                # Client went away - free the slot without judging the backend
+                self.pool.release(node, cancelled=True)
+            elif client_error:
+                self.pool.release(node, model=model, error=error, client_error=True)
+            else:
+                self.pool.release(node, time.time() - start_time, error is None, model, error)
+
+    async def embed(self, texts, model=None):
+        model = model or self.embed_model
+        node = self.pool.acquire(model)
+        if node is None:
+            raise LLMBackendError("No healthy Ollama backend available")
+
+        start_time = time.time()
+        error = None
+        client_error = False
+        try:
+            client_timeout = aiohttp.ClientTimeout(total=self.request_timeout, sock_connect=self.connect_timeout)
+            async with aiohttp.ClientSession(timeout=client_timeout) as session:
+                async with session.post(f"{node.url}/api/embed", json={"model": model, "input": texts}) as response:
+                    if response.status != 200:
+                        error = f"HTTP {response.status}"
+                        client_error = response.status < 500
+                        raise LLMBackendError(f"Ollama embed HTTP {response.status}: {await response.text()}")
+                    return (await response.json()).get("embeddings", [])
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = type(e).__name__
+            raise LLMBackendError(f"Ollama embed failed on {node.url}: {error}")
+        finally:
+            if client_error:
+                self.pool.release(node, model=model, error=error, client_error=True)
+            else:
+                self.pool.release(node, time.time() - start_time, error is None, model, error)
+
+    async def health(self):
+        stats = self.pool.get_stats()
+        return {
+            "backend": self.name,
+            "healthy": stats["healthy"] > 0,
+            "servers": stats["total"],
+            "healthy_servers": stats["healthy"],
+        }
+
+    def start(self):
+        # Background health checks for the pool, then model warm-up
+        self.pool.start()
+        logger.info(f"🩺 Ollama pool health checks running ({len(self.pool.nodes)} backend(s))")
+        if self.keeper is not None:
+            self.keeper.start()
+            logger.info(f"🔥 Model warm-up/keep-alive running for: {', '.join(self.keeper.models)}")
+
+    async def stop(self):
+        if self.keeper is not None:
+            await self.keeper.stop()
+        await self.pool.stop()
+
+    def get_stats(self):
+        stats = self.pool.get_stats()
+        return {
+            **super().get_stats(),
+            "servers": stats["total"],
+            "healthy_servers": stats["healthy"],
+        }
+
+
+# ============================================================================
+# OPENAI-COMPATIBLE (llama.cpp server, vLLM, LM Studio, OpenAI)
+# ============================================================================
+
+class OpenAICompatBackend(LLMBackend):
+    """
+    Any server that speaks the OpenAI API (/v1/chat/completions, /v1/embeddings).
+
+    Local examples:
+    - llama.cpp:  llama-server -m model.gguf --port 8080   -> http://localhost:8080/v1
+    - vLLM (CPU): vllm serve <model> --port 8000           -> http://localhost:8000/v1
+    - LM Studio:  local server tab                         -> http://localhost:1234/v1
+    """
+
+    name = "openai"
+    source = "openai_compatible"
+
+    def __init__(
+        self,
+        base_url: str,
+        default_model: str,
+        api_key: str = "",
+        default_max_tokens: int = 800,
+        request_timeout: float = 60,
+        connect_timeout: float = 3,
+        embed_model: str = "nomic-embed-text"
+    ):
+        """
+        Initialize the OpenAI-compatible backend.
+
+        Args:
+            base_url: API root including /v1 (e.g. http://localhost:8080/v1)
+            default_model: Model used when a request doesn't name one
+                           (llama.cpp serves one model and ignores the name)
+            api_key: Bearer token (empty for most local servers)
+            default_max_tokens: Answer length when a request doesn't set max_tokens
+            request_timeout: Default seconds per request
+            connect_timeout: Seconds to open a connection
+            embed_model: Default model for embed()
+        """
+        super().__init__(default_model, default_max_tokens)
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.request_timeout = request_timeout
+        self.connect_timeout = connect_timeout
+        self.embed_model = embed_model
+        self.setup_hint = (
+            f"The LLM server at {self.base_url} is not reachable. Please:\n\n"
+            "1. Start it, e.g. llama.cpp: llama-server -m model.gguf --port 8080\n"
+            "2. Check OPENAI_BASE_URL in .env (it must end with /v1)"
+        )
+
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "latency_seconds": 0.0}
+
+    def _headers(self) -> Dict:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def _payload(self, messages: List[Dict], model: str, options: Dict, stream: bool) -> Dict:
+        """Build the JSON body for /chat/completions."""
+        return {
+            "model": model,
+            "messages": messages,
+            "stream": stream,
+            "temperature": options.get("temperature", 0.7),
+            "top_p": options.get("top_p", 0.9),
+            "max_tokens": self._max_tokens(options),
+        }
+
+    def _record(self, latency: float, success: bool):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["latency_seconds"] += latency
+            if not success:
+                self.stats["errors"] += 1
+
+    async def generate(self, messages, model=None, options=None, session_id=None, timeout=None, max_retries=2):
+        model = model or self.default_model
+        timeout = timeout or self.request_timeout
+        payload = self._payload(messages, model, options or {}, stream=False)
+        client_timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=self.connect_timeout)
+
+        async with aiohttp.ClientSession(timeout=client_timeout, headers=self._headers()) as session:
+            for attempt in range(max_retries + 1):
+                start_time = time.time()
+                error = None
+                try:
+                    if attempt > 0:
+                        logger.info("🔄 Retry attempt %d/%d on %s...", attempt, max_retries, self.base_url)
+                    else:
+                        logger.info("🤖 Querying %s (%s)...", self.base_url, model)
+
+                    async with session.post(f"{self.base_url}/chat/completions", json=payload) as response:
+                        if response.status == 200:
+                            data = await response.json()
+                            usage = data.get("usage") or {}
+                            if usage.get("completion_tokens"):
+                                request_timing.record_value("llm_tokens", usage["completion_tokens"])
+                            choices = data.get("choices") or [{}]
+                            ai_text = (choices[0].get("message", {}).get("content") or "").strip()
+                            if ai_text:
+                                logger.info("✅ %s (%s) responded successfully", self.base_url, model)
+                                return ai_text
+                            logger.warning("⚠️ LLM server returned empty response")
+                            return None
+
+                        logger.warning("⚠️ LLM server HTTP %s from %s", response.status, self.base_url)
+                        if response.status < 500:
+                            # 4xx (bad model name, auth) - retrying won't help
+                            return None
+                        error = f"HTTP {response.status}"
+
+                except aiohttp.ClientConnectionError:
+                    error = "connection error"
+                except asyncio.TimeoutError:
+                    error = "timeout"
+                except Exception as e:
+                    error = type(e).__name__
+                    logger.error("❌ LLM server error: %s: %s", error, e)
+                    return None
+                finally:
+                    self._record(time.time() - start_time, error is None)
+
+                if attempt < max_retries:
+                    logger.warning("⚠️ LLM server %s, retrying... (%s/%s)", error, attempt + 1, max_retries)
+                    await asyncio.sleep(0.5 * (attempt + 1))
+
+        logger.error("❌ LLM server at %s failed: %s", self.base_url, error)
+        return None
+
+    async def stream(self, messages, model=None, options=None, session_id=None):
+        model = model or self.default_model
+        payload = self._payload(messages, model, options or {}, stream=True)
+
+        start_time = time.time()
+        success = False
+        cancelled = False
+        try:
+            client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.connect_timeout)
+            async with aiohttp.ClientSession(timeout=client_timeout, headers=self._headers()) as session:
+                async with session.post(f"{self.base_url}/chat/completions", json=payload) as response:
+                    if response.status != 200:
+                        raise LLMBackendError(f"LLM server HTTP {response.status}: {await response.text()}")
+                    try:
+                        async for data in iter_sse_json(response.content):
+                            for choice in data.get("choices") or []:
+                                chunk = (choice.get("delta") or {}).get("content")
+                                if chunk:
+                                    yield chunk
+                    except (asyncio.CancelledError, GeneratorExit):
+                        # Closing the connection stops generation on the server
+                        cancelled = True
+                        response.close()
+                        raise
+                    success = True
+        except aiohttp.ClientError as e:
+            raise LLMBackendError(f"Cannot reach LLM server at {self.base_url}: {e}")
+        finally:
+            if not cancelled:
+                self._record(time.time() - start_time, success)
+
+    async def embed(self, texts, model=None):
+        model = model or self.embed_model
+        client_timeout = aiohttp.ClientTimeout(total=self.request_timeout, sock_connect=self.connect_timeout)
+        try:
+            async with aiohttp.ClientSession(timeout=client_timeout, headers=self._headers()) as session:
+                async with session.post(f"{self.base_url}/embeddings", json={"model": model, "input": texts}) as response:
+                    if response.status != 200:
+                        raise LLMBackendError(f"LLM server embed HTTP {response.status}: {await response.text()}")
+                    data = (await response.json()).get("data", [])
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise LLMBackendError(f"LLM server embed failed: {type(e).__name__}")
+        # Results carry an index; don't rely on the server keeping the order
+        return [item["embedding"] for item in sorted(data, key=lambda item: item.get("index", 0))]
+
+    async def health(self):
+        start_time = time.time()
+        try:
+            client_timeout = aiohttp.ClientTimeout(total=5, sock_connect=self.connect_timeout)
+            async with aiohttp.ClientSession(timeout=client_timeout, headers=self._headers()) as session:
+                async with session.get(f"{self.base_url}/models") as response:
+                    healthy = response.status == 200
+        except Exception as e:
+            return {"backend": self.name, "healthy": False, "url": self.base_url, "error": type(e).__name__}
+        return {
+            "backend": self.name,
+            "healthy": healthy,
+            "url": self.base_url,
+            "latency_ms": round((time.time() - start_time) * 1000, 1),
+        }
+
+    def get_stats(self):
+        with self._lock:
+            requests = self.stats["requests"]
+            return {
+                **super().get_stats(),
+                "url": self.base_url,
+                "requests": requests,
+                "errors": self.stats["errors"],
+                "avg_latency_ms": round(self.stats["latency_seconds"] / requests * 1000, 1) if requests else None,
+            }
+
+
+# ============================================================================
+# DUMMY (no server)
+# ============================================================================
+
+class DummyBackend(LLMBackend):
+    """
+    Deterministic answers without any LLM - for tests, demos and benchmarks.
+
+    The same messages always give the same answer and the same embedding.
+    """
+
+    name = "dummy"
+    source = "dummy"
+
+    def __init__(self, default_model: str = "dummy", token_delay: float = 0.0, dimensions: int = 64):
+        """
+        Initialize the dummy backend.
+
+        Args:
+            default_model: Name reported as the model
+            token_delay: Seconds between streamed words (simulates generation speed)
+            dimensions: Embedding vector size
+        """
+        super().__init__(default_model)
+        self.token_delay = token_delay
+        self.dimensions = dimensions
+        self.requests = 0
+
+    def _answer(self, messages: List[Dict]) -> str:
+        question = messages[-1]["content"] if messages else ""
+        return f"This is a dummy response to: '{question[:60]}'. Set LLM_BACKEND=ollama or openai for real answers."
+
+    async def generate(self, messages, model=None, options=None, session_id=None, timeout=None, max_retries=2):
+        self.requests += 1
+        return self._answer(messages)
+
+    async def stream(self, messages, model=None, options=None, session_id=None):
+        self.requests += 1
+        words = self._answer(messages).split(" ")
+        for i, word in enumerate(words):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield word if i == 0 else " " + word
+
+    async def embed(self, texts, model=None):
+        vectors = []
+        for text in texts:
+            digest = hashlib.sha256(text.encode("utf-8")).digest()
+            raw = [digest[i % len(digest)] / 255 - 0.5 for i in range(self.dimensions)]
+            norm = math.sqrt(sum(v * v for v in raw)) or 1.0
+            vectors.append([v / norm for v in raw])
+        return vectors
+
+    async def health(self):
+        return {"backend": self.name, "healthy": True}
+
+    def get_stats(self):
+        return {**super().get_stats(), "requests": self.requests}
+
+
+# ============================================================================
+# FACTORY
+# ============================================================================
+
+def create_llm_backend(kind: str) -> LLMBackend:
+    """
+    Create the backend selected in settings.
+
+    Args:
+        kind: "ollama", "openai" or "dummy"
+
+    Returns:
+        LLMBackend instance
+    """
+    kind = (kind or "ollama").lower()
+    if kind == "openai":
+        return OpenAICompatBackend(
+            base_url=settings.OPENAI_BASE_URL,
+            default_model=settings.OPENAI_MODEL,
+            api_key=settings.OPENAI_API_KEY,
+            request_timeout=settings.OLLAMA_REQUEST_TIMEOUT,
+            connect_timeout=settings.OLLAMA_CONNECT_TIMEOUT,
+            embed_model=settings.LLM_EMBED_MODEL
+        )
+    if kind == "dummy":
+        return DummyBackend()
+    if kind != "ollama":
+        logger.warning(f"⚠️ Unknown LLM_BACKEND '{kind}', using ollama")
+    return OllamaBackend(
+        pool=ollama_pool,
+        default_model=settings.OLLAMA_MODEL,
+        keeper=model_keeper,
+        planner=options_planner,
+        builder=prompt_builder,
+        stats=generation_stats,
+        keep_alive=settings.OLLAMA_KEEP_ALIVE,
+        request_timeout=settings.OLLAMA_REQUEST_TIMEOUT,
+        connect_timeout=settings.OLLAMA_CONNECT_TIMEOUT,
+        hedge_enabled=settings.OLLAMA_HEDGE_ENABLED,
+        embed_model=settings.LLM_EMBED_MODEL
+    )
+
+
+# Create a singleton instance
+llm_backend = create_llm_backend(settings.LLM_BACKEND)
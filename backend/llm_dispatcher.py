@@ -0,0 +1,166 @@
+"""
+llm_dispatcher.py - Priority admission for LLM requests
+Lets background work (batch jobs) use spare Ollama capacity without
+slowing down people who are chatting
+
+Priorities:
+- INTERACTIVE (/chat and other non-streaming answers via ai_router):
+  always admitted right away, only counted
+- BATCH (/chat/batch): admitted only while the Ollama pool has spare room -
+  batch requests never take the pool above BATCH_MAX_LOAD of its parallel
+  slots, so there is always room left for interactive requests
+
+Streaming (/chat/stream, /ws/chat) doesn't go through slot() at all.
+
+Capacity comes from the Ollama pool: usable backends x OLLAMA_PARALLEL_PER_BACKEND.
+Every request (interactive, streaming or batch) shows up in the pool's
+in-flight count, so the dispatcher sees all other traffic without it having
+to queue here.
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict
+
+# Import with compatibility for both local and package mode
+try:
+    from .config import settings
+    from .ollama_pool import ollama_pool
+    from . import request_timing
+except ImportError:
+    from config import settings
+    from ollama_pool import ollama_pool
+    import request_timing
+
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+# Seconds the current task has spent waiting in slot() (per task: asyncio
+# tasks get their own copy of the context)
+_admission_wait: ContextVar[float] = ContextVar("llm_admission_wait", default=0.0)
+
+
+def admission_wait() -> float:
+    """
+    Time the current task has waited for admission so far.
+
+    The request-wide "queue" span adds up all tasks of a request; this is
+    the share of one task (e.g. one item of a batch).
+    """
+    return _admission_wait.get()
+
+
+class LLMDispatcher:
+    """
+    Admits LLM requests by priority.
+
+    Usage:
+        >>> async with llm_dispatcher.slot(BATCH):
+        ...     answer = await llm_response(prompt)
+    """
+
+    def __init__(
+        self,
+        pool,
+        slots_per_backend: int = 4,
+        batch_max_load: float = 0.75,
+        poll_interval: float = 0.05
+    ):
+        """
+        Initialize the dispatcher.
+
+        Args:
+            pool: OllamaPool (its in-flight count is the admission signal)
+            slots_per_backend: Parallel requests per Ollama (OLLAMA_NUM_PARALLEL)
+            batch_max_load: Share of all slots that may be busy when a batch request starts
+            poll_interval: Seconds between admission checks for waiting batch requests
+        """
+        self.pool = pool
+        self.slots_per_backend = slots_per_backend
+        self.batch_max_load = batch_max_load
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self.stats = {
+            INTERACTIVE: {"admitted": 0, "running": 0, "wait_seconds": 0.0},
+            BATCH: {"admitted": 0, "running": 0, "waiting": 0, "wait_seconds": 0.0},
+        }
+
+    def _batch_admissible(self) -> bool:
+        """True if a batch request may start now (caller holds the lock)."""
+        in_flight, capacity = self.pool.usage(self.slots_per_backend)
+        batch_running = self.stats[BATCH]["running"]
+        # Admitted batch requests may not have reached the pool yet, so
+        # interactive load = pool in-flight minus batch (never below zero)
+        interactive = max(0, in_flight - batch_running)
+        limit = int(capacity * self.batch_max_load)
+        if interactive == 0:
+            # An idle pool always takes one batch request, even if the share rounds to zero
+            limit = max(1, limit)
+        return interactive + batch_running < limit
+
+    @asynccontextmanager
+    async def slot(self, priority: str = INTERACTIVE):
+        """
+        Wait for permission to send one LLM request.
+
+        Args:
+            priority: INTERACTIVE or BATCH
+        """
+        stats = self.stats[priority]
+        start = time.time()
+        if priority == BATCH:
+            with self._lock:
+                stats["waiting"] += 1
+            try:
+                while True:
+                    with self._lock:
+                        if self._batch_admissible():
+                            stats["running"] += 1
+                            break
+                    await asyncio.sleep(self.poll_interval)
+            finally:
+                with self._lock:
+                    stats["waiting"] -= 1
+        else:
+            with self._lock:
+                stats["running"] += 1
+
+        waited = time.time() - start
+        with self._lock:
+            stats["admitted"] += 1
+            stats["wait_seconds"] += waited
+        request_timing.record("queue", waited)
+        _admission_wait.set(_admission_wait.get() + waited)
+        try:
+            yield
+        finally:
+            with self._lock:
+                stats["running"] -= 1
+
+    def get_stats(self) -> Dict:
+        """Get admission counts and average waits per priority."""
+        with self._lock:
+            report = {
+                "batch_max_load": self.batch_max_load,
+                "pool_load": round(self.pool.load_factor(self.slots_per_backend), 3),
+            }
+            for priority, stats in self.stats.items():
+                entry = {k: v for k, v in stats.items() if k != "wait_seconds"}
+                entry["avg_wait_ms"] = (
+                    round(stats["wait_seconds"] / stats["admitted"] * 1000, 1) if stats["admitted"] else None
+                )
+                report[priority] = entry
+            return report
+
+
+# Create a singleton instance
+llm_dispatcher = LLMDispatcher(
+    pool=ollama_pool,
+    slots_per_backend=settings.OLLAMA_PARALLEL_PER_BACKEND,
+    batch_max_load=settings.BATCH_MAX_LOAD
+)
@@ -1,56 +1,256 @@
 # logger.py - Logging setup for Nitro AI Backend
 # Logging helps us track what's happening in our application
 # Think of it as a diary for your server
+#
+# Logging never holds up a request:
+# - Log records go into a queue; a background thread formats them and
+#   writes them to stdout, so a slow terminal or container log driver only
+#   slows down that thread (LOG_ASYNC=False writes directly, as before)
+# - When the queue is full, records are dropped and counted instead of waiting
+# - Chatty INFO/DEBUG lines are rate-limited per line of code
+#   (LOG_RATE_LIMIT per second); warnings and errors always get through
+# - LOG_FORMAT=json writes one JSON object per line, with the request id
+#
+# On hot paths, pass values as arguments instead of using f-strings:
+#     logger.info("Added message to session %s", session_id)
+# The message is then only built if the record is actually logged.
 
+import atexit
+import copy
+import json
 import logging
+import queue
+import re
 import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
 
 # Import with compatibility for both local and package mode
 try:
     from .config import settings
+    from .metrics import registry
 except ImportError:
     from config import settings
+    from metrics import registry
+
+# Id of the request being handled (set by the HTTP middleware), added to every record
+_request_id: ContextVar[Optional[str]] = ContextVar("log_request_id", default=None)
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+records_dropped = registry.counter("nitro_log_records_dropped_total", "Log records dropped because the log queue was full")
+records_suppressed = registry.counter(
+    "nitro_log_records_suppressed_total", "INFO/DEBUG log records skipped by the per-line rate limit"
+)
+
+
+def set_request_id(incoming: Optional[str] = None) -> str:
+    """
+    Set the request id for log records of the current request.
+
+    Args:
+        incoming: Id sent by the client or a proxy (X-Request-ID), reused if it looks sane
+
+    Returns:
+        The request id (send it back as X-Request-ID)
+    """
+    request_id = incoming if incoming and _REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex[:16]
+    _request_id.set(request_id)
+    return request_id
+
+
+def get_request_id() -> Optional[str]:
+    """Id of the request being handled (None outside a request)."""
+    return _request_id.get()
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp each record with the current request id (runs in the thread that logs)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per call site (file + line) for records below WARNING.
+
+    Each line of code may log `per_second` records per second on average
+    (bursts up to `burst`). Skipped records are counted, and the next record
+    from that line says how many were skipped.
+    """
+
+    def __init__(self, per_second: float, burst: Optional[float] = None):
+        super().__init__()
+        self.per_second = per_second
+        self.burst = burst or max(1.0, per_second)
+        self._buckets: Dict[tuple, list] = {}  # (path, line) -> [tokens, last refill, skipped]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.per_second <= 0 or record.levelno >= logging.WARNING:
+            return True
+        site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        bucket = self._buckets.get(site)
+        if bucket is None:
+            bucket = self._buckets[site] = [self.burst, now, 0]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.per_second)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            bucket[2] += 1
+            records_suppressed.inc()
+            return False
+        bucket[0] = tokens - 1
+        if bucket[2]:
+            record.suppressed = bucket[2]
+            bucket[2] = 0
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops (and counts) records when the queue is full instead of raising."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now (they may change later) and render the
+        # traceback (it can't be sent to another thread), but leave the
+        # layout to the writer thread's formatter
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            records_dropped.inc()
+
+
+class TextFormatter(logging.Formatter):
+    """Format: [2026-02-17 10:30:00] INFO - Your log message here"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            text += f" (+{suppressed} similar skipped)"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request_id."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+_traceback_formatter = logging.Formatter()
+
+# Queue between the app and the writer thread (None when LOG_ASYNC=False)
+_log_queue: Optional[queue.Queue] = None
+
+
+def _stop_listener(listener: QueueListener):
+    """Flush and stop the writer thread at exit."""
+    try:
+        listener.stop()
+    except queue.Full:
+        pass  # Writer is hopelessly behind; it's a daemon thread, don't hang the exit
+
 
 def setup_logger(name: str = "nitro_ai") -> logging.Logger:
     """
     Create and configure a logger for the application.
-    
+
     Logs help you debug issues and monitor your application.
     They appear in the terminal where you run the server.
-    
+
     Args:
         name: Name of the logger (default: "nitro_ai")
-    
+
     Returns:
         Configured logger instance
     """
-    
+    global _log_queue
+
     # Create a logger
     logger = logging.getLogger(name)
     logger.setLevel(getattr(logging, settings.LOG_LEVEL))
-    
+
     # Don't duplicate logs if logger already has handlers
     if logger.handlers:
         return logger
-    
+
     # Create console handler (prints logs to terminal)
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(getattr(logging, settings.LOG_LEVEL))
-    
+
     # Create a formatter (defines how logs look)
-    # Format: [2026-02-17 10:30:00] INFO - Your log message here
-    formatter = logging.Formatter(
-        '[%(asctime)s] %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    
-    # Add formatter to handler
+    if settings.LOG_FORMAT == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = TextFormatter('[%(asctime)s] %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
     console_handler.setFormatter(formatter)
-    
+
+    if settings.LOG_ASYNC:
+        # The app only puts records into a queue; a background thread writes them
+        _log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+        handler = NonBlockingQueueHandler(_log_queue)
+        listener = QueueListener(_log_queue, console_handler)
+        listener.start()
+        atexit.register(_stop_listener, listener)
+    else:
+        handler = console_handler
+
+    # Filters run in the calling thread: the request id is still known there
+    handler.setLevel(getattr(logging, settings.LOG_LEVEL))
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(RateLimitFilter(settings.LOG_RATE_LIMIT))
+
     # Add handler to logger
-    logger.addHandler(console_handler)
-    
+    logger.addHandler(handler)
+
     return logger
 
+
+def get_log_stats() -> Dict:
+    """Queue depth and how many records were dropped or rate-limited."""
+    return {
+        "async": _log_queue is not None,
+        "format": settings.LOG_FORMAT,
+        "queued": _log_queue.qsize() if _log_queue is not None else 0,
+        "dropped": int(records_dropped.labels().value),
+        "rate_limited": int(records_suppressed.labels().value),
+    }
+
+
+registry.gauge_callback(
+    "nitro_log_queue_depth", "Log records waiting for the writer thread",
+    lambda: _log_queue.qsize() if _log_queue is not None else None
+)
+
 # Create a logger instance to use throughout the app
 logger = setup_logger()
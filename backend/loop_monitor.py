@@ -0,0 +1,295 @@
+"""
+loop_monitor.py - Event-loop lag measurement and blocking-call watchdog
+How late does the server react because something blocked the event loop,
+and which function did it?
+
+A small task asks to be woken up every LOOP_LAG_INTERVAL_MS. When it wakes
+up later than asked, the difference is time the loop spent stuck in some
+synchronous call (file I/O, HTML parsing, CPU work) - every request on the
+server waited that long too.
+
+Watchdog: a background thread checks that the task keeps waking up on time.
+When it is more than LOOP_LAG_THRESHOLD_MS late, the thread captures the
+event-loop thread's stack (sys._current_frames), so we see what is running
+while the loop is stuck. Each stall is counted against the innermost frame
+of our own code (backend/ or models/), e.g.:
+    "save_audio (models/ai_modules/voice_enhanced.py:212)": 7 stalls, 3.1s
+together with the library call it was blocked in (e.g. "gtts/tts.py:save").
+
+Reported in Prometheus as nitro_event_loop_lag_seconds (histogram) and
+nitro_event_loop_stalls_total{function}, in /metrics as "event_loop", and
+in full at /metrics/event-loop.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional
+
+# Import with compatibility for both local and package mode
+try:
+    from .config import settings
+    from .logger import logger
+    from .metrics import registry
+except ImportError:
+    from config import settings
+    from logger import logger
+    from metrics import registry
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Frames from files under this folder (backend/ and models/) are "our" code
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAX_BLOCKING_ENTRIES = 200  # Distinct offending functions kept (least seen dropped first)
+STACK_DEPTH = 12  # Frames kept per captured stack
+
+
+def _short_path(filename: str) -> str:
+    """Path relative to the app folder, or from site-packages on for libraries."""
+    if filename.startswith(APP_ROOT + os.sep):
+        return os.path.relpath(filename, APP_ROOT)
+    marker = "site-packages" + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    return os.path.basename(filename)
+
+
+def _is_app_frame(filename: str) -> bool:
+    return (
+        filename.startswith(APP_ROOT + os.sep)
+        and "site-packages" not in filename
+        and not filename.endswith("loop_monitor.py")
+    )
+
+
+def summarize_stack(frame) -> Dict:
+    """
+    Find the function to blame in a captured stack.
+
+    Args:
+        frame: Innermost frame of the blocked thread
+
+    Returns:
+        {"function": innermost app frame, "blocked_in": innermost frame,
+         "stack": last STACK_DEPTH frames, innermost last}
+    """
+    frames = traceback.extract_stack(frame)
+    innermost = frames[-1]
+    blamed = next((f for f in reversed(frames) if _is_app_frame(f.filename)), innermost)
+    return {
+        "function": f"{blamed.name} ({_short_path(blamed.filename)}:{blamed.lineno})",
+        "blocked_in": f"{_short_path(innermost.filename)}:{innermost.name}",
+        "stack": [f"{_short_path(f.filename)}:{f.lineno} {f.name}" for f in frames[-STACK_DEPTH:]],
+    }
+
+
+class LoopLagMonitor:
+    """
+    Samples event-loop scheduling lag in the background and names the
+    functions that block the loop.
+
+    Usage:
+        >>> loop_monitor.start()        # app startup
+        >>> loop_monitor.get_stats()
+        >>> loop_monitor.get_blocking_calls()
+        >>> await loop_monitor.stop()   # app shutdown
+    """
+
+    def __init__(self, interval: float = 0.25, threshold: float = 0.1):
+        """
+        Initialize the monitor.
+
+        Args:
+            interval: Seconds between samples (0 = disabled)
+            threshold: Lag in seconds that counts as a stall and gets its
+                       stack captured (0 = no watchdog, lag is still sampled)
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.lag_seconds = registry.histogram(
+            "nitro_event_loop_lag_seconds", "How late the event loop ran a timer", buckets=LAG_BUCKETS
+        )
+        self.stalls_total = registry.counter(
+            "nitro_event_loop_stalls_total", "Event-loop stalls over the threshold, by blocking function",
+            ["function"]
+        )
+        self.stall_seconds = registry.counter(
+            "nitro_event_loop_stall_seconds_total", "Event-loop time lost to stalls, by blocking function",
+            ["function"]
+        )
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._task: Optional[asyncio.Task] = None
+
+        # Shared with the watchdog thread
+        self._loop_thread_id: Optional[int] = None
+        self._wake_by = 0.0  # time.monotonic() the task should wake up by
+        self._sleep_id = 0  # Which sleep _wake_by belongs to
+        self._captured: Optional[tuple] = None  # (sleep id, stack summary)
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop_watchdog = threading.Event()
+        self._lock = threading.Lock()
+        self._blocking: Dict[str, Dict] = {}
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            self._sleep_id += 1
+            self._wake_by = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.lag_seconds.observe(lag)
+            if self.threshold and lag >= self.threshold:
+                self._record_stall(lag)
+
+    # ------------------------------------------------------------------
+    # WATCHDOG
+    # ------------------------------------------------------------------
+
+    def _watch(self):
+        """Watchdog thread: capture the loop thread's stack while it is stuck."""
+        check_every = min(self.threshold / 2, 0.05)
+        while not self._stop_watchdog.wait(check_every):
+            sleep_id = self._sleep_id
+            late = time.monotonic() - self._wake_by
+            if late < self.threshold or (self._captured and self._captured[0] == sleep_id):
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            try:
+                self._captured = (sleep_id, summarize_stack(frame))
+            finally:
+                del frame  # Don't keep the blocked thread's frames alive
+
+    def _record_stall(self, lag: float):
+        """Count a stall against the function captured by the watchdog."""
+        captured = self._captured
+        if captured and captured[0] == self._sleep_id:
+            summary = captured[1]
+        else:
+            # Stuck for less than a watchdog check, or no watchdog thread
+            summary = {"function": "unknown (not captured)", "blocked_in": None, "stack": []}
+        self._captured = None
+        self.stalls += 1
+
+        function = summary["function"]
+        self.stalls_total.labels(function).inc()
+        self.stall_seconds.labels(function).inc(lag)
+        with self._lock:
+            entry = self._blocking.get(function)
+            if entry is None:
+                if len(self._blocking) >= MAX_BLOCKING_ENTRIES:
+                    least = min(self._blocking, key=lambda name: self._blocking[name]["count"])
+                    del self._blocking[least]
+                entry = self._blocking[function] = {
+                    "function": function,
+                    "count": 0,
+                    "total_seconds": 0.0,
+                    "max_seconds": 0.0,
+                    "blocked_in": {},
+                }
+            entry["count"] += 1
+            entry["total_seconds"] += lag
+            entry["max_seconds"] = max(entry["max_seconds"], lag)
+            entry["last_seen"] = time.time()
+            entry["last_stack"] = summary["stack"]
+            if summary["blocked_in"]:
+                entry["blocked_in"][summary["blocked_in"]] = entry["blocked_in"].get(summary["blocked_in"], 0) + 1
+
+        logger.warning(
+            f"🐢 Event loop blocked {lag * 1000:.0f}ms in {function}"
+            + (f" -> {summary['blocked_in']}" if summary["blocked_in"] else "")
+        )
+
+    # ------------------------------------------------------------------
+    # LIFECYCLE
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Start sampling (needs a running event loop - call from the loop thread)."""
+        if self.interval > 0 and self._task is None:
+            self._loop_thread_id = threading.get_ident()
+            self._wake_by = time.monotonic() + self.interval
+            self._task = asyncio.ensure_future(self._run())
+            if self.threshold > 0:
+                self._stop_watchdog.clear()
+                self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+                self._watchdog.start()
+            logger.info(
+                f"⏱️ Event-loop lag sampled every {self.interval * 1000:.0f}ms"
+                + (f", stacks captured above {self.threshold * 1000:.0f}ms" if self.threshold > 0 else "")
+            )
+
+    async def stop(self):
+        """Stop sampling."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watchdog is not None:
+            self._stop_watchdog.set()
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    # ------------------------------------------------------------------
+    # REPORTING
+    # ------------------------------------------------------------------
+
+    def get_blocking_calls(self, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Functions that blocked the event loop, worst (most total time) first.
+
+        Args:
+            limit: Max entries (None = all)
+
+        Returns:
+            List of {"function", "count", "total_ms", "max_ms", "blocked_in", "last_seen", "last_stack"}
+        """
+        with self._lock:
+            entries = sorted(self._blocking.values(), key=lambda e: e["total_seconds"], reverse=True)
+            report = [
+                {
+                    "function": e["function"],
+                    "count": e["count"],
+                    "total_ms": round(e["total_seconds"] * 1000, 1),
+                    "max_ms": round(e["max_seconds"] * 1000, 1),
+                    "blocked_in": dict(sorted(e["blocked_in"].items(), key=lambda item: -item[1])),
+                    "last_seen": e["last_seen"],
+                    "last_stack": list(e["last_stack"]),
+                }
+                for e in entries
+            ]
+        return report[:limit] if limit is not None else report
+
+    def get_stats(self) -> Dict:
+        """Lag summary in milliseconds, with the top blocking functions."""
+        histogram = self.lag_seconds.labels()
+        p99 = histogram.quantile(0.99)
+        return {
+            "samples": histogram.count,
+            "last_ms": round(self.last_lag * 1000, 2),
+            "max_ms": round(self.max_lag * 1000, 2),
+            "mean_ms": round(histogram.sum / histogram.count * 1000, 2) if histogram.count else None,
+            "p99_le_ms": p99 * 1000 if p99 is not None else None,
+            "stall_threshold_ms": self.threshold * 1000,
+            "stalls": self.stalls,
+            "top_blocking": [
+                {"function": e["function"], "count": e["count"], "total_ms": e["total_ms"]}
+                for e in self.get_blocking_calls(limit=5)
+            ],
+        }
+
+
+# Create a singleton instance
+loop_monitor = LoopLagMonitor(
+    interval=settings.LOOP_LAG_INTERVAL_MS / 1000,
+    threshold=settings.LOOP_LAG_THRESHOLD_MS / 1000
+)
@@ -14,9 +14,9 @@ Security Features:
 - CORS protection
 - Cloudflare Tunnel support
 """
-from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi import FastAPI, HTTPException, Request, Depends, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from datetime import datetime
 from typing import List, Optional, Dict, Any
@@ -32,36 +32,80 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 # Import our custom modules with compatibility for both local and package mode
 try:
     # Try relative imports first (for package mode: python -m backend.main)
-    from .ai_router import get_ai_response
+    from .ai_router import get_ai_response, llm_response
     from .config import settings
     from .schemas import (
         ChatMessage, ChatResponse, ErrorResponse, HealthCheckResponse,
+        BatchChatRequest,
         SessionCreate, SessionResponse, HistoryResponse,
         LanguageDetectRequest, LanguageDetectResponse, LanguagePreferenceRequest,
         LanguagePreferenceResponse, SupportedLanguagesResponse,
         VideoGenerateRequest, VideoGenerateResponse, VideoStatusResponse
     )
-    from .logger import logger
+    from .logger import logger, set_request_id, get_log_stats
     from .memory_manager import memory_manager
     from .language_detector import LanguageDetector
     from .automation_agents import agent_manager
-    from .security import SecurityHeadersMiddleware, RateLimitMiddleware, verify_api_key
+    from .security import (
+        SecurityHeadersMiddleware, RateLimitMiddleware, verify_api_key, verify_websocket_api_key,
+        verify_admin_api_key
+    )
+    from .profiler import sampling_profiler, ProfilerBusyError
+    from .ollama_pool import ollama_pool
+    from .model_router import model_router
+    from .model_keeper import model_keeper
+    from .ollama_options import options_planner
+    from .prompt_builder import prompt_builder
+    from .llm_dispatcher import llm_dispatcher, admission_wait, BATCH
+    from .llm_backends import llm_backend
+    from . import request_timing
+    from .request_timing import timing_stats
+    from .generation_stats import generation_stats
+    from .metrics import registry as metrics_registry
+    from .loop_monitor import loop_monitor
+    from .search_cache import search_cache
+    from .streaming import (
+        cancel_on_disconnect, coalesce_tokens, parse_last_event_id,
+        ClientDisconnected, stream_stats, stream_registry
+    )
 except ImportError:
     # Fallback to absolute imports (for local dev: cd backend && python -m uvicorn main:app)
-    from ai_router import get_ai_response
+    from ai_router import get_ai_response, llm_response
     from config import settings
     from schemas import (
         ChatMessage, ChatResponse, ErrorResponse, HealthCheckResponse,
+        BatchChatRequest,
         SessionCreate, SessionResponse, HistoryResponse,
         LanguageDetectRequest, LanguageDetectResponse, LanguagePreferenceRequest,
         LanguagePreferenceResponse, SupportedLanguagesResponse,
         VideoGenerateRequest, VideoGenerateResponse, VideoStatusResponse
     )
-    from logger import logger
+    from logger import logger, set_request_id, get_log_stats
     from memory_manager import memory_manager
     from language_detector import LanguageDetector
     from automation_agents import agent_manager
-    from security import SecurityHeadersMiddleware, RateLimitMiddleware, verify_api_key
+    from security import (
+        SecurityHeadersMiddleware, RateLimitMiddleware, verify_api_key, verify_websocket_api_key,
+        verify_admin_api_key
+    )
+    from profiler import sampling_profiler, ProfilerBusyError
+    from ollama_pool import ollama_pool
+    from model_router import model_router
+    from model_keeper import model_keeper
+    from ollama_options import options_planner
+    from prompt_builder import prompt_builder
+    from llm_dispatcher import llm_dispatcher, admission_wait, BATCH
+    from llm_backends import llm_backend
+    import request_timing
+    from request_timing import timing_stats
+    from generation_stats import generation_stats
+    from metrics import registry as metrics_registry
+    from loop_monitor import loop_monitor
+    from search_cache import search_cache
+    from streaming import (
+        cancel_on_disconnect, coalesce_tokens, parse_last_event_id,
+        ClientDisconnected, stream_stats, stream_registry
+    )
 
 # These always work from parent directory (models/ is a sibling to backend/)
 from models.ai_modules.video_gen import VideoGenerator
@@ -74,15 +118,18 @@ from models.ai_modules.web_search_enhanced import create_web_search_ai
 language_detector = LanguageDetector()
 video_generator = VideoGenerator()
 
-# Initialize Chat AI with Ollama (phi3 model from .env)
-# This connects to your local Ollama server for FREE AI chat!
+# Initialize Chat AI on the configured LLM backend (LLM_BACKEND in .env)
+# Ollama by default - FREE local AI chat! - or any OpenAI-compatible server
 chat_ai = create_chat_ai(
-    model_type=settings.AI_MODEL if hasattr(settings, 'AI_MODEL') else "ollama",
+    model_type="ollama",
     config={
-        "model": settings.OLLAMA_MODEL if hasattr(settings, 'OLLAMA_MODEL') else "phi3",
-        "base_url": settings.OLLAMA_BASE_URL if hasattr(settings, 'OLLAMA_BASE_URL') else "http://localhost:11434",
+        "model": llm_backend.default_model,
         "temperature": settings.AI_TEMPERATURE if hasattr(settings, 'AI_TEMPERATURE') else 0.7,
-        "max_tokens": settings.AI_MAX_TOKENS if hasattr(settings, 'AI_MAX_TOKENS') else 500
+        "max_tokens": settings.AI_MAX_TOKENS if hasattr(settings, 'AI_MAX_TOKENS') else 500,
+        "router": model_router,  # Fast model for easy requests, large model for hard ones
+        "prompt_builder": prompt_builder,  # Stable prompt prefix for Ollama's KV-cache
+        "generation_stats": generation_stats,  # Per-model tokens/s from Ollama's own counters
+        "backend": llm_backend  # Ollama pool, OpenAI-compatible server or dummy
     }
 )
 
@@ -103,7 +150,18 @@ voice_assistant = create_voice_assistant(
 # Initialize Web Search AI (with chat_ai for summarization)
 web_search_ai = create_web_search_ai(
     chat_ai=chat_ai,
-    max_results=5
+    llm_backend=llm_backend,
+    max_results=5,
+    search_url=settings.WEB_SEARCH_URL,
+    span=request_timing.span,  # search_fetch / search_parse in Server-Timing
+    max_concurrency=settings.WEB_SEARCH_CONCURRENCY,
+    per_host_limit=settings.WEB_SEARCH_PER_HOST,
+    deadline=settings.WEB_SEARCH_DEADLINE,
+    parse_workers=settings.WEB_SEARCH_PARSE_WORKERS,
+    parse_pool=settings.WEB_SEARCH_PARSE_POOL,  # HTML parsing off the event loop
+    max_page_bytes=settings.WEB_SEARCH_PAGE_READ_KB * 1024,
+    max_content_length=settings.WEB_SEARCH_PAGE_MAX_KB * 1024,
+    cache=search_cache  # Repeated searches and pages already read skip the network
 )
 
 # Create FastAPI application
@@ -154,21 +212,54 @@ app.add_middleware(
         "Access-Control-Request-Headers",
         "X-API-Key",  # Added for API key support
     ],
-    expose_headers=["X-Process-Time", "X-Request-ID", "X-RateLimit-Limit", "X-RateLimit-Remaining"],
+    expose_headers=["X-Process-Time", "Server-Timing", "X-Request-ID", "X-RateLimit-Limit", "X-RateLimit-Remaining"],
     max_age=3600,  # Cache preflight for 1 hour
 )
 
+# Per-route request metrics (Prometheus, see metrics.py)
+http_requests_total = metrics_registry.counter(
+    "nitro_http_requests_total", "HTTP requests", ["method", "route", "status"]
+)
+http_request_duration = metrics_registry.histogram(
+    "nitro_http_request_duration_seconds", "Time until the response starts (streams: headers)", ["method", "route"]
+)
+http_requests_in_flight = metrics_registry.gauge("nitro_http_requests_in_flight", "HTTP requests being handled")
+
 # Request timing middleware
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
     """
     Middleware to track request processing time.
     Useful for monitoring performance.
+    
+    Server-Timing breaks the time down into phases recorded by the
+    components (queue, llm_ttft, llm, memory_read, ... - see
+    request_timing.py). Streams send their headers before the answer is
+    generated; their full timing arrives in the final SSE event instead.
+    
+    Every request gets an id (the client's X-Request-ID if it sent one),
+    added to its log records and sent back as X-Request-ID.
     """
     start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
+    request_id = set_request_id(request.headers.get("X-Request-ID"))
+    timing = request_timing.begin()
+    http_requests_in_flight.inc()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        process_time = time.time() - start_time
+        http_requests_in_flight.dec()
+        # Route template ("/history/{session_id}"), not the raw path, keeps the label set small
+        route = getattr(request.scope.get("route"), "path", None) or "unmatched"
+        http_requests_total.labels(request.method, route, status).inc()
+        http_request_duration.labels(request.method, route).observe(process_time)
     response.headers["X-Process-Time"] = str(round(process_time, 3))
+    response.headers["Server-Timing"] = timing.header()
+    response.headers["X-Request-ID"] = request_id
+    if not timing.deferred:
+        timing.finish()
     return response
 
 # Global exception handler
@@ -178,7 +269,7 @@ async def global_exception_handler(request: Request, exc: Exception):
     Global exception handler to catch any unhandled errors.
     Returns a consistent error response format.
     """
-    logger.error(f"Unhandled exception: {exc}", exc_info=True)
+    logger.error("Unhandled exception: %s", exc, exc_info=True)
     return JSONResponse(
         status_code=500,
         content={
@@ -197,11 +288,21 @@ async def startup_event():
     logger.info(f"📝 Debug mode: {settings.DEBUG_MODE}")
     logger.info(f"🌐 Server will run on {settings.HOST}:{settings.PORT}")
     logger.info(f"💾 Memory system initialized")
+    
+    # LLM backend background work (Ollama: pool health checks + model warm-up,
+    # so the first chat isn't a cold start)
+    logger.info(f"🧠 LLM backend: {llm_backend.name} (default model {llm_backend.default_model})")
+    llm_backend.start()
+    loop_monitor.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown."""
     logger.info(f"👋 {settings.APP_NAME} is shutting down...")
+    await loop_monitor.stop()
+    await llm_backend.stop()
+    web_search_ai.close()
+    search_cache.close()
 
 # === ENDPOINTS ===
 
@@ -240,7 +341,8 @@ async def health_check():
         status="healthy",
         timestamp=datetime.now().isoformat(),
         version=settings.VERSION,
-        memory_stats=memory_stats
+        memory_stats=memory_stats,
+        llm_backend=await llm_backend.health()
     )
 
 @app.post("/chat", response_model=ChatResponse)
@@ -257,7 +359,7 @@ async def chat(chat_message: ChatMessage, request: Request, api_key_valid: bool
     """
     try:
         # Log incoming message
-        logger.info(f"Chat request from {chat_message.user_id}: {chat_message.message[:50]}...")
+        logger.info("Chat request from %s: %.50s...", chat_message.user_id, chat_message.message)
         
         # Sanitize input (basic security)
         user_text = chat_message.message.strip()
@@ -267,18 +369,23 @@ async def chat(chat_message: ChatMessage, request: Request, api_key_valid: bool
             raise HTTPException(status_code=400, detail="Message cannot be empty")
         
         if len(user_text) > settings.MAX_MESSAGE_LENGTH:
-            logger.warning(f"Message too long: {len(user_text)} characters")
+            logger.warning("Message too long: %s characters", len(user_text))
             raise HTTPException(
                 status_code=400,
                 detail=f"Message too long. Maximum {settings.MAX_MESSAGE_LENGTH} characters allowed."
             )
+        request_timing.record_elapsed("validation")
         
         # Get or create session
         session_id = chat_message.session_id
+        history = []
         if not session_id:
             # Create new session if none provided
             session_id = memory_manager.create_session(user_id=chat_message.user_id)
-            logger.info(f"Created new session: {session_id}")
+            logger.info("Created new session: %s", session_id)
+        else:
+            # Previous turns, in a stable order so Ollama can reuse its cache
+            history = prompt_builder.history_from_session(memory_manager.get_session_history(session_id))
         
         # === AI RESPONSE GENERATION ===
         # Local AI System (Ollama - 100% Free):
@@ -297,7 +404,7 @@ async def chat(chat_message: ChatMessage, request: Request, api_key_valid: bool
         
         try:
             # Call hybrid AI router
-            ai_result = get_ai_response(user_text)
+            ai_result = await get_ai_response(user_text, history=history, session_id=session_id)
             
             # Extract response and metadata
             if isinstance(ai_result, dict):
@@ -311,11 +418,11 @@ async def chat(chat_message: ChatMessage, request: Request, api_key_valid: bool
                 ai_source = "legacy"
             
             # Log success with model info
-            logger.info(f"✅ AI response generated | Model: {ai_model_used} | Source: {ai_source}")
+            logger.info("✅ AI response generated | Model: %s | Source: %s", ai_model_used, ai_source)
             
         except Exception as ai_error:
             # Ollama not available - provide helpful setup instructions
-            logger.error(f"❌ Ollama unavailable: {ai_error}")
+            logger.error("❌ Ollama unavailable: %s", ai_error)
             
             # Determine specific error type for better user guidance
             error_msg = str(ai_error).lower()
@@ -369,7 +476,10 @@ async def chat(chat_message: ChatMessage, request: Request, api_key_valid: bool
             response=ai_response
         )
         
-        logger.info(f"💾 Conversation saved | Session: {session_id} | Model: {ai_model_used}")
+        logger.info("💾 Conversation saved | Session: %s | Model: %s", session_id, ai_model_used)
+        
+        # Ollama's own numbers for this answer (tokens/s, load time)
+        timing = request_timing.current()
         
         # Return clean JSON response with model tracking
         return ChatResponse(
@@ -379,18 +489,99 @@ async def chat(chat_message: ChatMessage, request: Request, api_key_valid: bool
             user_id=chat_message.user_id,
             session_id=session_id,
             ai_model=ai_model_used,  # Which model responded (phi3, llama3.2:1b, mistral, etc.)
-            ai_source=ai_source  # Where it came from (ollama_local, error)
+            ai_source=ai_source,  # Where it came from (ollama_local, error)
+            generation=timing.generation if timing is not None else None
         )
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in chat endpoint: {e}", exc_info=True)
+        logger.error("Error in chat endpoint: %s", e, exc_info=True)
         raise HTTPException(
             status_code=500,
             detail="An error occurred while processing your message."
         )
 
+
+@app.post("/chat/batch")
+async def chat_batch(batch: BatchChatRequest, api_key_valid: bool = Depends(verify_api_key)):
+    """
+    Batch chat endpoint - many prompts in one request (evaluations, bulk jobs).
+    
+    - Runs at low priority: items only start while Ollama has spare capacity
+      (see llm_dispatcher.py), so interactive chat stays fast
+    - At most `parallelism` items run at once (capped by BATCH_MAX_PARALLEL)
+    - Results stream back as NDJSON in completion order, each with timing:
+      {"id", "index", "status": "ok"|"error", "response", "model",
+       "queue_ms", "latency_ms"}
+    - The last line is a summary: {"done": true, "total", "ok", "errors", "elapsed_ms"}
+    - Batch prompts are not stored in conversation memory
+    """
+    if len(batch.items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many items. Maximum {settings.BATCH_MAX_ITEMS} per batch."
+        )
+    parallelism = min(batch.parallelism or settings.BATCH_MAX_PARALLEL, settings.BATCH_MAX_PARALLEL)
+    semaphore = asyncio.Semaphore(parallelism)
+    default_model = llm_backend.default_model
+    
+    async def run_item(index: int, item):
+        """Answer one item and describe the outcome."""
+        queued_at = time.time()
+        async with semaphore:
+            model = item.model or model_router.route(item.message, default_model=default_model)["model"]
+            options = {
+                key: value for key, value in
+                {"temperature": item.temperature, "top_p": item.top_p, "max_tokens": item.max_tokens}.items()
+                if value is not None
+            }
+            started_at = time.time()
+            try:
+                answer = await llm_response(item.message, model=model, options=options, priority=BATCH)
+                error = None if answer else f"No response from {llm_backend.name}"
+            except Exception as e:
+                answer, error = None, str(e)
+            finished_at = time.time()
+            # The wait for the dispatcher (spare capacity) happens inside
+            # llm_response: move it from latency_ms to queue_ms
+            dispatcher_wait = admission_wait()
+            return {
+                "id": item.id if item.id is not None else str(index),
+                "index": index,
+                "status": "error" if error else "ok",
+                "response": answer,
+                "error": error,
+                "model": model,
+                "queue_ms": round((started_at - queued_at + dispatcher_wait) * 1000, 1),
+                "latency_ms": round((finished_at - started_at - dispatcher_wait) * 1000, 1),
+            }
+    
+    async def generate_results():
+        start = time.time()
+        tasks = [asyncio.ensure_future(run_item(i, item)) for i, item in enumerate(batch.items)]
+        counts = {"ok": 0, "error": 0}
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                counts[result["status"]] += 1
+                yield json.dumps(result) + "\n"
+            yield json.dumps({
+                "done": True,
+                "total": len(tasks),
+                "ok": counts["ok"],
+                "errors": counts["error"],
+                "elapsed_ms": round((time.time() - start) * 1000, 1),
+            }) + "\n"
+        finally:
+            # Client gone (or finished) - don't keep generating for nobody
+            for task in tasks:
+                task.cancel()
+    
+    logger.info("📦 Batch of %s prompts (parallelism %s)", len(batch.items), parallelism)
+    return StreamingResponse(generate_results(), media_type="application/x-ndjson")
+
+
 @app.post("/session/create", response_model=SessionResponse)
 async def create_session(session_create: SessionCreate):
     """
@@ -401,7 +592,7 @@ async def create_session(session_create: SessionCreate):
     """
     try:
         session_id = memory_manager.create_session(user_id=session_create.user_id)
-        logger.info(f"Created session: {session_id} for user: {session_create.user_id}")
+        logger.info("Created session: %s for user: %s", session_id, session_create.user_id)
         
         return SessionResponse(
             session_id=session_id,
@@ -410,7 +601,7 @@ async def create_session(session_create: SessionCreate):
             message="Session created successfully"
         )
     except Exception as e:
-        logger.error(f"Error creating session: {e}")
+        logger.error("Error creating session: %s", e)
         raise HTTPException(status_code=500, detail="Failed to create session")
 
 @app.get("/history/{session_id}", response_model=HistoryResponse)
@@ -430,7 +621,7 @@ async def get_session_history(session_id: str):
         if not history:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        logger.info(f"Retrieved history for session: {session_id}")
+        logger.info("Retrieved history for session: %s", session_id)
         
         return HistoryResponse(
             session_id=history["session_id"],
@@ -443,7 +634,7 @@ async def get_session_history(session_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error retrieving history: {e}")
+        logger.error("Error retrieving history: %s", e)
         raise HTTPException(status_code=500, detail="Failed to retrieve history")
 
 @app.get("/sessions/recent")
@@ -460,7 +651,7 @@ async def get_recent_sessions(limit: int = 10, user_id: Optional[str] = None):
     """
     try:
         sessions = memory_manager.get_recent_sessions(limit=limit, user_id=user_id)
-        logger.info(f"Retrieved {len(sessions)} recent sessions")
+        logger.info("Retrieved %d recent sessions", len(sessions))
         
         return {
             "sessions": sessions,
@@ -468,7 +659,7 @@ async def get_recent_sessions(limit: int = 10, user_id: Optional[str] = None):
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
-        logger.error(f"Error retrieving recent sessions: {e}")
+        logger.error("Error retrieving recent sessions: %s", e)
         raise HTTPException(status_code=500, detail="Failed to retrieve sessions")
 
 @app.delete("/session/{session_id}")
@@ -488,7 +679,7 @@ async def delete_session(session_id: str):
         if not success:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        logger.info(f"Deleted session: {session_id}")
+        logger.info("Deleted session: %s", session_id)
         
         return {
             "message": "Session deleted successfully",
@@ -498,7 +689,7 @@ async def delete_session(session_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error deleting session: {e}")
+        logger.error("Error deleting session: %s", e)
         raise HTTPException(status_code=500, detail="Failed to delete session")
 
 @app.get("/stats")
@@ -519,7 +710,7 @@ async def get_statistics():
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
-        logger.error(f"Error retrieving statistics: {e}")
+        logger.error("Error retrieving statistics: %s", e)
         raise HTTPException(status_code=500, detail="Failed to retrieve statistics")
 
 
@@ -558,7 +749,7 @@ async def detect_language(request: LanguageDetectRequest):
         lang_name = language_detector.get_language_name(lang_code)
         is_supported = language_detector.is_supported(lang_code)
         
-        logger.info(f"Detected language: {lang_name} ({lang_code}) with confidence {confidence:.2f}")
+        logger.info("Detected language: %s (%s) with confidence %.2f", lang_name, lang_code, confidence)
         
         return LanguageDetectResponse(
             detected_language=lang_code,
@@ -567,7 +758,7 @@ async def detect_language(request: LanguageDetectRequest):
             supported=is_supported
         )
     except Exception as e:
-        logger.error(f"Language detection error: {e}")
+        logger.error("Language detection error: %s", e)
         raise HTTPException(status_code=500, detail="Failed to detect language")
 
 
@@ -597,7 +788,7 @@ async def get_supported_languages():
             total=len(languages)
         )
     except Exception as e:
-        logger.error(f"Error getting languages: {e}")
+        logger.error("Error getting languages: %s", e)
         raise HTTPException(status_code=500, detail="Failed to retrieve languages")
 
 
@@ -628,7 +819,7 @@ async def set_language_preference(request: LanguagePreferenceRequest):
         # FUTURE: Save to database
         # db.user_preferences.update(user_id=request.user_id, language=request.language)
         
-        logger.info(f"Language preference set for {request.user_id}: {lang_name}")
+        logger.info("Language preference set for %s: %s", request.user_id, lang_name)
         
         return LanguagePreferenceResponse(
             user_id=request.user_id,
@@ -640,7 +831,7 @@ async def set_language_preference(request: LanguagePreferenceRequest):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error setting language preference: {e}")
+        logger.error("Error setting language preference: %s", e)
         raise HTTPException(status_code=500, detail="Failed to set language preference")
 
 
@@ -689,11 +880,11 @@ async def generate_video(request: VideoGenerateRequest):
             seed=request.seed
         )
         
-        logger.info(f"Video generation requested: {request.prompt[:50]}...")
+        logger.info("Video generation requested: %s...", request.prompt[:50])
         
         return VideoGenerateResponse(**result)
     except Exception as e:
-        logger.error(f"Video generation error: {e}")
+        logger.error("Video generation error: %s", e)
         raise HTTPException(status_code=500, detail="Failed to generate video")
 
 
@@ -714,7 +905,7 @@ async def get_video_status(video_id: str):
         status = video_generator.get_generation_status(video_id)
         return VideoStatusResponse(**status)
     except Exception as e:
-        logger.error(f"Error getting video status: {e}")
+        logger.error("Error getting video status: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get video status")
 
 
@@ -733,14 +924,91 @@ async def get_video_models():
             "enabled": settings.ENABLE_VIDEO_GEN
         }
     except Exception as e:
-        logger.error(f"Error getting video models: {e}")
+        logger.error("Error getting video models: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get video models")
 
 
 # === STREAMING CHAT ENDPOINT ===
 
+def _sse_response(events) -> StreamingResponse:
+    """Wrap SSE events in a StreamingResponse with proxy-friendly headers."""
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"  # Disable nginx buffering
+        }
+    )
+
+
+def _follow_generation(request: Request, generation, after_seq: int = 0):
+    """SSE events of a generation for one client (detaches when the client leaves)."""
+    async def events():
+        try:
+            async for event in cancel_on_disconnect(request, generation.subscribe(after_seq)):
+                yield event
+        except ClientDisconnected:
+            logger.info("🔌 Client disconnected from stream %s", generation.id[:8])
+        finally:
+            stream_registry.detach(generation)
+    return events()
+
+
+def _start_chat_generation(user_text: str, session_id: Optional[str], user_id: str):
+    """
+    Start streaming an AI answer in the background (shared by SSE and WebSocket).
+    
+    Args:
+        user_text: Validated user message
+        session_id: Existing session, or None to create one
+        user_id: User the session belongs to
+    
+    Returns:
+        StreamGeneration (see streaming.py) - its final event carries the session_id
+    """
+    # Get or create session
+    history = []
+    if not session_id:
+        session_id = memory_manager.create_session(user_id=user_id)
+        logger.info("Created new session for streaming: %s", session_id)
+    else:
+        history = prompt_builder.history_from_session(memory_manager.get_session_history(session_id))
+    
+    # Stream AI response, grouped into frames (one json.dumps + write per frame)
+    upstream = request_timing.timed_stream(chat_ai.stream_response(
+        message=user_text,
+        system_prompt=prompt_builder.system_prompt(),
+        history=history,
+        session_id=session_id
+    ))
+    frames = coalesce_tokens(
+        upstream,
+        flush_interval=settings.STREAM_FLUSH_INTERVAL_MS / 1000,
+        max_frame_bytes=settings.STREAM_MAX_FRAME_BYTES
+    )
+    
+    def save_conversation(response_text: str, truncated: bool):
+        """Store the (possibly partial) answer in memory."""
+        memory_manager.add_message(
+            session_id=session_id,
+            message=user_text,
+            sender="user",
+            response=response_text,
+            truncated=truncated
+        )
+    
+    # Generation runs in the background so a reconnecting client can resume it
+    return stream_registry.start(
+        frames,
+        on_finish=save_conversation,
+        final_event={"session_id": session_id}
+    )
+
+
 @app.post("/chat/stream")
-async def chat_stream(chat_message: ChatMessage):
+async def chat_stream(chat_message: ChatMessage, request: Request):
     """
     Streaming chat endpoint - Returns AI responses word-by-word (like ChatGPT!).
     
@@ -748,7 +1016,12 @@ async def chat_stream(chat_message: ChatMessage):
     - Real-time streaming responses
     - Works with Ollama, OpenAI, etc.
     - Session management
-    - Server-Sent Events (SSE) format
+    - Server-Sent Events (SSE) format, every event has an ID
+      ("<generation_id>:<seq>")
+    - Resumable: re-send the request with a Last-Event-ID header to get only
+      the missing part of a running or just-finished answer (no new inference)
+    - Stops Ollama if no client comes back within STREAM_RESUME_GRACE seconds;
+      the partial answer is saved with truncated=True
     
     Example Usage (JavaScript):
         const eventSource = new EventSource('/chat/stream');
@@ -758,67 +1031,206 @@ async def chat_stream(chat_message: ChatMessage):
         };
     """
     try:
+        # Reconnect: attach to the generation the client was reading
+        # (if it already expired, the request is answered from scratch)
+        generation_id, last_seq = parse_last_event_id(request.headers.get("last-event-id"))
+        generation = stream_registry.get(generation_id)
+        if generation is not None:
+            stream_stats.record("resumed")
+            logger.info("🔁 Resuming stream %s after event %s", generation_id[:8], last_seq)
+            return _sse_response(_follow_generation(request, generation, last_seq))
+        
         # Validate message
         user_text = chat_message.message.strip()
         if not user_text:
             raise HTTPException(status_code=400, detail="Message cannot be empty")
+        request_timing.record_elapsed("validation")
         
-        # Get or create session
-        session_id = chat_message.session_id
-        if not session_id:
-            session_id = memory_manager.create_session(user_id=chat_message.user_id)
-            logger.info(f"Created new session for streaming: {session_id}")
-        
-        # Generator function for streaming
-        async def generate_stream():
-            """Generate Server-Sent Events stream."""
-            try:
-                full_response = ""
-                
-                # Stream AI response
-                async for chunk in chat_ai.stream_response(
-                    message=user_text,
-                    system_prompt="You are Nitro AI, a helpful and friendly assistant."
-                ):
-                    full_response += chunk
-                    
-                    # Send chunk as Server-Sent Event
-                    yield f"data: {json.dumps({'chunk': chunk, 'done': False})}\n\n"
-                
-                # Store conversation in memory
-                memory_manager.add_message(
-                    session_id=session_id,
-                    message=user_text,
-                    sender="user",
-                    response=full_response
-                )
-                
-                # Send completion signal
-                yield f"data: {json.dumps({'chunk': '', 'done': True, 'session_id': session_id})}\n\n"
-                
-            except Exception as e:
-                logger.error(f"Streaming error: {e}")
-                error_msg = f"Error: {str(e)}"
-                yield f"data: {json.dumps({'chunk': error_msg, 'done': True, 'error': True})}\n\n"
-        
-        # Return streaming response
-        return StreamingResponse(
-            generate_stream(),
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "X-Accel-Buffering": "no"  # Disable nginx buffering
-            }
-        )
+        generation = _start_chat_generation(user_text, chat_message.session_id, chat_message.user_id)
+        return _sse_response(_follow_generation(request, generation))
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in streaming chat: {e}", exc_info=True)
+        logger.error("Error in streaming chat: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Streaming error occurred")
 
 
+@app.get("/chat/stream/{generation_id}")
+async def chat_stream_resume(generation_id: str, request: Request, last_event_id: Optional[str] = None):
+    """
+    Resume a stream by generation ID (for EventSource-style reconnects).
+    
+    The position comes from the Last-Event-ID header (or ?last_event_id=).
+    Returns 404 once the stream has expired from the replay buffer.
+    """
+    _, last_seq = parse_last_event_id(request.headers.get("last-event-id") or last_event_id)
+    generation = stream_registry.get(generation_id)
+    if generation is None:
+        raise HTTPException(status_code=404, detail="Stream not found or expired")
+    stream_stats.record("resumed")
+    return _sse_response(_follow_generation(request, generation, last_seq))
+
+
+# === WEBSOCKET CHAT ENDPOINT ===
+
+@app.websocket("/ws/chat")
+async def websocket_chat(websocket: WebSocket):
+    """
+    WebSocket chat - many streamed answers over one connection.
+    
+    Cheaper than one POST + SSE response per message (especially through
+    Cloudflare Tunnel): the connection stays open, and answers are
+    multiplexed by a client-chosen request id.
+    
+    Client -> server (JSON):
+        {"type": "chat", "id": "r1", "message": "Hi", "session_id": "...", "user_id": "..."}
+        {"type": "cancel", "id": "r1"}              - stop that answer now
+        {"type": "resume", "id": "r1", "generation_id": "...", "after": 12}
+        {"type": "ping"}                            - server answers {"type": "pong"}
+    
+    Server -> client (JSON):
+        {"type": "start", "id": "r1", "generation_id": "..."}
+        {"type": "event", "id": "r1", "seq": 1, "data": {"chunk": "Hel", "done": false}}
+        {"type": "error", "id": "r1", "detail": "..."}
+        {"type": "ping"}                            - every WS_PING_INTERVAL seconds
+    
+    The last event of an answer has data.done = true (and data.session_id).
+    With ENABLE_API_KEY=True, connect with ?api_key=... (or the X-API-Key header).
+    """
+    if not verify_websocket_api_key(websocket):
+        await websocket.close(code=1008)  # Policy violation
+        return
+    await websocket.accept()
+    
+    send_lock = asyncio.Lock()
+    active: Dict[str, tuple] = {}  # request id -> (forwarding task, generation)
+    
+    async def send(text: str):
+        # One writer at a time - answers are forwarded by concurrent tasks
+        async with send_lock:
+            await websocket.send_text(text)
+    
+    async def forward(request_id: str, generation, after_seq: int = 0):
+        """Send a generation's events to this socket."""
+        prefix = f'{{"type": "event", "id": {json.dumps(request_id)}, "seq": '
+        try:
+            await send(json.dumps({"type": "start", "id": request_id, "generation_id": generation.id}))
+            async for seq, payload in generation.iter_events(after_seq):
+                # Payload is already JSON - no second encode per event
+                await send(f'{prefix}{seq}, "data": {payload}}}')
+        except Exception as e:
+            logger.debug("WebSocket forward of %s stopped: %s", request_id, e)
+        finally:
+            active.pop(request_id, None)
+            stream_registry.detach(generation)
+    
+    async def ping_loop():
+        try:
+            while True:
+                await asyncio.sleep(settings.WS_PING_INTERVAL)
+                await send('{"type": "ping"}')
+        except Exception:
+            pass  # Socket closed - the receive loop handles it
+    
+    async def error(request_id, detail: str):
+        await send(json.dumps({"type": "error", "id": request_id, "detail": detail}))
+    
+    async def handle(message: Dict, msg_type, request_id: str):
+        """Act on one client message."""
+        if msg_type == "ping":
+            await send('{"type": "pong"}')
+        
+        elif msg_type == "cancel":
+            if request_id in active:
+                _, generation = active[request_id]
+                stream_registry.cancel(generation)
+        
+        elif msg_type in ("chat", "resume"):
+            if not request_id or request_id in active:
+                await error(request_id, "Missing or duplicate request id")
+                return
+            if len(active) >= settings.WS_MAX_CONCURRENT:
+                await error(request_id, f"Too many concurrent requests (max {settings.WS_MAX_CONCURRENT})")
+                return
+            
+            after_seq = 0
+            if msg_type == "resume":
+                generation_id = message.get("generation_id")
+                generation = stream_registry.get(generation_id) if isinstance(generation_id, str) else None
+                if generation is None:
+                    await error(request_id, "Stream not found or expired")
+                    return
+                after = message.get("after", 0)
+                if after is None:
+                    after = 0
+                if isinstance(after, bool) or not isinstance(after, (int, str)) or not str(after).isdigit():
+                    await error(request_id, "after must be a non-negative integer")
+                    return
+                after_seq = int(after)
+                stream_stats.record("resumed")
+            else:
+                user_text = str(message.get("message", "")).strip()
+                if not user_text:
+                    await error(request_id, "Message cannot be empty")
+                    return
+                if len(user_text) > settings.MAX_MESSAGE_LENGTH:
+                    await error(request_id, f"Message too long. Maximum {settings.MAX_MESSAGE_LENGTH} characters allowed.")
+                    return
+                session_id = message.get("session_id")
+                user_id = message.get("user_id") or settings.DEFAULT_USER_ID
+                if (session_id is not None and not isinstance(session_id, str)) or not isinstance(user_id, str):
+                    await error(request_id, "session_id and user_id must be strings")
+                    return
+                # Each answer is timed on its own (final event "timing", /metrics)
+                request_timing.begin(kind="ws")
+                generation = _start_chat_generation(user_text, session_id, user_id)
+            
+            task = asyncio.ensure_future(forward(request_id, generation, after_seq))
+            active[request_id] = (task, generation)
+        
+        else:
+            await error(request_id, f"Unknown message type: {msg_type}")
+    
+    pinger = asyncio.ensure_future(ping_loop())
+    try:
+        while True:
+            # receive() rather than receive_text(): a binary frame must get an
+            # error answer, not a KeyError that closes the socket
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            if frame.get("text") is None:
+                await error(None, "Invalid JSON message (binary frames are not supported)")
+                continue
+            try:
+                message = json.loads(frame["text"])
+                msg_type = message.get("type")
+                raw_id = message.get("id")
+                request_id = "" if raw_id is None else str(raw_id)
+            except (json.JSONDecodeError, AttributeError):
+                await error(None, "Invalid JSON message")
+                continue
+            
+            # A bad message gets an error answer; it must not end the
+            # socket and every answer multiplexed on it
+            try:
+                await handle(message, msg_type, request_id)
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                logger.warning("⚠️ WebSocket message %s failed: %s: %s", request_id or "?", type(e).__name__, e)
+                await error(request_id or None, f"Could not handle message: {type(e).__name__}")
+    
+    except WebSocketDisconnect:
+        logger.info("🔌 WebSocket closed with %s answer(s) in flight", len(active))
+    finally:
+        pinger.cancel()
+        # Stop forwarding; answers keep running for STREAM_RESUME_GRACE (resumable)
+        for task, _ in list(active.values()):
+            task.cancel()
+
+
 # ============================================================================
 # IMAGE GENERATION ENDPOINTS
 # ============================================================================
@@ -851,7 +1263,7 @@ async def generate_image(
         }
     """
     try:
-        logger.info(f"Image generation requested: {prompt[:50]}...")
+        logger.info("Image generation requested: %s...", prompt[:50])
         
         result = await image_generator.generate_image(
             prompt=prompt,
@@ -863,7 +1275,7 @@ async def generate_image(
         return result
         
     except Exception as e:
-        logger.error(f"Image generation error: {e}")
+        logger.error("Image generation error: %s", e)
         raise HTTPException(status_code=500, detail=f"Image generation failed: {str(e)}")
 
 
@@ -888,7 +1300,7 @@ async def get_image_gallery(limit: int = 20):
         }
         
     except Exception as e:
-        logger.error(f"Gallery error: {e}")
+        logger.error("Gallery error: %s", e)
         raise HTTPException(status_code=500, detail="Failed to load gallery")
 
 
@@ -926,7 +1338,7 @@ async def speech_to_text(
         return result
         
     except Exception as e:
-        logger.error(f"STT error: {e}")
+        logger.error("STT error: %s", e)
         raise HTTPException(status_code=500, detail=f"Speech-to-text failed: {str(e)}")
 
 
@@ -955,7 +1367,7 @@ async def text_to_speech(
         }
     """
     try:
-        logger.info(f"Text-to-speech requested: {text[:50]}...")
+        logger.info("Text-to-speech requested: %s...", text[:50])
         
         # Update language if different
         if language != voice_assistant.language:
@@ -969,7 +1381,7 @@ async def text_to_speech(
         return result
         
     except Exception as e:
-        logger.error(f"TTS error: {e}")
+        logger.error("TTS error: %s", e)
         raise HTTPException(status_code=500, detail=f"Text-to-speech failed: {str(e)}")
 
 
@@ -1000,7 +1412,7 @@ async def web_search(
         }
     """
     try:
-        logger.info(f"Web search requested: {query}")
+        logger.info("Web search requested: %s", query)
         
         result = await web_search_ai.search(
             query=query,
@@ -1010,7 +1422,7 @@ async def web_search(
         return result
         
     except Exception as e:
-        logger.error(f"Search error: {e}")
+        logger.error("Search error: %s", e)
         raise HTTPException(status_code=500, detail=f"Web search failed: {str(e)}")
 
 
@@ -1031,9 +1443,42 @@ if settings.DEBUG_MODE:
                 "timestamp": datetime.now().isoformat()
             }
         except Exception as e:
-            logger.error(f"Error clearing memory: {e}")
+            logger.error("Error clearing memory: %s", e)
             raise HTTPException(status_code=500, detail="Failed to clear memory")
 
+    @app.get("/debug/profile")
+    async def profile_process(
+        seconds: float = 10,
+        interval_ms: float = 10,
+        memory: bool = False,
+        format: str = "collapsed",
+        admin: bool = Depends(verify_admin_api_key)
+    ):
+        """
+        [DEBUG ONLY, API key required] Sample what the server is doing for N seconds.
+        
+        Every thread's stack is sampled every interval_ms while real traffic
+        keeps being served (the sampler runs in a worker thread).
+        
+        Returns:
+        - format=collapsed (default): collapsed stacks as text, ready for
+          flamegraph.pl or speedscope.app
+        - format=json, or memory=true: JSON with the collapsed stacks and,
+          with memory=true, the tracemalloc diff (lines whose memory grew)
+        """
+        if format not in ("collapsed", "json"):
+            raise HTTPException(status_code=400, detail="format must be 'collapsed' or 'json'")
+        try:
+            result = await asyncio.to_thread(
+                sampling_profiler.profile, seconds, interval_ms / 1000, memory
+            )
+        except ProfilerBusyError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        
+        if format == "collapsed" and not memory:
+            return PlainTextResponse(result["collapsed"])
+        return result
+
 
 # ============================================================================
 # AUTOMATION AGENT ENDPOINTS (NEW)
@@ -1058,7 +1503,7 @@ async def execute_agent_task(task: Dict[str, Any]):
         }
     """
     try:
-        logger.info(f"Agent task requested: {task.get('type')}")
+        logger.info("Agent task requested: %s", task.get('type'))
         
         result = await agent_manager.execute_task(task)
         
@@ -1069,7 +1514,7 @@ async def execute_agent_task(task: Dict[str, Any]):
         }
         
     except Exception as e:
-        logger.error(f"Agent execution error: {e}")
+        logger.error("Agent execution error: %s", e)
         raise HTTPException(status_code=500, detail=f"Agent task failed: {str(e)}")
 
 
@@ -1091,7 +1536,7 @@ async def list_agents():
         }
         
     except Exception as e:
-        logger.error(f"Error listing agents: {e}")
+        logger.error("Error listing agents: %s", e)
         raise HTTPException(status_code=500, detail="Failed to list agents")
 
 
@@ -1120,7 +1565,7 @@ async def code_review(code: str, language: str = "python"):
         return result
         
     except Exception as e:
-        logger.error(f"Code review error: {e}")
+        logger.error("Code review error: %s", e)
         raise HTTPException(status_code=500, detail="Code review failed")
 
 
@@ -1147,7 +1592,7 @@ async def analyze_file(file_path: str):
         return result
         
     except Exception as e:
-        logger.error(f"File analysis error: {e}")
+        logger.error("File analysis error: %s", e)
         raise HTTPException(status_code=500, detail="File analysis failed")
 
 
@@ -1193,7 +1638,20 @@ async def get_metrics():
             "agents": {
                 "available": len(agent_manager.agents),
                 "enabled": sum(1 for a in agent_manager.agents.values() if a.enabled)
-            }
+            },
+            "ollama_pool": ollama_pool.get_stats(),
+            "model_routing": model_router.get_report(),
+            "model_keeper": model_keeper.get_stats(),
+            "ollama_options": options_planner.get_stats(),
+            "prompt_cache": prompt_builder.get_stats(),
+            "streaming": {**stream_stats.get_stats(), **stream_registry.get_stats()},
+            "llm_dispatcher": llm_dispatcher.get_stats(),
+            "llm_backend": llm_backend.get_stats(),
+            "request_timing": timing_stats.get_stats(),
+            "generation_stats": generation_stats.get_stats(),
+            "event_loop": loop_monitor.get_stats(),
+            "search_cache": search_cache.get_stats(),
+            "logging": get_log_stats()
         }
         
         return metrics
@@ -1203,13 +1661,92 @@ async def get_metrics():
         return {
             "status": "limited",
             "message": "Install psutil for detailed metrics: pip install psutil",
-            "basic_stats": memory_manager.get_statistics()
+            "basic_stats": memory_manager.get_statistics(),
+            "request_timing": timing_stats.get_stats(),
+            "generation_stats": generation_stats.get_stats(),
+            "search_cache": search_cache.get_stats(),
+            "logging": get_log_stats()
         }
     except Exception as e:
-        logger.error(f"Metrics error: {e}")
+        logger.error("Metrics error: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get metrics")
 
 
+# Gauges read at scrape time from the components' own counters (no per-request cost)
+metrics_registry.gauge_callback(
+    "nitro_llm_dispatcher_waiting", "LLM requests waiting for admission",
+    lambda: {(p,): s.get("waiting", 0) for p, s in llm_dispatcher.stats.items()}, ["priority"]
+)
+metrics_registry.gauge_callback(
+    "nitro_llm_dispatcher_running", "LLM requests admitted and running",
+    lambda: {(p,): s["running"] for p, s in llm_dispatcher.stats.items()}, ["priority"]
+)
+metrics_registry.gauge_callback(
+    "nitro_ollama_in_flight", "Requests running on the Ollama pool",
+    lambda: ollama_pool.usage(settings.OLLAMA_PARALLEL_PER_BACKEND)[0]
+)
+metrics_registry.gauge_callback(
+    "nitro_ollama_capacity", "Parallel slots of usable Ollama backends",
+    lambda: ollama_pool.usage(settings.OLLAMA_PARALLEL_PER_BACKEND)[1]
+)
+metrics_registry.gauge_callback(
+    "nitro_streams_running", "Streamed answers being generated",
+    lambda: stream_registry.get_stats()["running"]
+)
+
+
+def _cache_hit_ratios() -> Dict:
+    """Prompt prefix reuse (Ollama KV-cache) and session stickiness hit ratios."""
+    prompt = prompt_builder.get_stats()
+    sticky = ollama_pool.get_stats()["session_stickiness"]
+    lookups = sticky["hits"] + sticky["moves"]
+    return {
+        ("prompt_prefix_first_turn",): prompt["first_turns"]["prefix_reuse_rate"],
+        ("prompt_prefix_follow_up",): prompt["follow_up_turns"]["prefix_reuse_rate"],
+        ("session_stickiness",): sticky["hits"] / lookups if lookups else None,
+    }
+
+
+metrics_registry.gauge_callback(
+    "nitro_cache_hit_ratio", "Share of lookups served from a cache", _cache_hit_ratios, ["cache"]
+)
+
+
+@app.get("/metrics/prometheus", response_class=PlainTextResponse)
+async def get_prometheus_metrics():
+    """
+    Metrics in Prometheus text format (point your scraper here).
+    
+    Includes:
+    - Per-route request counts and latency histograms
+    - Request phases (queue, llm_ttft, llm, memory_read/write, search_*)
+    - LLM tokens and tokens/second (per request kind and per model)
+    - Queue depth, in-flight requests, cache hit ratios
+    - Storage load/commit latency and event-loop lag
+    - Event-loop stalls by blocking function
+    """
+    return PlainTextResponse(
+        metrics_registry.expose(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/metrics/event-loop")
+async def get_event_loop_report(limit: int = 50):
+    """
+    Which functions blocked the event loop, worst first.
+    
+    Every stall over LOOP_LAG_THRESHOLD_MS is counted against the innermost
+    function of our own code that was running, with the library call it was
+    stuck in and the last captured stack. Compare this before and after a
+    change to prove a blocking call is gone.
+    """
+    return {
+        **loop_monitor.get_stats(),
+        "blocking_calls": loop_monitor.get_blocking_calls(limit=max(1, limit))
+    }
+
+
 # === STATIC FILE SERVING (Frontend) ===
 # Mount frontend files to serve the web interface
 try:
@@ -14,8 +14,19 @@ import uuid
 # Import with compatibility for both local and package mode
 try:
     from .logger import logger
+    from . import request_timing
+    from .metrics import registry
 except ImportError:
     from logger import logger
+    import request_timing
+    from metrics import registry
+
+storage_load_seconds = registry.histogram(
+    "nitro_storage_load_seconds", "Conversation store read time (full JSON load)"
+)
+storage_commit_seconds = registry.histogram(
+    "nitro_storage_commit_seconds", "Conversation store commit time (backup + JSON write + rename)"
+)
 
 class MemoryManager:
     """
@@ -60,14 +71,19 @@ class MemoryManager:
     def _load_data(self) -> Dict:
         """Load conversation data from JSON file."""
         try:
-            with open(self.conversations_file, 'r', encoding='utf-8') as f:
+            with request_timing.span("memory_read", storage_load_seconds), open(self.conversations_file, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except Exception as e:
-            logger.error(f"Error loading conversation data: {e}")
+            logger.error("Error loading conversation data: %s", e)
             return self._get_empty_data()
     
     def _save_data(self, data: Dict):
         """Save conversation data to JSON file with error recovery."""
+        with request_timing.span("memory_write", storage_commit_seconds):
+            self._write_data(data)
+    
+    def _write_data(self, data: Dict):
+        """Write the JSON file (backup, temp file, atomic rename)."""
         try:
             # Ensure directory exists
             self.memory_dir.mkdir(parents=True, exist_ok=True)
@@ -79,7 +95,7 @@ class MemoryManager:
                     import shutil
                     shutil.copy2(self.conversations_file, backup_file)
                 except Exception as backup_error:
-                    logger.warning(f"Could not create backup: {backup_error}")
+                    logger.warning("Could not create backup: %s", backup_error)
             
             # Save with atomic write (write to temp, then rename)
             temp_file = self.memory_dir / "conversations.temp.json"
@@ -92,7 +108,7 @@ class MemoryManager:
             logger.debug("Conversation data saved successfully")
             
         except Exception as e:
-            logger.error(f"Error saving conversation data: {e}")
+            logger.error("Error saving conversation data: %s", e)
             # Try to restore from backup if save failed
             backup_file = self.memory_dir / "conversations.backup.json"
             if backup_file.exists():
@@ -101,7 +117,7 @@ class MemoryManager:
                     shutil.copy2(backup_file, self.conversations_file)
                     logger.info("Restored from backup after save failure")
                 except Exception as restore_error:
-                    logger.error(f"Could not restore from backup: {restore_error}")
+                    logger.error("Could not restore from backup: %s", restore_error)
             raise
     
     def _get_empty_data(self) -> Dict:
@@ -143,7 +159,7 @@ class MemoryManager:
         
         self._save_data(data)
         
-        logger.info(f"Created new session: {session_id} for user: {user_id}")
+        logger.info("Created new session: %s for user: %s", session_id, user_id)
         return session_id
     
     def add_message(
@@ -151,7 +167,8 @@ class MemoryManager:
         session_id: str, 
         message: str, 
         sender: str,
-        response: Optional[str] = None
+        response: Optional[str] = None,
+        truncated: bool = False
     ) -> bool:
         """
         Add a message to a session.
@@ -161,6 +178,7 @@ class MemoryManager:
             message: User message text
             sender: Who sent the message ('user' or 'ai')
             response: AI response (if sender is 'user')
+            truncated: True if the response was cut off (client disconnected)
         
         Returns:
             bool: Success status
@@ -176,7 +194,7 @@ class MemoryManager:
                     break
             
             if not session:
-                logger.warning(f"Session not found: {session_id}")
+                logger.warning("Session not found: %s", session_id)
                 return False
             
             # Create message entry
@@ -188,6 +206,8 @@ class MemoryManager:
             
             if response and sender == "user":
                 message_entry["response"] = response
+                if truncated:
+                    message_entry["truncated"] = True
             
             # Add to session
             session["messages"].append(message_entry)
@@ -198,11 +218,11 @@ class MemoryManager:
             
             self._save_data(data)
             
-            logger.info(f"Added message to session {session_id}")
+            logger.info("Added message to session %s", session_id)
             return True
             
         except Exception as e:
-            logger.error(f"Error adding message: {e}")
+            logger.error("Error adding message: %s", e)
             return False
     
     def get_session_history(self, session_id: str) -> Optional[Dict]:
@@ -220,14 +240,14 @@ class MemoryManager:
             
             for session in data["sessions"]:
                 if session["session_id"] == session_id:
-                    logger.info(f"Retrieved session: {session_id}")
+                    logger.info("Retrieved session: %s", session_id)
                     return session
             
-            logger.warning(f"Session not found: {session_id}")
+            logger.warning("Session not found: %s", session_id)
             return None
             
         except Exception as e:
-            logger.error(f"Error retrieving session: {e}")
+            logger.error("Error retrieving session: %s", e)
             return None
     
     def get_recent_sessions(self, limit: int = 10, user_id: Optional[str] = None) -> List[Dict]:
@@ -256,7 +276,7 @@ class MemoryManager:
             return sessions[:limit]
             
         except Exception as e:
-            logger.error(f"Error retrieving recent sessions: {e}")
+            logger.error("Error retrieving recent sessions: %s", e)
             return []
     
     def delete_session(self, session_id: str) -> bool:
@@ -279,14 +299,14 @@ class MemoryManager:
             if len(data["sessions"]) < original_count:
                 data["metadata"]["total_sessions"] -= 1
                 self._save_data(data)
-                logger.info(f"Deleted session: {session_id}")
+                logger.info("Deleted session: %s", session_id)
                 return True
             else:
-                logger.warning(f"Session not found for deletion: {session_id}")
+                logger.warning("Session not found for deletion: %s", session_id)
                 return False
                 
         except Exception as e:
-            logger.error(f"Error deleting session: {e}")
+            logger.error("Error deleting session: %s", e)
             return False
     
     def get_statistics(self) -> Dict:
@@ -310,7 +330,7 @@ class MemoryManager:
             return stats
             
         except Exception as e:
-            logger.error(f"Error getting statistics: {e}")
+            logger.error("Error getting statistics: %s", e)
             return {}
     
     def clear_all_sessions(self) -> bool:
@@ -325,7 +345,7 @@ class MemoryManager:
             logger.warning("All conversation history cleared!")
             return True
         except Exception as e:
-            logger.error(f"Error clearing sessions: {e}")
+            logger.error("Error clearing sessions: %s", e)
             return False
 
 
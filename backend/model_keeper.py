@@ -0,0 +1,293 @@
+"""
+model_keeper.py - Model warm-up, keep-alive and loaded-model RAM budget
+Keeps the models we actually serve loaded, so users never wait on a cold start
+
+What it does:
+- Warm-up: on startup, loads every configured model on every backend
+  (Ollama loads a model when it gets an empty prompt)
+- Keep-alive: requests carry Ollama's keep_alive, and models that were used
+  recently get a periodic ping so Ollama doesn't unload them while idle
+- RAM budget: if MODEL_RAM_BUDGET_MB is set, a backend never holds more
+  loaded models than fit; the least recently used model is unloaded first
+  (keep_alive=0) - models we never route to go before the ones we do
+
+Models kept warm: OLLAMA_MODEL, plus FAST_MODEL/LARGE_MODEL when the
+model router is enabled.
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+# Import with compatibility for both local and package mode
+try:
+    from .config import settings
+    from .logger import logger
+    from .ollama_pool import ollama_pool, normalize_model_name
+    from .model_router import model_router
+except ImportError:
+    from config import settings
+    from logger import logger
+    from ollama_pool import ollama_pool, normalize_model_name
+    from model_router import model_router
+
+
+class ModelKeeper:
+    """
+    Warms up models, keeps them loaded and enforces a RAM budget per backend.
+    """
+
+    def __init__(
+        self,
+        pool,
+        models: List[str],
+        keep_alive: str = "30m",
+        ping_interval: int = 240,
+        idle_after: int = 1800,
+        ram_budget_mb: int = 0,
+        warmup_enabled: bool = True
+    ):
+        """
+        Initialize the model keeper.
+
+        Args:
+            pool: OllamaPool whose backends we manage
+            models: Models to warm up and keep loaded
+            keep_alive: Ollama keep_alive value sent with pings (e.g. "30m")
+            ping_interval: Seconds between keep-alive pings
+            idle_after: Stop pinging a model this many seconds after its last use
+            ram_budget_mb: Max RAM for loaded models per backend (0 = no limit)
+            warmup_enabled: Load models on startup
+        """
+        self.pool = pool
+        self.models = list(dict.fromkeys(normalize_model_name(m) for m in models if m))
+        self.keep_alive = keep_alive
+        self.ping_interval = ping_interval
+        self.idle_after = idle_after
+        self.ram_budget_bytes = ram_budget_mb * 1024 * 1024
+        self.warmup_enabled = warmup_enabled
+
+        self._model_sizes: Dict[str, int] = {}  # model -> bytes (from /api/tags)
+        self._task: Optional[asyncio.Task] = None
+        self._session = None
+        self._budget_checks = set()  # backend URLs with a check already scheduled
+
+        self.stats = {"warmups": 0, "warmup_failures": 0, "pings": 0, "unloads": 0, "warmup_seconds": {}}
+
+        if self.ram_budget_bytes:
+            # Check the budget as soon as a cold model is about to be loaded
+            pool.on_cold_model = self._on_cold_model
+
+    # ------------------------------------------------------------------
+    # OLLAMA CALLS
+    # ------------------------------------------------------------------
+
+    async def _generate(self, node, model: str, keep_alive) -> bool:
+        """
+        Send an empty /api/generate (loads the model, or unloads with keep_alive=0).
+
+        Returns:
+            True if Ollama accepted the request
+        """
+        try:
+            async with self._session.post(
+                f"{node.url}/api/generate",
+                json={"model": model, "prompt": "", "keep_alive": keep_alive, "stream": False},
+            ) as response:
+                await response.read()
+                return response.status == 200
+        except Exception as e:
+            logger.debug("Ollama %s /api/generate (%s) failed: %s", node.url, model, e)
+            return False
+
+    async def _loaded_models(self, node) -> Dict[str, int]:
+        """Get {model: size_bytes} of models loaded on a backend (GET /api/ps)."""
+        async with self._session.get(f"{node.url}/api/ps") as response:
+            data = await response.json()
+        return {
+            normalize_model_name(m.get("name") or m.get("model")): int(m.get("size", 0))
+            for m in data.get("models", [])
+        }
+
+    async def _refresh_model_sizes(self, node):
+        """Cache model sizes from /api/tags (used to predict a cold load)."""
+        try:
+            async with self._session.get(f"{node.url}/api/tags") as response:
+                data = await response.json()
+            for m in data.get("models", []):
+                self._model_sizes[normalize_model_name(m.get("name") or m.get("model"))] = int(m.get("size", 0))
+        except Exception as e:
+            logger.debug("Could not read model sizes from %s: %s", node.url, e)
+
+    # ------------------------------------------------------------------
+    # WARM-UP & KEEP-ALIVE
+    # ------------------------------------------------------------------
+
+    async def warm_up(self):
+        """Load every configured model on every backend."""
+        async def load(node, model):
+            if self.ram_budget_bytes:
+                await self.enforce_budget(node, incoming=model)
+            start_time = time.time()
+            if await self._generate(node, model, self.keep_alive):
+                elapsed = round(time.time() - start_time, 2)
+                self.stats["warmups"] += 1
+                self.stats["warmup_seconds"][f"{node.url}|{model}"] = elapsed
+                node.loaded_models.add(model)
+                node.model_last_used.setdefault(model, time.time())
+                logger.info(f"🔥 Warmed up {model} on {node.url} in {elapsed}s")
+            else:
+                self.stats["warmup_failures"] += 1
+                logger.warning(f"⚠️ Could not warm up {model} on {node.url}")
+
+        for node in self.pool.nodes:
+            await self._refresh_model_sizes(node)
+            # One model at a time per backend - parallel loads just fight for RAM
+            for model in self.models:
+                await load(node, model)
+
+    async def ping(self):
+        """Keep recently used models loaded (resets Ollama's keep_alive timer)."""
+        now = time.time()
+        for node in self.pool.nodes:
+            for model in self.models:
+                last_used = node.model_last_used.get(model)
+                if last_used is None or now - last_used > self.idle_after:
+                    continue  # Idle model - let Ollama unload it naturally
+                if model not in node.loaded_models:
+                    continue  # Don't load models from a keep-alive ping
+                if await self._generate(node, model, self.keep_alive):
+                    self.stats["pings"] += 1
+
+    # ------------------------------------------------------------------
+    # RAM BUDGET
+    # ------------------------------------------------------------------
+
+    async def enforce_budget(self, node, incoming: Optional[str] = None):
+        """
+        Unload least recently used models until the backend fits the budget.
+
+        Args:
+            node: Backend to check
+            incoming: Model about to be loaded (its size is reserved)
+        """
+        if not self.ram_budget_bytes:
+            return
+        try:
+            loaded = await self._loaded_models(node)
+        except Exception as e:
+            logger.debug("Budget check skipped for %s: %s", node.url, e)
+            return
+
+        needed = 0
+        if incoming and incoming not in loaded:
+            needed = self._model_sizes.get(incoming, 0)
+
+        def lru_key(model):
+            # Models we don't serve go first, then least recently used
+            return (model in self.models, node.model_last_used.get(model, 0.0))
+
+        while loaded and sum(loaded.values()) + needed > self.ram_budget_bytes:
+            victims = [m for m in loaded if m != incoming]
+            if not victims:
+                break
+            victim = min(victims, key=lru_key)
+            if await self._generate(node, victim, 0):
+                self.stats["unloads"] += 1
+                node.loaded_models.discard(victim)
+                logger.info(
+                    f"📦 Unloaded {victim} from {node.url} "
+                    f"(RAM budget {self.ram_budget_bytes // (1024 * 1024)}MB)"
+                )
+            loaded.pop(victim)
+
+    def _on_cold_model(self, node, model: str):
+        """Pool hook: a request is about to load `model` on `node`."""
+        if self._session is None or node.url in self._budget_checks:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Not called from the event loop - the periodic check covers it
+
+        async def check():
+            try:
+                await self.enforce_budget(node, incoming=model)
+            finally:
+                self._budget_checks.discard(node.url)
+
+        self._budget_checks.add(node.url)
+        loop.create_task(check())
+
+    # ------------------------------------------------------------------
+    # LIFECYCLE
+    # ------------------------------------------------------------------
+
+    async def _run(self):
+        """Background task: warm up once, then ping and enforce the budget."""
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=300)) as session:
+            self._session = session
+            try:
+                if self.warmup_enabled:
+                    await self.warm_up()
+                while True:
+                    await asyncio.sleep(self.ping_interval)
+                    for node in self.pool.nodes:
+                        await self.enforce_budget(node)
+                    await self.ping()
+            finally:
+                self._session = None
+
+    def start(self):
+        """Start warm-up and keep-alive in the background (app startup)."""
+        if not AIOHTTP_AVAILABLE:
+            logger.warning("⚠️ aiohttp not installed - model warm-up disabled")
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict:
+        """Get warm-up, ping and unload counters."""
+        return {
+            "models": self.models,
+            "keep_alive": self.keep_alive,
+            "ram_budget_mb": self.ram_budget_bytes // (1024 * 1024),
+            **self.stats,
+        }
+
+
+def _served_models() -> List[str]:
+    """Models Nitro AI actually sends requests to."""
+    # The Ollama backend's default model (llm_backends.py) plus the routed ones
+    models = [settings.OLLAMA_MODEL]
+    if model_router.enabled:
+        models += [model_router.models["fast"], model_router.models["large"]]
+    return models
+
+
+# Create a singleton instance
+model_keeper = ModelKeeper(
+    pool=ollama_pool,
+    models=_served_models(),
+    keep_alive=settings.OLLAMA_KEEP_ALIVE,
+    ping_interval=settings.MODEL_KEEPALIVE_INTERVAL,
+    idle_after=settings.MODEL_IDLE_AFTER,
+    ram_budget_mb=settings.MODEL_RAM_BUDGET_MB,
+    warmup_enabled=settings.MODEL_WARMUP_ENABLED
+)
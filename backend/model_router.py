@@ -0,0 +1,311 @@
+"""
+model_router.py - Complexity-based routing between a fast and a large model
+Sends easy requests to a small model and hard ones to a big model
+
+Why?
+- llama3.2:1b answers "hi" or "what is an API?" just as well as llama3,
+  several times faster and with less RAM
+- Long prompts, code, "explain why..." questions and deep conversations
+  benefit from the bigger model
+
+How a request is scored (all features are cheap - no AI needed):
+- Prompt length (estimated tokens)
+- Code fences / code-looking text
+- Question type (greeting/definition vs explain/compare/debug)
+- Language (via LanguageDetector - small models are weaker outside English)
+- Conversation depth (number of previous turns)
+
+Score >= threshold -> "large" route, otherwise "fast" route.
+With routing disabled nothing is scored: requests keep the caller's
+default model and are reported under a "default" route.
+Weights and keywords can be overridden with MODEL_ROUTER_RULES (JSON) in .env.
+"""
+
+import json
+import re
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+# Import with compatibility for both local and package mode
+try:
+    from .config import settings
+    from .logger import logger
+    from .language_detector import LanguageDetector
+    from .generation_stats import generation_stats
+except ImportError:
+    from config import settings
+    from logger import logger
+    from language_detector import LanguageDetector
+    from generation_stats import generation_stats
+
+
+FAST = "fast"
+LARGE = "large"
+DEFAULT = "default"  # Routing disabled: the caller's own model
+
+# Default routing rules (override any key with MODEL_ROUTER_RULES)
+DEFAULT_RULES = {
+    "threshold": 2.0,              # Score at which we switch to the large model
+    "long_prompt_tokens": 60,      # +weight.length_medium above this
+    "very_long_prompt_tokens": 200,  # +weight.length_long above this
+    "language_min_confidence": 0.4,  # Only trust non-English detection above this
+    "turns_per_depth_point": 4,    # Conversation turns per +1 depth point
+    "max_depth_points": 2,
+    "weights": {
+        "length_medium": 1.0,
+        "length_long": 2.0,
+        "code_fence": 2.0,
+        "code_like": 1.0,
+        "complex_question": 1.5,
+        "simple_question": -1.0,
+        "non_english": 1.0,
+        "depth": 0.5,
+    },
+    "complex_keywords": [
+        "explain", "why", "compare", "difference between", "analyze", "analyse",
+        "design", "implement", "debug", "optimize", "refactor", "prove",
+        "step by step", "write a", "write an", "architecture", "trade-off", "tradeoff",
+    ],
+    "simple_keywords": [
+        "hi", "hello", "hey", "thanks", "thank you", "what is", "who is",
+        "define", "translate", "good morning", "good night",
+    ],
+}
+
+CODE_LIKE_PATTERN = re.compile(
+    r"(\bdef |\bclass |\bfunction\b|\bimport |\breturn\b|=>|\bSELECT\b|\{\s*$|;\s*$|</?\w+>)",
+    re.MULTILINE
+)
+
+
+def _keyword_pattern(keywords: List[str]) -> Optional[re.Pattern]:
+    """One regex matching any keyword as whole words ("why" doesn't match "anywhere")."""
+    if not keywords:
+        return None
+    return re.compile(r"\b(?:" + "|".join(re.escape(k) for k in keywords) + r")\b")
+
+
+def _merge_rules(overrides: Optional[Dict]) -> Dict:
+    """Merge user rule overrides over DEFAULT_RULES (one level deep for weights)."""
+    rules = json.loads(json.dumps(DEFAULT_RULES))
+    for key, value in (overrides or {}).items():
+        if key == "weights" and isinstance(value, dict):
+            rules["weights"].update(value)
+        else:
+            rules[key] = value
+    return rules
+
+
+class ModelRouter:
+    """
+    Picks the fast or the large model for each request and keeps a
+    per-route latency/usage report.
+
+    Usage:
+        >>> decision = model_router.route("Debug this:\n```py\nprint(x\n```")
+        >>> decision["model"]
+        'llama3'
+        >>> model_router.record(decision, latency=2.4, success=True)
+    """
+
+    def __init__(
+        self,
+        fast_model: str,
+        large_model: str,
+        enabled: bool = True,
+        rules: Optional[Dict] = None,
+        language_detector: Optional[LanguageDetector] = None,
+        throughput=None
+    ):
+        """
+        Initialize the model router.
+
+        Args:
+            fast_model: Small, quick model (e.g. "llama3.2:1b")
+            large_model: Bigger, smarter model (e.g. "llama3")
+            enabled: If False, every request keeps the caller's default
+                     model without being scored ("default" route)
+            rules: Overrides for DEFAULT_RULES
+            language_detector: Shared LanguageDetector (created if omitted)
+            throughput: GenerationStats - measured tokens/s of each model
+                        for the report (optional)
+        """
+        self.models = {FAST: fast_model, LARGE: large_model}
+        self.enabled = enabled
+        self.rules = _merge_rules(rules)
+        self._complex_pattern = _keyword_pattern(self.rules["complex_keywords"])
+        self._simple_pattern = _keyword_pattern(self.rules["simple_keywords"])
+        self.language_detector = language_detector or LanguageDetector()
+        self.throughput = throughput
+
+        self._lock = threading.Lock()
+        self._stats = {
+            route: {"requests": 0, "errors": 0, "timed": 0, "total_latency": 0.0, "latencies": deque(maxlen=500)}
+            for route in (FAST, LARGE, DEFAULT)
+        }
+
+        logger.info(
+            f"Model router {'enabled' if enabled else 'disabled'}: "
+            f"fast={fast_model}, large={large_model}, threshold={self.rules['threshold']}"
+        )
+
+    # ------------------------------------------------------------------
+    # SCORING
+    # ------------------------------------------------------------------
+
+    def extract_features(self, prompt: str, history_depth: int = 0) -> Dict:
+        """
+        Compute cheap features of a request.
+
+        Args:
+            prompt: User message
+            history_depth: Number of previous conversation turns
+
+        Returns:
+            Dictionary of feature values
+        """
+        text = prompt.lower()
+        lang_code, lang_confidence = self.language_detector.detect_language(prompt)
+        return {
+            "est_tokens": len(prompt) // 4 + 1,
+            "code_fence": "```" in prompt,
+            "code_like": bool(CODE_LIKE_PATTERN.search(prompt)),
+            "complex_question": bool(self._complex_pattern and self._complex_pattern.search(text)),
+            "simple_question": bool(self._simple_pattern and self._simple_pattern.search(text)),
+            "language": lang_code,
+            "language_confidence": round(lang_confidence, 2),
+            "history_depth": history_depth,
+        }
+
+    def score(self, features: Dict) -> float:
+        """
+        Turn features into a complexity score (higher = harder).
+
+        Args:
+            features: Output of extract_features()
+
+        Returns:
+            Complexity score
+        """
+        rules = self.rules
+        weights = rules["weights"]
+        score = 0.0
+
+        if features["est_tokens"] > rules["very_long_prompt_tokens"]:
+            score += weights["length_long"]
+        elif features["est_tokens"] > rules["long_prompt_tokens"]:
+            score += weights["length_medium"]
+
+        if features["code_fence"]:
+            score += weights["code_fence"]
+        elif features["code_like"]:
+            score += weights["code_like"]
+
+        if features["complex_question"]:
+            score += weights["complex_question"]
+        elif features["simple_question"]:
+            score += weights["simple_question"]
+
+        if features["language"] != "en" and features["language_confidence"] >= rules["language_min_confidence"]:
+            score += weights["non_english"]
+
+        depth_points = min(
+            rules["max_depth_points"],
+            features["history_depth"] // max(1, rules["turns_per_depth_point"])
+        )
+        score += depth_points * weights["depth"]
+
+        return round(score, 2)
+
+    def route(self, prompt: str, history_depth: int = 0, default_model: Optional[str] = None) -> Dict:
+        """
+        Decide which model should answer a request.
+
+        Args:
+            prompt: User message
+            history_depth: Number of previous conversation turns
+            default_model: Caller's own model, used when routing is disabled
+
+        Returns:
+            {"route": "fast"|"large"|"default", "model": str, "score": float, "features": dict}
+            (score and features are None when routing is disabled)
+        """
+        if not self.enabled:
+            # Nothing to decide: skip the scoring (and language detection)
+            return {"route": DEFAULT, "model": default_model or self.models[LARGE], "score": None, "features": None}
+        features = self.extract_features(prompt, history_depth)
+        score = self.score(features)
+        route = LARGE if score >= self.rules["threshold"] else FAST
+        model = self.models[route]
+        logger.debug("Model router: score=%s -> %s (%s)", score, route, model)
+        return {"route": route, "model": model, "score": score, "features": features}
+
+    # ------------------------------------------------------------------
+    # REPORTING
+    # ------------------------------------------------------------------
+
+    def record(self, decision: Dict, latency: Optional[float] = None, success: bool = True):
+        """
+        Record how a routed request went.
+
+        Args:
+            decision: Output of route()
+            latency: Request duration in seconds
+            success: False if the request failed
+        """
+        with self._lock:
+            stats = self._stats[decision["route"]]
+            stats["requests"] += 1
+            if not success:
+                stats["errors"] += 1
+            if latency is not None:
+                stats["timed"] += 1
+                stats["total_latency"] += latency
+                stats["latencies"].append(latency)
+
+    def get_report(self) -> Dict:
+        """Get per-route usage, latency and measured model speed."""
+        report = {"enabled": self.enabled, "threshold": self.rules["threshold"], "routes": {}}
+        with self._lock:
+            total = sum(s["requests"] for s in self._stats.values())
+            for route, stats in self._stats.items():
+                ordered: List[float] = sorted(stats["latencies"])
+                p95 = ordered[min(len(ordered) - 1, int(0.95 * (len(ordered) - 1)))] if ordered else None
+                if route == DEFAULT and not stats["requests"]:
+                    continue
+                report["routes"][route] = {
+                    "model": self.models.get(route),  # None for "default": each caller's own
+                    "requests": stats["requests"],
+                    "share": round(stats["requests"] / total, 3) if total else 0.0,
+                    "errors": stats["errors"],
+                    "avg_latency_ms": round(stats["total_latency"] / stats["timed"] * 1000, 1) if stats["timed"] else None,
+                    "p95_latency_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                }
+                if self.throughput is not None and route in self.models:
+                    # Real speed of the model behind this route (Ollama's own counters)
+                    model = self.models[route]
+                    report["routes"][route]["prompt_tokens_per_second"] = self.throughput.prompt_tokens_per_second(model)
+                    report["routes"][route]["generated_tokens_per_second"] = self.throughput.tokens_per_second(model)
+        return report
+
+
+def _load_rules() -> Optional[Dict]:
+    """Read MODEL_ROUTER_RULES (inline JSON) from settings."""
+    if not settings.MODEL_ROUTER_RULES:
+        return None
+    try:
+        return json.loads(settings.MODEL_ROUTER_RULES)
+    except json.JSONDecodeError as e:
+        logger.warning(f"⚠️ Ignoring invalid MODEL_ROUTER_RULES: {e}")
+        return None
+
+
+# Create a singleton instance
+model_router = ModelRouter(
+    fast_model=settings.FAST_MODEL,
+    large_model=settings.LARGE_MODEL,
+    enabled=settings.MODEL_ROUTER_ENABLED,
+    rules=_load_rules(),
+    throughput=generation_stats
+)
@@ -0,0 +1,216 @@
+"""
+ollama_options.py - Per-request Ollama options sized to the actual prompt
+Picks num_ctx and num_predict for each request instead of hard-coding them
+
+Why?
+- num_ctx too big: Ollama allocates KV-cache for the whole window and spends
+  longer on prompt evaluation - wasted RAM and time on short chats
+- num_ctx too small: Ollama silently drops the start of the prompt
+- A different num_ctx per request forces Ollama to reload the model runner,
+  so sizes are rounded up to a few fixed buckets (1024/2048/4096/8192)
+
+How:
+- Prompt tokens are estimated from characters, using a chars-per-token ratio
+  calibrated per model from Ollama's own prompt_eval_count
+- num_ctx = smallest bucket >= prompt tokens + response budget
+- num_predict shrinks when the backend pool is busy, so queued users
+  aren't stuck behind very long answers
+"""
+
+import threading
+from typing import Dict, List, Optional
+
+# Import with compatibility for both local and package mode
+try:
+    from .config import settings
+    from .logger import logger
+    from .ollama_pool import ollama_pool, normalize_model_name
+except ImportError:
+    from config import settings
+    from logger import logger
+    from ollama_pool import ollama_pool, normalize_model_name
+
+
+DEFAULT_CTX_BUCKETS = [1024, 2048, 4096, 8192]
+DEFAULT_CHARS_PER_TOKEN = 4.0
+MESSAGE_OVERHEAD_TOKENS = 4  # Chat template tokens around each message
+
+
+class OllamaOptionsPlanner:
+    """
+    Plans num_ctx / num_predict for each Ollama request.
+
+    Usage:
+        >>> options = options_planner.plan(messages, "llama3", max_tokens=800)
+        >>> options
+        {'num_ctx': 1024, 'num_predict': 800}
+    """
+
+    def __init__(
+        self,
+        pool=None,
+        ctx_buckets: Optional[List[int]] = None,
+        slots_per_backend: int = 4,
+        min_predict: int = 128,
+        load_shrink_start: float = 0.5,
+        load_shrink_min_fraction: float = 0.5
+    ):
+        """
+        Initialize the planner.
+
+        Args:
+            pool: OllamaPool used as the load signal (None = never shrink)
+            ctx_buckets: Allowed num_ctx values, smallest first
+            slots_per_backend: Parallel requests per Ollama (OLLAMA_NUM_PARALLEL)
+            min_predict: num_predict never shrinks below this
+            load_shrink_start: Pool load factor at which num_predict starts shrinking
+            load_shrink_min_fraction: Fraction of the budget left at full load
+        """
+        self.pool = pool
+        self.ctx_buckets = sorted(ctx_buckets or DEFAULT_CTX_BUCKETS)
+        self.slots_per_backend = slots_per_backend
+        self.min_predict = min_predict
+        self.load_shrink_start = load_shrink_start
+        self.load_shrink_min_fraction = load_shrink_min_fraction
+
+        self._lock = threading.Lock()
+        self._chars_per_token: Dict[str, float] = {}  # model -> calibrated ratio
+        self.stats = {"plans": 0, "shrunk": 0, "over_context": 0, "buckets": {b: 0 for b in self.ctx_buckets}}
+
+    # ------------------------------------------------------------------
+    # TOKEN ESTIMATION
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def prompt_chars(messages: List[Dict]) -> int:
+        """Total characters of all message contents."""
+        return sum(len(m.get("content") or "") for m in messages)
+
+    def estimate_tokens(self, messages: List[Dict], model: Optional[str] = None) -> int:
+        """
+        Estimate prompt tokens for a list of chat messages.
+
+        Args:
+            messages: Ollama chat messages
+            model: Model name (uses its calibrated ratio if we have one)
+
+        Returns:
+            Estimated token count
+        """
+        ratio = self._chars_per_token.get(normalize_model_name(model), DEFAULT_CHARS_PER_TOKEN)
+        return int(self.prompt_chars(messages) / ratio) + MESSAGE_OVERHEAD_TOKENS * len(messages)
+
+    def observe(self, model: str, prompt_chars: int, prompt_eval_count: Optional[int], messages_count: int = 1):
+        """
+        Calibrate the chars-per-token ratio from a real Ollama response.
+
+        Args:
+            model: Model that answered
+            prompt_chars: Characters we sent (see prompt_chars())
+            prompt_eval_count: Tokens Ollama says it evaluated
+            messages_count: Number of messages sent
+        """
+        if not prompt_eval_count or prompt_chars <= 0:
+            return
+        content_tokens = prompt_eval_count - MESSAGE_OVERHEAD_TOKENS * messages_count
+        if content_tokens <= 0:
+            return
+        ratio = prompt_chars / content_tokens
+        # With a cached prefix Ollama only reports the new tokens, which makes
+        # the ratio look huge - ignore anything outside a sane range
+        if not 1.5 <= ratio <= 8.0:
+            return
+        model = normalize_model_name(model)
+        with self._lock:
+            current = self._chars_per_token.get(model)
+            self._chars_per_token[model] = ratio if current is None else 0.9 * current + 0.1 * ratio
+
+    # ------------------------------------------------------------------
+    # PLANNING
+    # ------------------------------------------------------------------
+
+    def _load_factor(self) -> float:
+        """Current pool load (0 = idle, 1 = every slot busy)."""
+        if self.pool is None:
+            return 0.0
+        return self.pool.load_factor(self.slots_per_backend)
+
+    def plan_num_predict(self, max_tokens: int) -> int:
+        """
+        Shrink the response budget when the pool is busy.
+
+        Args:
+            max_tokens: Response budget when idle
+
+        Returns:
+            num_predict to use
+        """
+        load = self._load_factor()
+        if load <= self.load_shrink_start:
+            return max_tokens
+        # Linear from 100% at load_shrink_start to min_fraction at full load
+        progress = min(1.0, (load - self.load_shrink_start) / max(1e-6, 1.0 - self.load_shrink_start))
+        fraction = 1.0 - progress * (1.0 - self.load_shrink_min_fraction)
+        return max(min(self.min_predict, max_tokens), int(max_tokens * fraction))
+
+    def plan(self, messages: List[Dict], model: Optional[str] = None, max_tokens: int = 500) -> Dict:
+        """
+        Plan num_ctx and num_predict for one request.
+
+        Args:
+            messages: Ollama chat messages about to be sent
+            model: Model that will answer
+            max_tokens: Response budget when the pool is idle
+
+        Returns:
+            {"num_ctx": int, "num_predict": int}
+        """
+        prompt_tokens = self.estimate_tokens(messages, model)
+        num_predict = self.plan_num_predict(max_tokens)
+        shrunk = num_predict < max_tokens
+
+        needed = prompt_tokens + num_predict
+        num_ctx = next((b for b in self.ctx_buckets if b >= needed), self.ctx_buckets[-1])
+
+        over_context = False
+        if needed > num_ctx:
+            # Biggest bucket still too small: keep the prompt, trim the answer,
+            # and say so instead of letting Ollama truncate silently
+            num_predict = max(self.min_predict, num_ctx - prompt_tokens)
+            over_context = prompt_tokens + num_predict > num_ctx
+            if over_context:
+                logger.warning(
+                    f"⚠️ Prompt (~{prompt_tokens} tokens) exceeds num_ctx {num_ctx}; "
+                    f"Ollama will truncate the oldest context"
+                )
+
+        with self._lock:
+            self.stats["plans"] += 1
+            self.stats["buckets"][num_ctx] += 1
+            if shrunk:
+                self.stats["shrunk"] += 1
+            if over_context:
+                self.stats["over_context"] += 1
+
+        return {"num_ctx": num_ctx, "num_predict": num_predict}
+
+    def get_stats(self) -> Dict:
+        """Get bucket usage and calibration numbers."""
+        with self._lock:
+            return {
+                "plans": self.stats["plans"],
+                "shrunk_under_load": self.stats["shrunk"],
+                "over_context": self.stats["over_context"],
+                "num_ctx_buckets": {str(k): v for k, v in self.stats["buckets"].items()},
+                "chars_per_token": {m: round(r, 2) for m, r in self._chars_per_token.items()},
+                "load_factor": round(self._load_factor(), 3),
+            }
+
+
+# Create a singleton instance
+options_planner = OllamaOptionsPlanner(
+    pool=ollama_pool,
+    ctx_buckets=settings.OLLAMA_CTX_BUCKETS,
+    slots_per_backend=settings.OLLAMA_PARALLEL_PER_BACKEND,
+    min_predict=settings.OLLAMA_MIN_PREDICT
+)
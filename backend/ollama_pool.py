@@ -0,0 +1,556 @@
+"""
+ollama_pool.py - Load-balanced pool of Ollama backends
+Lets Nitro AI spread chat requests over several Ollama servers
+
+How backends are picked:
+- Least outstanding requests: the backend with the fewest in-flight calls wins
+- Model affinity: a backend that already has the model loaded gets a bonus,
+  so we don't force a cold model load on another box
+- Session stickiness: later turns of a conversation go back to the backend
+  that served the earlier ones (unless it is much busier), so Ollama can
+  reuse the already evaluated prompt prefix from its KV-cache
+- Health checking: a background task pings every backend (GET /api/ps);
+  backends that keep failing are ejected and later re-admitted slowly
+  (a few requests at a time) until they prove they are healthy again
+- Circuit breaking: every backend has its own circuit breaker fed by real
+  request outcomes, so a backend that starts failing is skipped right away
+  instead of waiting for the next health check
+
+Configure with OLLAMA_BASE_URLS (comma-separated) in .env.
+With a single URL the pool behaves exactly like the old single backend.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Set
+
+# Async HTTP client for background health checks
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+# Import with compatibility for both local and package mode
+try:
+    from .config import settings
+    from .logger import logger
+    from .circuit_breaker import CircuitBreaker
+except ImportError:
+    from config import settings
+    from logger import logger
+    from circuit_breaker import CircuitBreaker
+
+
+# Backend states
+HEALTHY = "healthy"
+EJECTED = "ejected"
+RECOVERING = "recovering"
+
+
+def normalize_model_name(model: Optional[str]) -> Optional[str]:
+    """
+    Normalize an Ollama model name so "llama3" and "llama3:latest" match.
+
+    Args:
+        model: Model name as configured or as reported by Ollama
+
+    Returns:
+        Model name with an explicit tag
+    """
+    if not model:
+        return model
+    return model if ":" in model else f"{model}:latest"
+
+
+class BackendNode:
+    """
+    One Ollama server in the pool, plus its live statistics.
+    """
+
+    def __init__(self, url: str, latency_window: int = 200, breaker: Optional[CircuitBreaker] = None):
+        """
+        Initialize a backend node.
+
+        Args:
+            url: Base URL of the Ollama server (e.g. http://localhost:11434)
+            latency_window: Number of recent latencies kept for percentiles
+            breaker: Circuit breaker guarding this backend
+        """
+        self.url = url.rstrip("/")
+        self.breaker = breaker or CircuitBreaker(name=self.url)
+        self.state = HEALTHY
+        self.in_flight = 0
+        self.loaded_models: Set[str] = set()
+        self.model_last_used: Dict[str, float] = {}  # model -> last request time (for LRU unloads)
+
+        # Counters
+        self.total_requests = 0
+        self.total_errors = 0
+        self.consecutive_failures = 0
+
+        # Latency tracking (seconds)
+        self.latencies = deque(maxlen=latency_window)
+        self.latency_ewma: Optional[float] = None
+
+        # Ejection / re-admission bookkeeping
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.recovery_successes = 0
+        self.last_health_check: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def record(self, latency: Optional[float], success: bool):
+        """Record the outcome of one request against this backend."""
+        self.total_requests += 1
+        if latency is not None:
+            self.latencies.append(latency)
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma = 0.8 * self.latency_ewma + 0.2 * latency
+        if not success:
+            self.total_errors += 1
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """
+        Get a latency percentile over the recent window.
+
+        Args:
+            percentile: 0-100 (e.g. 95 for p95)
+
+        Returns:
+            Latency in seconds, or None if no samples yet
+        """
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def get_stats(self) -> Dict:
+        """Get a JSON-friendly snapshot of this backend."""
+        p50 = self.latency_percentile(50)
+        p95 = self.latency_percentile(95)
+        return {
+            "url": self.url,
+            "state": self.state,
+            "in_flight": self.in_flight,
+            "loaded_models": sorted(self.loaded_models),
+            "total_requests": self.total_requests,
+            "total_errors": self.total_errors,
+            "error_rate": round(self.total_errors / self.total_requests, 4) if self.total_requests else 0.0,
+            "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+            "ejections": self.ejections,
+            "circuit": self.breaker.get_stats(),
+            "last_error": self.last_error,
+        }
+
+
+class OllamaPool:
+    """
+    Pool of Ollama backends with least-outstanding-requests routing.
+
+    Usage:
+        >>> node = ollama_pool.acquire("llama3")
+        >>> try:
+        ...     # call f"{node.url}/api/chat"
+        ...     ollama_pool.release(node, latency, success=True, model="llama3")
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        health_check_interval: int = 10,
+        eject_after_failures: int = 3,
+        readmit_after: int = 30,
+        readmit_successes: int = 5,
+        circuit_failure_threshold: int = 3,
+        circuit_recovery_timeout: float = 15.0,
+        hedge_min_delay: float = 0.5,
+        hedge_max_delay: float = 10.0,
+        sticky_slack: int = 2,
+        max_sticky_sessions: int = 10000
+    ):
+        """
+        Initialize the pool.
+
+        Args:
+            urls: Ollama base URLs
+            health_check_interval: Seconds between background health checks
+            eject_after_failures: Consecutive failed health checks before a backend is ejected
+            readmit_after: Seconds an ejected backend sits out before a retry
+            readmit_successes: Successful requests needed to leave recovery
+            circuit_failure_threshold: Consecutive request failures that open a backend's circuit
+            circuit_recovery_timeout: Seconds an open circuit waits before a trial request
+            hedge_min_delay: Lower bound for the hedging delay (seconds)
+            hedge_max_delay: Upper bound for the hedging delay (seconds)
+            sticky_slack: Extra in-flight requests a session's own backend may
+                          have over the least busy one before we move the session
+            max_sticky_sessions: Sessions remembered for stickiness (oldest dropped)
+        """
+        self.nodes: List[BackendNode] = [
+            BackendNode(url, breaker=CircuitBreaker(
+                name=url,
+                failure_threshold=circuit_failure_threshold,
+                recovery_timeout=circuit_recovery_timeout
+            ))
+            for url in urls
+        ]
+        self.health_check_interval = health_check_interval
+        self.eject_after_failures = eject_after_failures
+        self.readmit_after = readmit_after
+        self.readmit_successes = readmit_successes
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.sticky_slack = sticky_slack
+        self.max_sticky_sessions = max_sticky_sessions
+
+        # Hedged request stats
+        self.hedges_sent = 0
+        self.hedges_won = 0
+
+        # Session stickiness: session_id -> backend URL (LRU order)
+        self._session_nodes: "OrderedDict[str, str]" = OrderedDict()
+        self.sticky_hits = 0
+        self.sticky_moves = 0
+
+        self._lock = threading.Lock()
+        self._health_task: Optional[asyncio.Task] = None
+
+        # Optional hook called as on_cold_model(node, model) when a request is
+        # routed to a backend that doesn't have the model loaded (set by model_keeper)
+        self.on_cold_model = None
+
+        logger.info(f"Ollama pool initialized with {len(self.nodes)} backend(s): {', '.join(urls)}")
+
+    # ------------------------------------------------------------------
+    # ROUTING
+    # ------------------------------------------------------------------
+
+    def _is_available(self, node: BackendNode, now: float) -> bool:
+        """Check whether a node may take another request right now."""
+        if not node.breaker.is_available():
+            return False
+        if node.state == EJECTED:
+            if now < node.ejected_until:
+                return False
+            # Sit-out is over: let a trickle of traffic probe it
+            node.state = RECOVERING
+            node.recovery_successes = 0
+            logger.info("🩺 Ollama backend %s re-admitted for recovery", node.url)
+        if node.state == RECOVERING:
+            # Slow re-admission: one extra concurrent slot per success so far
+            return node.in_flight < 1 + node.recovery_successes
+        return True
+
+    def acquire(
+        self,
+        model: Optional[str] = None,
+        exclude: Optional[List[BackendNode]] = None,
+        session_id: Optional[str] = None
+    ) -> Optional[BackendNode]:
+        """
+        Pick a backend for a request and mark it busy.
+
+        Args:
+            model: Model the request will use (for affinity)
+            exclude: Backends to avoid (e.g. one that just failed)
+            session_id: Conversation the request belongs to (for stickiness)
+
+        Returns:
+            The chosen BackendNode, or None if no backend is available
+        """
+        model = normalize_model_name(model)
+        exclude = exclude or []
+
+        with self._lock:
+            now = time.time()
+            candidates = [n for n in self.nodes if n not in exclude and self._is_available(n, now)]
+            if not candidates:
+                return None
+
+            def score(node: BackendNode):
+                # A loaded model is worth one outstanding request
+                affinity = 1 if model and model in node.loaded_models else 0
+                latency = node.latency_ewma if node.latency_ewma is not None else 0.0
+                return (node.in_flight - affinity, latency)
+
+            ordered = sorted(candidates, key=score)
+
+            # Stay on the session's backend while it isn't much busier than
+            # the best one - its KV-cache already holds this conversation
+            sticky_url = self._session_nodes.get(session_id) if session_id else None
+            if sticky_url:
+                sticky = next((n for n in ordered if n.url == sticky_url), None)
+                if sticky is not None and score(sticky)[0] <= score(ordered[0])[0] + self.sticky_slack:
+                    ordered.remove(sticky)
+                    ordered.insert(0, sticky)
+
+            # Reserve the breaker slot (matters when the circuit is half-open)
+            chosen = None
+            for node in ordered:
+                if node.breaker.allow_request():
+                    node.in_flight += 1
+                    chosen = node
+                    break
+            if chosen is None:
+                return None
+            if session_id:
+                self._remember_session(session_id, chosen.url, sticky_url)
+            cold = bool(model) and model not in chosen.loaded_models
+            if model:
+                chosen.model_last_used[model] = now
+
+        if cold and self.on_cold_model is not None:
+            self.on_cold_model(chosen, model)
+        return chosen
+
+    def _remember_session(self, session_id: str, url: str, previous_url: Optional[str]):
+        """Record which backend serves a session (caller holds the lock)."""
+        if previous_url == url:
+            self.sticky_hits += 1
+        elif previous_url is not None:
+            self.sticky_moves += 1
+        self._session_nodes[session_id] = url
+        self._session_nodes.move_to_end(session_id)
+        while len(self._session_nodes) > self.max_sticky_sessions:
+            self._session_nodes.popitem(last=False)
+
+    def release(
+        self,
+        node: BackendNode,
+        latency: Optional[float] = None,
+        success: bool = True,
+        model: Optional[str] = None,
+        error: Optional[str] = None,
+        cancelled: bool = False,
+        client_error: bool = False
+    ):
+        """
+        Return a backend to the pool and record the request outcome.
+
+        Args:
+            node: Backend returned by acquire()
+            latency: Request duration in seconds
+            success: False if the backend failed (connection error, timeout, 5xx)
+            model: Model the request used
+            error: Short error description for stats
+            cancelled: True if we abandoned the request (e.g. a losing hedge);
+                       frees the slot without counting success or failure
+            client_error: True for a 4xx answer (e.g. model not pulled): counted
+                          as an error, but no latency sample and no verdict on
+                          the backend's health
+        """
+        with self._lock:
+            node.in_flight = max(0, node.in_flight - 1)
+            if cancelled or client_error:
+                node.breaker.release_trial()
+                if client_error:
+                    node.record(None, success=False)
+                    node.last_error = error
+                return
+            node.record(latency, success)
+            if success:
+                node.breaker.record_success()
+                self._mark_success(node)
+                if model:
+                    node.loaded_models.add(normalize_model_name(model))
+            else:
+                node.breaker.record_failure()
+                node.last_error = error
+                if node.state == RECOVERING:
+                    self._eject(node)
+
+    def _mark_success(self, node: BackendNode):
+        """Reset failure counters; promote recovering nodes when ready."""
+        node.consecutive_failures = 0
+        if node.state == RECOVERING:
+            node.recovery_successes += 1
+            if node.recovery_successes >= self.readmit_successes:
+                node.state = HEALTHY
+                logger.info("✅ Ollama backend %s is healthy again", node.url)
+
+    def _mark_failure(self, node: BackendNode, error: Optional[str] = None):
+        """Count a failure and eject the node if it keeps failing."""
+        node.consecutive_failures += 1
+        node.last_error = error
+        if node.state == RECOVERING or node.consecutive_failures >= self.eject_after_failures:
+            self._eject(node)
+
+    def _eject(self, node: BackendNode):
+        """Take a node out of rotation for a while."""
+        if node.state != EJECTED:
+            node.ejections += 1
+            logger.warning("⛔ Ollama backend %s ejected after %s failure(s)", node.url, node.consecutive_failures)
+        node.state = EJECTED
+        node.ejected_until = time.time() + self.readmit_after
+        node.recovery_successes = 0
+        node.loaded_models.clear()
+
+    def usage(self, slots_per_backend: int = 4):
+        """
+        In-flight requests and total parallel slots of usable backends.
+
+        Args:
+            slots_per_backend: Requests each Ollama runs in parallel (OLLAMA_NUM_PARALLEL)
+
+        Returns:
+            (in_flight, capacity)
+        """
+        with self._lock:
+            now = time.time()
+            usable = [n for n in self.nodes if n.state != EJECTED or now >= n.ejected_until]
+            in_flight = sum(n.in_flight for n in self.nodes)
+        return in_flight, max(1, len(usable)) * max(1, slots_per_backend)
+
+    def load_factor(self, slots_per_backend: int = 4) -> float:
+        """
+        How busy the pool is: in-flight requests / total parallel slots.
+
+        Args:
+            slots_per_backend: Requests each Ollama runs in parallel (OLLAMA_NUM_PARALLEL)
+
+        Returns:
+            0.0 when idle, 1.0 when every slot is busy (can exceed 1.0 when queueing)
+        """
+        in_flight, capacity = self.usage(slots_per_backend)
+        return in_flight / capacity
+
+    def hedge_delay(self, node: BackendNode) -> float:
+        """
+        How long to wait on a backend before sending a hedged duplicate.
+
+        Uses the backend's p95 latency, so only the slowest ~5% of
+        requests get hedged.
+
+        Args:
+            node: Backend handling the primary request
+
+        Returns:
+            Delay in seconds
+        """
+        with self._lock:
+            p95 = node.latency_percentile(95)
+        if p95 is None:
+            return self.hedge_max_delay
+        return min(self.hedge_max_delay, max(self.hedge_min_delay, p95))
+
+    def record_hedge(self, won: bool):
+        """Count a hedged request and whether the hedge beat the primary."""
+        with self._lock:
+            self.hedges_sent += 1
+            if won:
+                self.hedges_won += 1
+
+    # ------------------------------------------------------------------
+    # HEALTH CHECKING
+    # ------------------------------------------------------------------
+
+    async def check_backend(self, node: BackendNode, session) -> bool:
+        """
+        Ping one backend and refresh its list of loaded models.
+
+        Args:
+            node: Backend to check
+            session: aiohttp ClientSession
+
+        Returns:
+            True if the backend answered
+        """
+        try:
+            async with session.get(f"{node.url}/api/ps", timeout=aiohttp.ClientTimeout(total=5)) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"HTTP {response.status}")
+                data = await response.json()
+            loaded = {
+                normalize_model_name(m.get("name") or m.get("model"))
+                for m in data.get("models", [])
+                if m.get("name") or m.get("model")
+            }
+            with self._lock:
+                node.last_health_check = time.time()
+                node.loaded_models = loaded
+                node.consecutive_failures = 0
+                # Answering at all frees a trial slot a cancelled call may still hold
+                node.breaker.rearm()
+                if node.state == EJECTED and time.time() >= node.ejected_until:
+                    node.state = RECOVERING
+                    node.recovery_successes = 0
+                    logger.info("🩺 Ollama backend %s passed health check, re-admitting slowly", node.url)
+            return True
+        except Exception as e:
+            with self._lock:
+                node.last_health_check = time.time()
+                if node.state == EJECTED:
+                    # Still down: extend the sit-out
+                    node.ejected_until = time.time() + self.readmit_after
+                else:
+                    self._mark_failure(node, f"health check: {type(e).__name__}")
+            logger.debug("Health check failed for %s: %s", node.url, e)
+            return False
+
+    async def health_check_loop(self):
+        """Background task: check every backend on an interval."""
+        async with aiohttp.ClientSession() as session:
+            while True:
+                await asyncio.gather(*(self.check_backend(n, session) for n in self.nodes))
+                await asyncio.sleep(self.health_check_interval)
+
+    def start(self):
+        """Start background health checks (call from the app startup event)."""
+        if not AIOHTTP_AVAILABLE:
+            logger.warning("⚠️ aiohttp not installed - Ollama health checks disabled")
+            return
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.get_running_loop().create_task(self.health_check_loop())
+
+    async def stop(self):
+        """Stop background health checks."""
+        if self._health_task:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+    # ------------------------------------------------------------------
+    # STATS
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict:
+        """Get per-backend latency, error and state metrics."""
+        with self._lock:
+            backends = [n.get_stats() for n in self.nodes]
+            hedging = {"sent": self.hedges_sent, "won": self.hedges_won}
+            stickiness = {
+                "sessions": len(self._session_nodes),
+                "hits": self.sticky_hits,
+                "moves": self.sticky_moves,
+            }
+        return {
+            "backends": backends,
+            "total": len(backends),
+            "healthy": sum(1 for b in backends if b["state"] == HEALTHY and b["circuit"]["state"] == "closed"),
+            "hedging": hedging,
+            "session_stickiness": stickiness,
+        }
+
+
+# Create a singleton instance
+ollama_pool = OllamaPool(
+    urls=settings.OLLAMA_BASE_URLS,
+    health_check_interval=settings.OLLAMA_HEALTH_CHECK_INTERVAL,
+    eject_after_failures=settings.OLLAMA_EJECT_AFTER_FAILURES,
+    readmit_after=settings.OLLAMA_READMIT_AFTER,
+    readmit_successes=settings.OLLAMA_READMIT_SUCCESSES,
+    circuit_failure_threshold=settings.OLLAMA_CIRCUIT_FAILURE_THRESHOLD,
+    circuit_recovery_timeout=settings.OLLAMA_CIRCUIT_RECOVERY_TIMEOUT,
+    hedge_min_delay=settings.OLLAMA_HEDGE_MIN_DELAY,
+    hedge_max_delay=settings.OLLAMA_HEDGE_MAX_DELAY
+)
@@ -0,0 +1,183 @@
+"""
+profiler.py - On-demand sampling profiler for the running server
+See where time (and memory) goes in production, without restarting
+
+How it works:
+- A background thread looks at every thread's current stack
+  (sys._current_frames) every few milliseconds for N seconds
+- Identical stacks are counted; the result is a "collapsed stack" profile,
+  one line per stack, root first:
+      MainThread;main.py:chat;ai_router.py:get_ai_response;... 42
+- Overhead is one stack walk per sample (~0.1ms at the default 10ms
+  interval); nothing runs while no profile is being taken
+
+Turn the output into a flame graph with any collapsed-stack tool:
+    curl -H "X-API-Key: $API_KEY" "localhost:8000/debug/profile?seconds=30" > cpu.folded
+    flamegraph.pl cpu.folded > cpu.svg        # or open it in speedscope.app
+
+Memory growth: with memory=True, tracemalloc snapshots are taken at the
+start and the end, and the lines whose allocations grew most are returned.
+tracemalloc slows Python down noticeably while it runs, so it is only on
+during such a profile (unless it was already on).
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List
+
+# Import with compatibility for both local and package mode
+try:
+    from .config import settings
+    from .logger import logger
+except ImportError:
+    from config import settings
+    from logger import logger
+
+# Frames from files under this folder are shown relative to it (backend/..., models/...)
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a profile is requested while another one is running."""
+
+
+def _short_path(filename: str) -> str:
+    """Path relative to the app folder, or from site-packages on for libraries."""
+    if filename.startswith(APP_ROOT + os.sep):
+        return os.path.relpath(filename, APP_ROOT)
+    if "site-packages" + os.sep in filename:
+        return filename.split("site-packages" + os.sep, 1)[1]
+    return os.path.basename(filename)
+
+
+def _frame_name(code) -> str:
+    return f"{_short_path(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler over all threads of the process.
+
+    Usage:
+        >>> result = sampling_profiler.profile(seconds=10)   # blocks - run in a thread
+        >>> print(result["collapsed"])
+    """
+
+    def __init__(self, max_seconds: float = 60, memory_top: int = 30, memory_frames: int = 10):
+        """
+        Initialize the profiler.
+
+        Args:
+            max_seconds: Longest profile allowed
+            memory_top: Lines returned in a tracemalloc diff
+            memory_frames: Frames tracemalloc keeps per allocation
+        """
+        self.max_seconds = max_seconds
+        self.memory_top = memory_top
+        self.memory_frames = memory_frames
+        self._running = threading.Lock()
+
+    def _sample(self, counts: Counter, skip_thread: int, names: Dict[int, str]):
+        """Add the current stack of every thread (except the profiler's own) to counts."""
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == skip_thread:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, f"thread-{thread_id}"))
+            stack.reverse()
+            counts[";".join(stack)] += 1
+
+    def profile(self, seconds: float, interval: float = 0.01, memory: bool = False) -> Dict:
+        """
+        Sample all threads for `seconds` (blocking - call from a worker thread).
+
+        Args:
+            seconds: How long to sample (capped at max_seconds)
+            interval: Seconds between samples
+            memory: Also diff tracemalloc snapshots from start to end
+
+        Returns:
+            {"seconds", "samples", "interval_ms", "collapsed": str,
+             "memory": [...] (only with memory=True)}
+
+        Raises:
+            ProfilerBusyError: If another profile is running
+        """
+        if not self._running.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running")
+        started_tracing = False
+        try:
+            seconds = max(0.1, min(seconds, self.max_seconds))
+            interval = max(0.001, interval)
+            before = None
+            if memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(self.memory_frames)
+                    started_tracing = True
+                before = tracemalloc.take_snapshot()
+
+            logger.warning(f"🔬 Profiling for {seconds:g}s (every {interval * 1000:g}ms{', with tracemalloc' if memory else ''})")
+            counts: Counter = Counter()
+            own_thread = threading.get_ident()
+            samples = 0
+            start = time.perf_counter()
+            deadline = start + seconds
+            next_sample = start
+            while True:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                self._sample(counts, own_thread, names)
+                samples += 1
+                next_sample += interval
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                if next_sample > now:
+                    time.sleep(next_sample - now)
+                else:
+                    next_sample = now  # Fell behind - don't burst to catch up
+
+            result = {
+                "seconds": round(time.perf_counter() - start, 3),
+                "samples": samples,
+                "interval_ms": interval * 1000,
+                "collapsed": "\n".join(f"{stack} {count}" for stack, count in counts.most_common()) + "\n",
+            }
+            if memory:
+                result["memory"] = self._memory_diff(before, tracemalloc.take_snapshot())
+            return result
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+            self._running.release()
+
+    def _memory_diff(self, before, after) -> List[Dict]:
+        """Lines whose allocated memory grew the most between two snapshots."""
+        # Our own snapshot bookkeeping is not what anybody is looking for
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "traceback")
+        report = []
+        for stat in stats[:self.memory_top]:
+            # Most recent frame first: where the memory was allocated, then its callers
+            frames = [f"{_short_path(frame.filename)}:{frame.lineno}" for frame in reversed(stat.traceback)]
+            report.append({
+                "size_diff_kb": round(stat.size_diff / 1024, 1),
+                "size_kb": round(stat.size / 1024, 1),
+                "count_diff": stat.count_diff,
+                "location": frames[0] if frames else None,
+                "traceback": frames,
+            })
+        return report
+
+    def is_running(self) -> bool:
+        return self._running.locked()
+
+
+# Create a singleton instance
+sampling_profiler = SamplingProfiler(max_seconds=settings.PROFILER_MAX_SECONDS)
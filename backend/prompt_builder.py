@@ -0,0 +1,205 @@
+"""
+prompt_builder.py - One place that assembles chat prompts for Ollama
+Keeps the start of every prompt identical between turns of a conversation
+
+Why?
+- Ollama keeps the last evaluated prompt in its KV-cache. If the next
+  request starts with exactly the same tokens, only the new part is
+  evaluated - turn N+1 costs roughly the new message, not the whole chat
+- That only works when the prefix is byte-for-byte the same:
+  same system prompt, same history order, same message contents
+
+How:
+- System prompt registry: every endpoint uses the same canonical prompt
+  (no timestamps or per-request text in it)
+- Stable history: built from stored session messages in order, and trimmed
+  in blocks of turns instead of a sliding window (a sliding window changes
+  the first message - and so the whole prefix - on every turn)
+- Session stickiness: requests carry the session_id so the Ollama pool
+  sends them back to the backend that already has the conversation cached
+- Prefix-reuse report: Ollama's prompt_eval_count says how many prompt
+  tokens it actually evaluated; compared with the prompt size this gives
+  the share of the prompt served from the cache
+"""
+
+import threading
+from typing import Dict, List, Optional
+
+# Import with compatibility for both local and package mode
+try:
+    from .config import settings
+    from .ollama_options import options_planner
+except ImportError:
+    from config import settings
+    from ollama_options import options_planner
+
+
+# Canonical system prompts - change wording here, never inline in endpoints
+SYSTEM_PROMPTS = {
+    "default": (
+        "You are Nitro AI, a personal AI assistant created by Mohamed Akheel. "
+        "You run locally using Ollama. "
+        "You help with coding, AI, productivity and general questions. "
+        "Never invent company information about Nitro AI."
+    ),
+}
+
+
+class PromptBuilder:
+    """
+    Builds byte-stable chat prompts and reports KV-cache prefix reuse.
+
+    Usage:
+        >>> history = prompt_builder.history_from_session(session)
+        >>> messages = prompt_builder.build("What about Python?", history)
+        >>> messages[0]["content"] == prompt_builder.system_prompt()
+        True
+    """
+
+    def __init__(self, history_turns: int = 8, trim_step: int = 4, planner=None):
+        """
+        Initialize the prompt builder.
+
+        Args:
+            history_turns: Max previous turns (user + assistant pairs) sent along
+            trim_step: Turns dropped at once when the history is too long
+            planner: OllamaOptionsPlanner used for token estimates
+        """
+        self.history_turns = history_turns
+        self.trim_step = max(1, trim_step)
+        self.planner = planner
+
+        self._lock = threading.Lock()
+        self.stats = {
+            "first_turns": {"requests": 0, "prompt_tokens": 0, "evaluated_tokens": 0, "eval_ms": 0.0},
+            "follow_up_turns": {"requests": 0, "prompt_tokens": 0, "evaluated_tokens": 0, "eval_ms": 0.0},
+        }
+
+    # ------------------------------------------------------------------
+    # ASSEMBLY
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def system_prompt(name: str = "default") -> str:
+        """
+        Get a canonical system prompt.
+
+        Args:
+            name: Registry key
+
+        Returns:
+            System prompt text
+        """
+        return SYSTEM_PROMPTS.get(name, SYSTEM_PROMPTS["default"])
+
+    def history_from_session(self, session: Optional[Dict]) -> List[Dict]:
+        """
+        Turn a stored session (memory_manager) into chat history messages.
+
+        Args:
+            session: Session dict from memory_manager.get_session_history()
+
+        Returns:
+            List of {"role", "content"} messages, oldest first
+        """
+        if not session:
+            return []
+
+        turns = [
+            (entry["message"], entry["response"])
+            for entry in session.get("messages", [])
+            if entry.get("sender") == "user" and entry.get("response")
+        ]
+
+        # Trim in blocks: the first kept turn only changes every trim_step
+        # turns, so most turns still share the previous prompt's prefix
+        overflow = len(turns) - self.history_turns
+        if overflow > 0:
+            drop = -(-overflow // self.trim_step) * self.trim_step
+            turns = turns[drop:]
+
+        history = []
+        for user_text, ai_text in turns:
+            history.append({"role": "user", "content": user_text})
+            history.append({"role": "assistant", "content": ai_text})
+        return history
+
+    def build(
+        self,
+        user_text: str,
+        history: Optional[List[Dict]] = None,
+        system_prompt: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Build the messages for one chat request.
+
+        Order is always: system prompt, history (oldest first), new message.
+
+        Args:
+            user_text: New user message
+            history: Previous messages (see history_from_session)
+            system_prompt: Override text (default: the canonical prompt)
+
+        Returns:
+            Ollama chat messages
+        """
+        messages = [{"role": "system", "content": system_prompt or self.system_prompt()}]
+        # Copy only role/content so extra keys never change the serialized bytes
+        messages.extend({"role": m["role"], "content": m["content"]} for m in history or [])
+        messages.append({"role": "user", "content": user_text})
+        return messages
+
+    # ------------------------------------------------------------------
+    # PREFIX-REUSE REPORT
+    # ------------------------------------------------------------------
+
+    def record_prompt_eval(self, model: str, messages: List[Dict], data: Dict):
+        """
+        Record how much of a prompt Ollama actually had to evaluate.
+
+        Args:
+            model: Model that answered
+            messages: Messages that were sent
+            data: Final Ollama response (with prompt_eval_count/_duration)
+        """
+        evaluated = data.get("prompt_eval_count")
+        if not evaluated or self.planner is None:
+            return
+
+        follow_up = len(messages) > 2
+        if not follow_up:
+            # Without history there is (almost) nothing cached, so the
+            # count is a fair sample for the chars-per-token estimate
+            self.planner.observe(model, self.planner.prompt_chars(messages), evaluated, len(messages))
+
+        prompt_tokens = self.planner.estimate_tokens(messages, model)
+        with self._lock:
+            stats = self.stats["follow_up_turns" if follow_up else "first_turns"]
+            stats["requests"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            stats["evaluated_tokens"] += min(evaluated, prompt_tokens)
+            stats["eval_ms"] += (data.get("prompt_eval_duration") or 0) / 1e6
+
+    def get_stats(self) -> Dict:
+        """Get prefix-reuse rates for first and follow-up turns."""
+        report = {"history_turns": self.history_turns, "trim_step": self.trim_step}
+        with self._lock:
+            for kind, stats in self.stats.items():
+                requests = stats["requests"]
+                reuse = None
+                if stats["prompt_tokens"]:
+                    reuse = round(1 - stats["evaluated_tokens"] / stats["prompt_tokens"], 3)
+                report[kind] = {
+                    "requests": requests,
+                    "prefix_reuse_rate": reuse,
+                    "avg_prompt_eval_ms": round(stats["eval_ms"] / requests, 1) if requests else None,
+                }
+        return report
+
+
+# Create a singleton instance
+prompt_builder = PromptBuilder(
+    history_turns=settings.PROMPT_HISTORY_TURNS,
+    trim_step=settings.PROMPT_HISTORY_TRIM_STEP,
+    planner=options_planner
+)
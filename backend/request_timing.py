@@ -0,0 +1,244 @@
+"""
+request_timing.py - Where did the time of one request go?
+Per-request timing spans, sent back as a Server-Timing header
+
+Components record spans into the timing of the request they run in
+(found through a context variable, so nothing has to be passed around):
+    validation    body parsing + checks, until the handler starts its work
+    queue         waiting for llm_dispatcher admission
+    llm_ttft      time to first token (streaming), or Ollama's load +
+                  prompt evaluation time (non-streaming)
+    llm           whole LLM call
+    llm_tokens    tokens generated (a count, not a duration)
+    memory_read   conversation store reads
+    memory_write  conversation store writes
+    search_fetch  web search requests (results page + pages)
+    search_parse  HTML parsing of search results
+
+Each finished request also goes into per-span histograms (metrics.py:
+nitro_request_phase_seconds, nitro_llm_tokens_per_second, ...).
+
+Usage:
+    >>> with span("memory_read"):
+    ...     data = load()
+    >>> record("llm_ttft", 0.42)
+    >>> record_value("llm_tokens", 128)
+
+Response header (in the browser dev tools "Timing" tab):
+    Server-Timing: memory_read;dur=3.1, llm_ttft;dur=410.2, llm;dur=1520.7, llm_tokens;desc="128", total;dur=1531.0
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, Optional
+
+# Import with compatibility for both local and package mode
+try:
+    from .metrics import registry
+except ImportError:
+    from metrics import registry
+
+# Histogram bucket upper bounds (durations use metrics.LATENCY_BUCKETS)
+VALUE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2000, 4000, 8000)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200, 500)
+
+_current: ContextVar[Optional["RequestTiming"]] = ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    """Spans (durations) and values (counts) recorded during one request."""
+
+    def __init__(self, kind: str = "http"):
+        """
+        Args:
+            kind: What is being timed ("http", "ws") - a label for the histograms
+        """
+        self.kind = kind
+        self.started = time.perf_counter()
+        self.spans: Dict[str, float] = {}  # name -> seconds (repeated spans add up)
+        self.values: Dict[str, float] = {}  # name -> count
+        self.generation: Optional[Dict] = None  # Last LLM generation's stats (generation_stats.py)
+        self.deferred = False  # Work continues after the response headers (streams)
+        self.finished = False
+
+    def add(self, name: str, seconds: float):
+        """Add time to a span."""
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def add_value(self, name: str, value: float):
+        """Add to a counted value (e.g. tokens)."""
+        self.values[name] = self.values.get(name, 0) + value
+
+    def elapsed(self) -> float:
+        """Seconds since the request started."""
+        return time.perf_counter() - self.started
+
+    def to_dict(self) -> Dict:
+        """Spans in milliseconds plus values, for JSON (SSE done event)."""
+        report = {name: round(seconds * 1000, 1) for name, seconds in self.spans.items()}
+        report.update(self.values)
+        report["total"] = round(self.elapsed() * 1000, 1)
+        return report
+
+    def header(self) -> str:
+        """Format as a Server-Timing header value."""
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.spans.items()]
+        parts += [f'{name};desc="{value:g}"' for name, value in self.values.items()]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+    def finish(self):
+        """Feed this request into the histograms (once)."""
+        if self.finished:
+            return
+        self.finished = True
+        timing_stats.observe(self)
+
+
+def begin(kind: str = "http") -> RequestTiming:
+    """Start timing a request in the current context."""
+    timing = RequestTiming(kind)
+    _current.set(timing)
+    return timing
+
+
+def current() -> Optional[RequestTiming]:
+    """Timing of the request being handled (None outside a request)."""
+    return _current.get()
+
+
+def record(name: str, seconds: float):
+    """Add time to a span of the current request (no-op outside a request)."""
+    timing = _current.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+
+def record_value(name: str, value: float):
+    """Add to a value of the current request (no-op outside a request)."""
+    timing = _current.get()
+    if timing is not None:
+        timing.add_value(name, value)
+
+
+def record_generation(stats: Dict):
+    """Attach an LLM generation's stats to the current request (no-op outside a request)."""
+    timing = _current.get()
+    if timing is not None:
+        timing.generation = stats
+
+
+def record_elapsed(name: str):
+    """Record the time since the request started as a span (e.g. validation)."""
+    timing = _current.get()
+    if timing is not None:
+        timing.add(name, timing.elapsed())
+
+
+@contextmanager
+def span(name: str, histogram=None):
+    """
+    Time a block of code as a span of the current request.
+
+    Args:
+        name: Span name
+        histogram: Metrics histogram that also gets the duration (optional,
+                   recorded even outside a request)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        record(name, seconds)
+        if histogram is not None:
+            histogram.observe(seconds)
+
+
+async def timed_stream(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Pass a stream of LLM text chunks through, recording llm_ttft, llm and llm_tokens.
+
+    Each streamed chunk counts as one token (Ollama and OpenAI-compatible
+    servers send one token per chunk).
+    """
+    start = time.perf_counter()
+    first = True
+    tokens = 0
+    try:
+        async for chunk in chunks:
+            if chunk:
+                if first:
+                    first = False
+                    record("llm_ttft", time.perf_counter() - start)
+                tokens += 1
+            yield chunk
+    finally:
+        record("llm", time.perf_counter() - start)
+        record_value("llm_tokens", tokens)
+        # Closing us must close the upstream request too (stops generation)
+        if hasattr(chunks, "aclose"):
+            await chunks.aclose()
+
+
+class TimingStats:
+    """Every finished request's spans and values, as metrics histograms."""
+
+    def __init__(self, registry):
+        """
+        Args:
+            registry: MetricsRegistry (metrics.py) the histograms live in
+        """
+        self.phases = registry.histogram(
+            "nitro_request_phase_seconds", "Time per request phase (Server-Timing spans, phase=total for all)",
+            ["kind", "phase"]
+        )
+        self.values = registry.histogram(
+            "nitro_request_values", "Counted values per request (llm_tokens)", ["kind", "name"], buckets=VALUE_BUCKETS
+        )
+        self.tokens = registry.counter("nitro_llm_tokens_total", "Tokens generated", ["kind"])
+        self.tokens_per_second = registry.histogram(
+            "nitro_llm_tokens_per_second", "Generation speed after the first token", ["kind"],
+            buckets=TOKENS_PER_SECOND_BUCKETS
+        )
+
+    def observe(self, timing: RequestTiming):
+        """Add one finished request."""
+        kind = timing.kind
+        for name, seconds in timing.spans.items():
+            self.phases.labels(kind, name).observe(seconds)
+        self.phases.labels(kind, "total").observe(timing.elapsed())
+        for name, value in timing.values.items():
+            self.values.labels(kind, name).observe(value)
+
+        tokens = timing.values.get("llm_tokens")
+        if tokens:
+            self.tokens.labels(kind).inc(tokens)
+            generating = timing.spans.get("llm", 0.0) - timing.spans.get("llm_ttft", 0.0)
+            if tokens > 1 and generating > 0:
+                self.tokens_per_second.labels(kind).observe(tokens / generating)
+
+    def get_stats(self) -> Dict:
+        """Summary by "<kind>.<span>" for the JSON /metrics (durations in ms, bucket-based percentiles)."""
+        def summary(child, scale):
+            p50, p95 = child.quantile(0.5), child.quantile(0.95)
+            return {
+                "count": child.count,
+                "mean": round(child.sum / child.count * scale, 1) if child.count else None,
+                "p50_le": p50 * scale if p50 is not None else None,
+                "p95_le": p95 * scale if p95 is not None else None,
+            }
+
+        return {
+            "durations_ms": {
+                ".".join(labels): summary(child, 1000) for labels, child in sorted(self.phases.children())
+            },
+            "values": {
+                ".".join(labels): summary(child, 1) for labels, child in sorted(self.values.children())
+            },
+        }
+
+
+# Create a singleton instance
+timing_stats = TimingStats(registry)
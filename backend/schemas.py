@@ -61,6 +61,10 @@ class ChatResponse(BaseModel):
     user_id: Optional[str] = Field(None, description="The user who sent the message")
     ai_model: Optional[str] = Field("unknown", description="AI model used (phi3, llama3.2:1b, mistral, etc.)")
     ai_source: Optional[str] = Field("unknown", description="AI source (ollama_local, error)")
+    generation: Optional[Dict[str, Any]] = Field(
+        None,
+        description="Ollama generation stats: tokens, tokens/second, load time (None for other backends)"
+    )
     
     class Config:
         # Example data shown in API documentation
@@ -71,7 +75,52 @@ class ChatResponse(BaseModel):
                 "status": "success",
                 "user_id": "user_123",
                 "ai_model": "phi3",
-                "ai_source": "ollama_local"
+                "ai_source": "ollama_local",
+                "generation": {
+                    "model": "phi3:latest",
+                    "prompt_tokens": 42,
+                    "prompt_tokens_per_second": 180.5,
+                    "generated_tokens": 18,
+                    "tokens_per_second": 21.3,
+                    "load_ms": 4.2,
+                    "cold_load": False
+                }
+            }
+        }
+
+
+class BatchChatItem(BaseModel):
+    """
+    One prompt in a /chat/batch request.
+    
+    Options are optional - anything left out uses the normal /chat defaults.
+    """
+    id: Optional[str] = Field(None, description="Your ID for this item (echoed back; defaults to its index)")
+    message: str = Field(..., min_length=1, max_length=1000, description="Prompt text")
+    model: Optional[str] = Field(None, description="Ollama model (default: routed like /chat)")
+    temperature: Optional[float] = Field(None, ge=0.0, le=2.0, description="Creativity (default 0.7)")
+    top_p: Optional[float] = Field(None, ge=0.0, le=1.0, description="Nucleus sampling (default 0.9)")
+    max_tokens: Optional[int] = Field(None, ge=1, le=4096, description="Max response length (default 800)")
+
+
+class BatchChatRequest(BaseModel):
+    """
+    Schema for POST /chat/batch - many prompts in one request.
+    
+    Results stream back as NDJSON (one JSON object per line) in the order
+    they finish, not the order they were sent.
+    """
+    items: List[BatchChatItem] = Field(..., min_items=1, description="Prompts to answer")
+    parallelism: Optional[int] = Field(None, ge=1, description="Items running at once (capped by BATCH_MAX_PARALLEL)")
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "items": [
+                    {"id": "q1", "message": "Classify the sentiment: 'I love it'"},
+                    {"id": "q2", "message": "Translate to French: good morning", "temperature": 0.2}
+                ],
+                "parallelism": 2
             }
         }
 
@@ -105,6 +154,7 @@ class HealthCheckResponse(BaseModel):
     status: str = Field(..., description="Health status (healthy/unhealthy)")
     timestamp: str = Field(..., description="Current server time")
     memory_stats: Optional[Dict[str, Any]] = Field(None, description="Memory system statistics")
+    llm_backend: Optional[Dict[str, Any]] = Field(None, description="LLM backend status (ollama, openai, dummy)")
     
     class Config:
         schema_extra = {
@@ -115,7 +165,8 @@ class HealthCheckResponse(BaseModel):
                 "memory_stats": {
                     "total_sessions": 5,
                     "total_messages": 50
-                }
+                },
+                "llm_backend": {"backend": "ollama", "healthy": True, "servers": 1, "healthy_servers": 1}
             }
         }
 
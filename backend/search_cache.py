@@ -0,0 +1,410 @@
+"""
+search_cache.py - Persistent cache for web search
+A repeated or overlapping search shouldn't download and parse everything again
+
+Two kinds of entries in one SQLite file (SEARCH_CACHE_PATH):
+- "search": normalized query -> result list (title, url, snippet)
+  "What is  Python?" and "what is python?" share an entry
+- "page":   URL -> extracted page text, with the page's ETag/Last-Modified
+
+Every entry has its own expiry time:
+- search results live SEARCH_CACHE_RESULTS_TTL seconds
+- pages live as long as their Cache-Control max-age says, at most
+  SEARCH_CACHE_PAGE_TTL seconds (no-store/private pages are not stored,
+  no-cache and max-age=0 pages are revalidated every time)
+
+An expired page isn't thrown away: if it had an ETag or Last-Modified, the
+next fetch asks the site "changed since?" (If-None-Match/If-Modified-Since).
+A 304 answer costs a few hundred bytes and no parsing, and the entry is
+fresh again.
+
+The file is kept under SEARCH_CACHE_MAX_MB: when it grows past that, the
+least recently used entries are removed first.
+
+SQLite calls are quick but do disk I/O, so the async methods run them in a
+thread (one connection, guarded by a lock). Any SQLite error is logged and
+treated as a miss - the cache can never break a search.
+
+Reported in /metrics as "search_cache" (hit rate per kind) and in
+Prometheus as nitro_search_cache_*.
+
+Usage:
+    >>> results = await search_cache.get_results("What is Python?")
+    >>> await search_cache.put_results("What is Python?", results)
+    >>> page = await search_cache.get_page(url)   # {"text", "fresh", "etag", "last_modified"}
+"""
+
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Import with compatibility for both local and package mode
+try:
+    from .config import settings
+    from .logger import logger
+    from .metrics import registry
+except ImportError:
+    from config import settings
+    from logger import logger
+    from metrics import registry
+
+KINDS = ("search", "page")
+EVICT_TO = 0.9  # After eviction the cache is at most this share of max_bytes
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+"""
+
+_MAX_AGE = re.compile(r"(?:^|,)\s*(?:max-age|s-maxage)\s*=\s*\"?(\d+)", re.IGNORECASE)
+
+
+def normalize_query(query: str) -> str:
+    """Cache key of a search: case, spacing and Unicode variants don't matter."""
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+def normalize_url(url: str) -> str:
+    """Cache key of a page: the #fragment is not part of it."""
+    return url.split("#", 1)[0]
+
+
+class SearchCache:
+    """
+    SQLite-backed cache of search results and page texts.
+
+    Nothing is opened until the first use, so a server that never
+    searches never creates the file.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        results_ttl: float = 3600,
+        page_ttl: float = 86400,
+        max_bytes: int = 64 * 1024 * 1024,
+        enabled: bool = True
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            path: SQLite file (its folder is created if needed)
+            results_ttl: Seconds a result list stays fresh (0 = don't cache results)
+            page_ttl: Longest time a page text stays fresh (0 = don't cache pages)
+            max_bytes: Size the cached values may take up in total
+            enabled: False = every lookup is a miss and nothing is stored
+        """
+        self.path = Path(path)
+        self.results_ttl = results_ttl
+        self.page_ttl = page_ttl
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._bytes = 0  # Sum of the size column, kept in memory
+        self._entries = 0
+        self._failed = False
+
+        self.lookups = registry.counter(
+            "nitro_search_cache_lookups_total",
+            "Search cache lookups by kind and result (hit, stale, miss)", ["kind", "result"]
+        )
+        self.revalidations = registry.counter(
+            "nitro_search_cache_revalidations_total",
+            "Expired pages confirmed unchanged by the site (304 Not Modified)"
+        )
+        self.evictions = registry.counter(
+            "nitro_search_cache_evictions_total", "Entries removed to stay under the size limit"
+        )
+        registry.gauge_callback(
+            "nitro_search_cache_bytes", "Size of the cached values", lambda: self._bytes if self._db else None
+        )
+        registry.gauge_callback(
+            "nitro_search_cache_entries", "Entries in the search cache", lambda: self._entries if self._db else None
+        )
+
+    # ------------------------------------------------------------------
+    # STORAGE (called in a worker thread)
+    # ------------------------------------------------------------------
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Open the file on first use (None if it can't be opened)."""
+        if self._db is not None or self._failed or not self.enabled:
+            return self._db
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            # WAL: readers don't wait for writers, commits don't fsync every time
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(_SCHEMA)
+            self._entries, self._bytes = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"❌ Search cache disabled, can't open {self.path}: {e}")
+            self._failed = True
+            return None
+        self._db = db
+        logger.info(f"🗄️ Search cache: {self.path} ({self._entries} entries, {self._bytes // 1024} KB)")
+        return db
+
+    def _get(self, kind: str, key: str) -> Optional[Dict]:
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return None
+            try:
+                row = db.execute(
+                    "SELECT value, etag, last_modified, expires_at, size FROM entries WHERE kind = ? AND key = ?",
+                    (kind, key)
+                ).fetchone()
+                if row is None:
+                    return None
+                value, etag, last_modified, expires_at, size = row
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    # Corrupt or truncated row: drop it, a miss refills it
+                    logger.warning("Search cache entry %s:%s is corrupt, removing it", kind, key)
+                    db.execute("DELETE FROM entries WHERE kind = ? AND key = ?", (kind, key))
+                    self._bytes -= size
+                    self._entries -= 1
+                    return None
+                db.execute("UPDATE entries SET last_used = ? WHERE kind = ? AND key = ?", (time.time(), kind, key))
+            except sqlite3.Error as e:
+                logger.warning("Search cache read failed: %s", e)
+                return None
+        return {
+            "value": value,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fresh": expires_at > time.time(),
+        }
+
+    def _put(self, kind: str, key: str, value, ttl: float, etag: Optional[str] = None,
+             last_modified: Optional[str] = None):
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(key) + len(data) + len(etag or "") + len(last_modified or "")
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return
+            try:
+                old = db.execute("SELECT size FROM entries WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+                db.execute(
+                    "INSERT OR REPLACE INTO entries "
+                    "(kind, key, value, etag, last_modified, stored_at, expires_at, last_used, size) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (kind, key, data, etag, last_modified, now, now + ttl, now, size)
+                )
+                self._bytes += size - (old[0] if old else 0)
+                self._entries += 0 if old else 1
+                if self._bytes > self.max_bytes:
+                    self._evict(db)
+            except sqlite3.Error as e:
+                logger.warning("Search cache write failed: %s", e)
+
+    def _evict(self, db: sqlite3.Connection):
+        """Remove least recently used entries until the cache is at EVICT_TO of max_bytes."""
+        target = self.max_bytes * EVICT_TO
+        doomed = []
+        freed = 0
+        cursor = db.execute("SELECT kind, key, size FROM entries ORDER BY last_used")
+        for kind, key, size in cursor:
+            if self._bytes - freed <= target:
+                break
+            doomed.append((kind, key))
+            freed += size
+        cursor.close()
+        db.execute("BEGIN")
+        db.executemany("DELETE FROM entries WHERE kind = ? AND key = ?", doomed)
+        db.execute("COMMIT")
+        self._bytes -= freed
+        self._entries -= len(doomed)
+        self.evictions.inc(len(doomed))
+        logger.info("🗄️ Search cache: evicted %d entries (%d KB)", len(doomed), freed // 1024)
+
+    def _touch(self, kind: str, key: str, ttl: float):
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return
+            now = time.time()
+            try:
+                db.execute(
+                    "UPDATE entries SET expires_at = ?, last_used = ? WHERE kind = ? AND key = ?",
+                    (now + ttl, now, kind, key)
+                )
+            except sqlite3.Error as e:
+                logger.warning("Search cache write failed: %s", e)
+
+    def _count(self, kind: str, entry: Optional[Dict]) -> str:
+        result = "miss" if entry is None else "hit" if entry["fresh"] else "stale"
+        self.lookups.labels(kind, result).inc()
+        return result
+
+    # ------------------------------------------------------------------
+    # SEARCH RESULTS
+    # ------------------------------------------------------------------
+
+    async def get_results(self, query: str) -> Optional[List[Dict]]:
+        """
+        Cached results of a search.
+
+        Args:
+            query: Search query (normalized here)
+
+        Returns:
+            Result list, or None if not cached or expired
+        """
+        if not self.enabled or self.results_ttl <= 0:
+            return None
+        entry = await asyncio.to_thread(self._get, "search", normalize_query(query))
+        return entry["value"] if self._count("search", entry) == "hit" else None
+
+    async def put_results(self, query: str, results: List[Dict]):
+        """Store the results of a search (empty lists aren't stored)."""
+        if self.enabled and self.results_ttl > 0 and results:
+            await asyncio.to_thread(self._put, "search", normalize_query(query), results, self.results_ttl)
+
+    # ------------------------------------------------------------------
+    # PAGES
+    # ------------------------------------------------------------------
+
+    def page_ttl_for(self, cache_control: Optional[str], revalidatable: bool = True) -> float:
+        """
+        How long a page may be cached, from its Cache-Control header.
+
+        no-cache and max-age=0 both mean "store, but revalidate before
+        use": such a page is kept for a second if it can be revalidated
+        (has an ETag or Last-Modified), so the next fetch is a cheap
+        conditional request instead of a full download.
+
+        Args:
+            cache_control: Cache-Control response header (None = not sent)
+            revalidatable: The page sent an ETag or Last-Modified
+
+        Returns:
+            Seconds (0 = don't store it)
+        """
+        if not cache_control:
+            return self.page_ttl
+        lowered = cache_control.lower()
+        if "no-store" in lowered or "private" in lowered:
+            return 0
+        match = _MAX_AGE.search(cache_control)
+        max_age = min(int(match.group(1)), self.page_ttl) if match else self.page_ttl
+        if "no-cache" in lowered or max_age == 0:
+            return 1 if revalidatable else 0  # Stored, but revalidated before every use
+        return max_age
+
+    async def get_page(self, url: str) -> Optional[Dict]:
+        """
+        Cached text of a page, fresh or expired.
+
+        Args:
+            url: Page URL
+
+        Returns:
+            {"text", "fresh", "etag", "last_modified"}, or None if not
+            cached. An expired entry is only returned when it can be
+            revalidated (it has an ETag or Last-Modified).
+        """
+        if not self.enabled or self.page_ttl <= 0:
+            return None
+        entry = await asyncio.to_thread(self._get, "page", normalize_url(url))
+        if entry is not None and not entry["fresh"] and not (entry["etag"] or entry["last_modified"]):
+            entry = None  # Expired and nothing to revalidate with
+        self._count("page", entry)
+        if entry is None:
+            return None
+        return {
+            "text": entry["value"],
+            "fresh": entry["fresh"],
+            "etag": entry["etag"],
+            "last_modified": entry["last_modified"],
+        }
+
+    async def put_page(self, url: str, text: str, cache_control: Optional[str] = None,
+                       etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """
+        Store the extracted text of a page.
+
+        Args:
+            url: Page URL
+            text: Extracted text
+            cache_control, etag, last_modified: The page's response headers
+        """
+        if not self.enabled or self.page_ttl <= 0 or not text:
+            return
+        ttl = self.page_ttl_for(cache_control, revalidatable=bool(etag or last_modified))
+        if ttl > 0:
+            await asyncio.to_thread(self._put, "page", normalize_url(url), text, ttl, etag, last_modified)
+
+    async def revalidated(self, url: str, cache_control: Optional[str] = None):
+        """The site answered 304 Not Modified: the cached text is fresh again."""
+        self.revalidations.inc()
+        ttl = self.page_ttl_for(cache_control) if self.enabled else 0
+        if ttl > 0:
+            await asyncio.to_thread(self._touch, "page", normalize_url(url), ttl)
+
+    # ------------------------------------------------------------------
+    # REPORTING / LIFECYCLE
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict:
+        """Hit rates per kind, size and evictions for the JSON /metrics."""
+        report = {
+            "enabled": self.enabled and not self._failed,
+            "path": str(self.path),
+            "entries": self._entries,
+            "size_kb": round(self._bytes / 1024, 1),
+            "max_kb": round(self.max_bytes / 1024, 1),
+            "evictions": int(self.evictions.labels().value),
+            "revalidated": int(self.revalidations.labels().value),
+        }
+        for kind in KINDS:
+            counts = {result: int(self.lookups.labels(kind, result).value) for result in ("hit", "stale", "miss")}
+            lookups = sum(counts.values())
+            if kind == "page":
+                # A stale page that the site confirmed unchanged was served from the cache too
+                served = counts["hit"] + report["revalidated"]
+            else:
+                served = counts["hit"]
+            report[kind] = {**counts, "hit_rate": round(served / lookups, 3) if lookups else None}
+        return report
+
+    def close(self):
+        """Close the database (app shutdown)."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+# Create a singleton instance
+search_cache = SearchCache(
+    path=settings.SEARCH_CACHE_PATH,
+    results_ttl=settings.SEARCH_CACHE_RESULTS_TTL,
+    page_ttl=settings.SEARCH_CACHE_PAGE_TTL,
+    max_bytes=settings.SEARCH_CACHE_MAX_MB * 1024 * 1024,
+    enabled=settings.SEARCH_CACHE_ENABLED
+)
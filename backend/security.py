@@ -7,6 +7,7 @@ from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from collections import defaultdict
 from datetime import datetime, timedelta
+import hmac
 import time
 from typing import Dict, Tuple
 
@@ -162,6 +163,58 @@ async def verify_api_key(request: Request):
     return True
 
 
+async def verify_admin_api_key(request: Request):
+    """
+    Verify the API key for admin-only routes (profiler).
+    Unlike verify_api_key, the key is required even when ENABLE_API_KEY is off,
+    and an empty API_KEY locks the route instead of opening it.
+    """
+    if not settings.API_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Set API_KEY in .env to use admin endpoints."
+        )
+    
+    api_key = request.headers.get("X-API-Key") or request.headers.get("Authorization")
+    if not api_key:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="API key required. Add 'X-API-Key' header with your API key."
+        )
+    if api_key.startswith("Bearer "):
+        api_key = api_key[7:]
+    
+    if not hmac.compare_digest(api_key.encode(), settings.API_KEY.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid API key"
+        )
+    
+    return True
+
+
+def verify_websocket_api_key(websocket) -> bool:
+    """
+    Verify the API key of a WebSocket connection.
+    Browsers can't set headers on WebSockets, so ?api_key=... is accepted too.
+    
+    Returns:
+        True if the connection may continue
+    """
+    if not settings.ENABLE_API_KEY:
+        return True
+    
+    api_key = (
+        websocket.headers.get("X-API-Key")
+        or websocket.headers.get("Authorization")
+        or websocket.query_params.get("api_key")
+        or ""
+    )
+    if api_key.startswith("Bearer "):
+        api_key = api_key[7:]
+    return hmac.compare_digest(api_key.encode(), settings.API_KEY.encode())
+
+
 def validate_origin(origin: str) -> bool:
     """
     Validate if origin is allowed.
@@ -0,0 +1,462 @@
+"""
+streaming.py - Helpers for streaming AI responses to the browser
+Stops Ollama as soon as nobody is reading the answer anymore
+
+Why?
+- When a user closes the tab (or hits "stop"), the SSE connection goes away,
+  but an async generator only notices when it tries to send the next chunk -
+  meanwhile Ollama keeps generating an answer nobody will read
+- Closing the upstream HTTP request is how Ollama learns to stop, and that
+  frees its slot for the next user right away
+
+How:
+- cancel_on_disconnect() runs the upstream generator in its own task and
+  keeps checking request.is_disconnected() while waiting for chunks
+- On disconnect the upstream task is cancelled and ClientDisconnected is
+  raised; for a registry stream (see below) that detaches the client, and
+  the generation itself is cancelled (closing the Ollama request) unless
+  the client comes back - the partial answer is saved with truncated=True
+
+Token coalescing:
+- Ollama sends one NDJSON line per token; forwarding each one costs a
+  json.dumps and a network write per token
+- coalesce_tokens() sends the first token right away (time-to-first-token
+  stays the same) and then groups tokens into frames that are flushed
+  every few milliseconds or once they reach a byte limit
+
+Resumable streams (Last-Event-ID):
+- Every generation gets an ID and runs in its own task; its SSE events are
+  numbered ("id: <generation>:<seq>") and kept in a replay buffer
+- A client that lost the connection reconnects with the Last-Event-ID
+  header and gets only the events it missed, then the live tail - the
+  answer is never generated twice
+- Without any client, a generation keeps running for a short grace period
+  (waiting for a reconnect) and is then cancelled; finished generations
+  stay replayable for a short TTL
+"""
+
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+# Import with compatibility for both local and package mode
+try:
+    from .config import settings
+    from .logger import logger
+    from . import request_timing
+except ImportError:
+    from config import settings
+    from logger import logger
+    import request_timing
+
+
+class ClientDisconnected(Exception):
+    """The client closed the streaming connection before the answer finished."""
+
+
+_DONE = object()
+
+
+class StreamStats:
+    """Counters for streamed responses (shown under /metrics)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.errors = 0
+        self.resumed = 0
+
+    def record(self, outcome: str):
+        """
+        Count one stream outcome.
+
+        Args:
+            outcome: "started", "completed", "cancelled", "errors" or "resumed"
+        """
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def get_stats(self) -> Dict:
+        """Get stream counters."""
+        with self._lock:
+            return {
+                "started": self.started,
+                "completed": self.completed,
+                "cancelled_by_client": self.cancelled,
+                "errors": self.errors,
+                "resumed": self.resumed,
+                "active": self.started - self.completed - self.cancelled - self.errors,
+            }
+
+
+async def cancel_on_disconnect(
+    request,
+    source: AsyncIterator,
+    poll_interval: float = 0.5
+) -> AsyncGenerator:
+    """
+    Yield items from `source` until the HTTP client disconnects.
+
+    Args:
+        request: FastAPI/Starlette Request of the streaming endpoint
+        source: Upstream async generator (e.g. chat_ai.stream_response(...))
+        poll_interval: Seconds between disconnect checks
+
+    Yields:
+        Items from `source`
+
+    Raises:
+        ClientDisconnected: If the client went away (upstream is already cancelled)
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for item in source:
+                queue.put_nowait(item)
+        finally:
+            queue.put_nowait(_DONE)
+
+    task = asyncio.ensure_future(pump())
+    last_check = time.monotonic()
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                item = None
+
+            # Check on every timeout and at least every poll_interval while
+            # chunks are flowing (a slow reader never makes send() fail)
+            now = time.monotonic()
+            if item is None or now - last_check >= poll_interval:
+                last_check = now
+                if await request.is_disconnected():
+                    raise ClientDisconnected()
+            if item is None:
+                continue
+            if item is _DONE:
+                break
+            yield item
+
+        # Surface upstream errors to the caller
+        await task
+
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+async def coalesce_tokens(
+    source: AsyncIterator[str],
+    flush_interval: float = 0.03,
+    max_frame_bytes: int = 512
+) -> AsyncGenerator[str, None]:
+    """
+    Group small text chunks into bigger frames.
+
+    The first chunk is passed through immediately. After that, chunks are
+    collected until `flush_interval` seconds have passed since the frame
+    started or the frame holds `max_frame_bytes`, whichever comes first.
+    Reading from `source` continues while a frame is being sent.
+
+    Args:
+        source: Async generator of text chunks (tokens)
+        flush_interval: Max seconds a chunk waits in a frame (0 = no coalescing)
+        max_frame_bytes: Flush as soon as a frame is this big
+
+    Yields:
+        Frames (concatenated chunks)
+    """
+    if flush_interval <= 0:
+        async for chunk in source:
+            yield chunk
+        return
+
+    loop = asyncio.get_running_loop()
+    next_chunk = None  # Pending read - kept across timeouts, never cancelled early
+    frame: List[str] = []
+    frame_bytes = 0
+    deadline = 0.0
+    first = True
+    try:
+        while True:
+            if next_chunk is None:
+                next_chunk = asyncio.ensure_future(source.__anext__())
+            timeout = max(0.0, deadline - loop.time()) if frame else None
+            done, _ = await asyncio.wait({next_chunk}, timeout=timeout)
+
+            if not done:
+                # Frame is old enough - send it, keep waiting for the next chunk
+                yield "".join(frame)
+                frame, frame_bytes = [], 0
+                continue
+
+            task, next_chunk = next_chunk, None
+            try:
+                chunk = task.result()
+            except StopAsyncIteration:
+                break
+
+            if first:
+                first = False
+                yield chunk
+                continue
+
+            if not frame:
+                deadline = loop.time() + flush_interval
+            frame.append(chunk)
+            frame_bytes += len(chunk)
+            if frame_bytes >= max_frame_bytes:
+                yield "".join(frame)
+                frame, frame_bytes = [], 0
+
+        if frame:
+            yield "".join(frame)
+
+    finally:
+        if next_chunk is not None and not next_chunk.done():
+            next_chunk.cancel()
+            await asyncio.gather(next_chunk, return_exceptions=True)
+
+
+def sse_event(event_id: str, data: str) -> str:
+    """Format one Server-Sent Event (data must already be JSON)."""
+    return f"id: {event_id}\ndata: {data}\n\n"
+
+
+def parse_last_event_id(value: Optional[str]) -> Tuple[Optional[str], int]:
+    """
+    Split a Last-Event-ID header into (generation_id, seq).
+
+    Returns:
+        (None, 0) if the header is missing or malformed
+    """
+    if not value or ":" not in value:
+        return None, 0
+    generation_id, _, seq = value.strip().rpartition(":")
+    try:
+        return generation_id, max(0, int(seq))
+    except ValueError:
+        return None, 0
+
+
+class StreamGeneration:
+    """One streamed answer: its numbered events and who is listening."""
+
+    def __init__(self, generation_id: str):
+        self.id = generation_id
+        self.events: List[str] = []  # JSON payloads; event N has seq N (1-based)
+        self.finished = False
+        self.finished_at: Optional[float] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def append(self, payload: Dict):
+        """Add an event (encoded once, shared by every subscriber)."""
+        self.events.append(json.dumps(payload))
+        self._notify()
+
+    def finish(self):
+        """Mark the generation as finished (no more events)."""
+        self.finished = True
+        self.finished_at = time.time()
+        self._notify()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def iter_events(self, after_seq: int = 0) -> AsyncGenerator[Tuple[int, str], None]:
+        """
+        Yield (seq, JSON payload) after `after_seq`, then follow the live tail.
+
+        Args:
+            after_seq: Last sequence number the client already has
+
+        Yields:
+            (seq, payload) tuples
+        """
+        seq = min(after_seq, len(self.events))
+        self.subscribers += 1
+        try:
+            while True:
+                while seq < len(self.events):
+                    seq += 1
+                    yield seq, self.events[seq - 1]
+                if self.finished:
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+
+    async def subscribe(self, after_seq: int = 0) -> AsyncGenerator[str, None]:
+        """
+        Yield formatted SSE events after `after_seq` (see iter_events).
+
+        Args:
+            after_seq: Last sequence number the client already has
+
+        Yields:
+            Formatted SSE events
+        """
+        async for seq, payload in self.iter_events(after_seq):
+            yield sse_event(f"{self.id}:{seq}", payload)
+
+
+class StreamRegistry:
+    """
+    Runs generations in the background and keeps their events for replay.
+
+    Usage:
+        >>> generation = stream_registry.start(frames, on_finish=save, final_event={...})
+        >>> async for event in generation.subscribe():
+        ...     yield event
+    """
+
+    def __init__(self, ttl: int = 60, detach_grace: float = 10.0, max_generations: int = 500):
+        """
+        Initialize the registry.
+
+        Args:
+            ttl: Seconds a finished generation stays replayable
+            detach_grace: Seconds a generation keeps running with no client
+                          (0 = cancel as soon as the client disconnects)
+            max_generations: Replay buffers kept at most (oldest finished dropped)
+        """
+        self.ttl = ttl
+        self.detach_grace = detach_grace
+        self.max_generations = max_generations
+        self._generations: "OrderedDict[str, StreamGeneration]" = OrderedDict()
+
+    def get(self, generation_id: Optional[str]) -> Optional[StreamGeneration]:
+        """Find a running or recently finished generation."""
+        self._cleanup()
+        return self._generations.get(generation_id) if generation_id else None
+
+    def start(
+        self,
+        source: AsyncIterator[str],
+        on_finish: Optional[Callable[[str, bool], None]] = None,
+        final_event: Optional[Dict] = None
+    ) -> StreamGeneration:
+        """
+        Start a generation in the background.
+
+        The request's timing (request_timing.py) follows the generation: the
+        closing event carries it as "timing" (plus Ollama's per-model numbers
+        as "generation"), and it is fed into the metrics
+        when the generation ends rather than when the response headers go out.
+
+        Args:
+            source: Async generator of text frames
+            on_finish: Called once as on_finish(full_text, truncated)
+            final_event: Extra fields for the closing {"done": True} event
+
+        Returns:
+            The new StreamGeneration
+        """
+        self._cleanup()
+        timing = request_timing.current()
+        if timing is not None:
+            timing.deferred = True
+        generation = StreamGeneration(uuid.uuid4().hex)
+        self._generations[generation.id] = generation
+        generation.task = asyncio.ensure_future(self._run(generation, source, on_finish, final_event or {}))
+        stream_stats.record("started")
+        return generation
+
+    async def _run(self, generation: StreamGeneration, source, on_finish, final_event: Dict):
+        """Pump `source` into the generation's replay buffer."""
+        parts: List[str] = []
+        timing = request_timing.current()  # Inherited from the request that started it
+        try:
+            async for frame in source:
+                parts.append(frame)
+                generation.append({"chunk": frame, "done": False})
+            if on_finish:
+                on_finish("".join(parts), False)
+            if timing is not None:
+                final_event = {**final_event, "timing": timing.to_dict()}
+                if timing.generation is not None:
+                    final_event["generation"] = timing.generation
+            generation.append({"chunk": "", "done": True, **final_event})
+            stream_stats.record("completed")
+
+        except asyncio.CancelledError:
+            # Nobody came back for it - keep what was generated so far
+            stream_stats.record("cancelled")
+            logger.info("🛑 Stream %s cancelled - upstream generation stopped", generation.id[:8])
+            if on_finish and parts:
+                on_finish("".join(parts), True)
+            generation.append({"chunk": "", "done": True, "truncated": True, **final_event})
+            raise
+
+        except Exception as e:
+            stream_stats.record("errors")
+            logger.error("Streaming error: %s", e)
+            generation.append({"chunk": f"Error: {str(e)}", "done": True, "error": True})
+
+        finally:
+            generation.finish()
+            if timing is not None:
+                timing.finish()
+
+    def detach(self, generation: StreamGeneration):
+        """
+        A client left: cancel the generation if nobody is back within the grace period.
+
+        Args:
+            generation: Generation the client was reading
+        """
+        if generation.finished or generation.subscribers > 0:
+            return
+
+        def check():
+            if not generation.finished and generation.subscribers == 0 and generation.task:
+                generation.task.cancel()
+
+        if self.detach_grace <= 0:
+            check()
+        else:
+            asyncio.get_running_loop().call_later(self.detach_grace, check)
+
+    def cancel(self, generation: StreamGeneration):
+        """Stop a generation right away (client asked to stop)."""
+        if not generation.finished and generation.task:
+            generation.task.cancel()
+
+    def _cleanup(self):
+        """Drop expired replay buffers, then the oldest finished ones over the limit."""
+        now = time.time()
+        for generation_id, generation in list(self._generations.items()):
+            if generation.finished and now - generation.finished_at > self.ttl:
+                del self._generations[generation_id]
+        finished = [g for g in self._generations.values() if g.finished]
+        while len(self._generations) > self.max_generations and finished:
+            del self._generations[finished.pop(0).id]
+
+    def get_stats(self) -> Dict:
+        """Get replay buffer usage."""
+        generations = list(self._generations.values())
+        return {
+            "buffered_generations": len(generations),
+            "running": sum(1 for g in generations if not g.finished),
+            "buffered_events": sum(len(g.events) for g in generations),
+        }
+
+
+# Create a singleton instance
+stream_stats = StreamStats()
+stream_registry = StreamRegistry(
+    ttl=settings.STREAM_REPLAY_TTL,
+    detach_grace=settings.STREAM_RESUME_GRACE
+)
@@ -19,24 +19,18 @@ QUICK START:
 3. Set AI_MODEL=ollama in .env
 4. Done! Free local AI chat!
 
+Every request goes through an LLM backend (backend/llm_backends.py):
+the one the app injects, or one built from model_name when used standalone.
+
 DEPENDENCIES:
 - aiohttp (for async HTTP) - pip install aiohttp
 - No other AI libraries needed!
 """
 
 from typing import Optional, Dict, List, AsyncGenerator, Any
-from datetime import datetime
-import json
 import asyncio
 import os
-
-# Async HTTP client
-try:
-    import aiohttp
-    AIOHTTP_AVAILABLE = True
-except ImportError:
-    AIOHTTP_AVAILABLE = False
-    print("⚠️  aiohttp not installed. Install with: pip install aiohttp")
+import time
 
 
 class ChatAI:
@@ -57,7 +51,11 @@ class ChatAI:
         base_url: Optional[str] = None,
         api_key: Optional[str] = None,
         temperature: float = 0.7,
-        max_tokens: int = 500
+        max_tokens: int = 500,
+        router: Optional[Any] = None,
+        prompt_builder: Optional[Any] = None,
+        backend: Optional[Any] = None,
+        generation_stats: Optional[Any] = None
     ):
         """
         Initialize Chat AI.
@@ -69,6 +67,20 @@ class ChatAI:
             api_key: API key (for cloud services)
             temperature: Response creativity (0.0-1.0)
             max_tokens: Maximum response length
+            router: Optional model router (backend/model_router.py).
+                    When set, each request picks the fast or the
+                    large model based on how hard it looks.
+            prompt_builder: Optional prompt builder (backend/prompt_builder.py).
+                            When set, prompts are assembled in one stable
+                            order so Ollama can reuse its cached prefix.
+            backend: Optional LLM backend (backend/llm_backends.py).
+                     When set, every request goes through it (Ollama pool,
+                     OpenAI-compatible server or dummy) and model_name,
+                     base_url and api_key are not used. When not set, one
+                     is built from model_name, base_url and api_key.
+            generation_stats: Optional per-model stats (backend/generation_stats.py),
+                              handed to the Ollama backend built from model_name
+                              (an injected backend records its own).
             
         Example - Local Ollama:
             >>> ai = ChatAI(model_name="ollama", model="llama2")
@@ -84,6 +96,10 @@ class ChatAI:
         self.api_key = api_key
         self.temperature = temperature
         self.max_tokens = max_tokens
+        self.router = router
+        self.prompt_builder = prompt_builder
+        self.generation_stats = generation_stats
+        self.backend = backend if backend is not None else self._create_backend()
         
         # Conversation history for context
         self.conversation_history: List[Dict] = []
@@ -98,218 +114,96 @@ class ChatAI:
         }
         return defaults.get(self.model_name, 'http://localhost:11434')
     
-    # ========================================================================
-    # OLLAMA INTEGRATION (Local, Free!)
-    # ========================================================================
-    
-    async def generate_response_ollama(
-        self,
-        message: str,
-        system_prompt: Optional[str] = None
-    ) -> str:
+    def _create_backend(self):
         """
-        Generate response using Ollama (LOCAL AI).
+        Build an LLM backend from model_name (when none is injected).
         
-        REQUIREMENTS:
-        1. Install Ollama: https://ollama.ai
-        2. Pull model: ollama pull llama2
-        3. Run server: ollama serve (usually auto-starts)
+        Returns:
+            OllamaBackend (one-server pool at base_url), OpenAICompatBackend
+            or DummyBackend
+        """
+        try:
+            import llm_backends  # Running from backend/ (main.py, benchmarks)
+            from ollama_pool import OllamaPool
+        except ImportError:
+            from backend import llm_backends
+            from backend.ollama_pool import OllamaPool
+        
+        if self.model_name == "ollama":
+            return llm_backends.OllamaBackend(
+                pool=OllamaPool([self.base_url]),
+                default_model=self.model,
+                default_max_tokens=self.max_tokens,
+                builder=self.prompt_builder,
+                stats=self.generation_stats
+            )
+        if self.model_name == "openai":
+            return llm_backends.OpenAICompatBackend(
+                base_url=self.base_url,
+                default_model=self.model,
+                api_key=self.api_key or "",
+                default_max_tokens=self.max_tokens
+            )
+        if self.model_name != "dummy":
+            print(f"⚠️  Unknown model: {self.model_name}. Use 'ollama', 'openai', or 'dummy' - using dummy")
+        return llm_backends.DummyBackend(default_model=self.model)
+    
+    def _select_model(self, message: str, history: Optional[List[Dict]] = None):
+        """
+        Pick the model for one request.
         
         Args:
             message: User message
-            system_prompt: System instructions (optional)
-            
+            history: Caller's conversation history (None = this instance's)
+        
         Returns:
-            AI response text
-            
-        MODELS YOU CAN USE:
-        - llama2 (7B) - Good balance, 4GB RAM
-        - mistral (7B) - Fast, efficient
-        - phi (2.7B) - Very fast, 2GB RAM
-        - codellama (7B) - Great for code
-        - llama2:13b - Better quality, needs 8GB RAM
+            (model, decision) - decision is None when no router is configured
         """
-        if not AIOHTTP_AVAILABLE:
-            return "⚠️ aiohttp not installed. Install with: pip install aiohttp"
-        
-        try:
-            # Build conversation context
-            messages = []
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-            
-            # Add conversation history for context
-            for msg in self.conversation_history[-self.max_history:]:
-                messages.append(msg)
-            
-            # Add current message
-            messages.append({"role": "user", "content": message})
-            
-            # Call Ollama API
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/api/chat",
-                    json={
-                        "model": self.model,
-                        "messages": messages,
-                        "stream": False,
-                        "options": {
-                            "temperature": self.temperature,
-                            "num_predict": self.max_tokens
-                        }
-                    },
-                    timeout=aiohttp.ClientTimeout(total=60)
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        return f"Ollama Error: {error_text}. Is Ollama running? Try: ollama serve"
-                    
-                    data = await response.json()
-                    ai_response = data.get('message', {}).get('content', 'No response')
-                    
-                    # Update conversation history
-                    self.conversation_history.append({"role": "user", "content": message})
-                    self.conversation_history.append({"role": "assistant", "content": ai_response})
-                    
-                    return ai_response
-                    
-        except aiohttp.ClientConnectorError:
-            return "❌ Cannot connect to Ollama. Is it running?\n\nTo start Ollama:\n1. Install from https://ollama.ai\n2. Run: ollama serve\n3. Pull a model: ollama pull llama2"
-        except asyncio.TimeoutError:
-            return "⏱️ Request timed out. The model might be loading for the first time (this can take a minute)."
-        except Exception as e:
-            return f"Ollama Error: {str(e)}"
-    
-    # ========================================================================
-    # STREAMING RESPONSES (Like ChatGPT!)
-    # ========================================================================
+        if self.router is None:
+            return self.model, None
+        decision = self.router.route(
+            message,
+            history_depth=len(self.conversation_history if history is None else history) // 2,
+            default_model=self.model
+        )
+        return decision["model"], decision
     
-    async def stream_response_ollama(
+    def _build_messages(
         self,
         message: str,
-        system_prompt: Optional[str] = None
-    ) -> AsyncGenerator[str, None]:
+        system_prompt: Optional[str],
+        history: Optional[List[Dict]]
+    ) -> List[Dict]:
         """
-        Stream response word-by-word (like ChatGPT typing effect).
+        Build the chat messages for one request.
         
         Args:
             message: User message
             system_prompt: System instructions (optional)
-            
-        Yields:
-            Response chunks as they're generated
-            
-        Example:
-            >>> async for chunk in ai.stream_response_ollama("Tell me a story"):
-            ...     print(chunk, end='', flush=True)
+            history: Caller's conversation history; None = this instance's history
         """
-        if not AIOHTTP_AVAILABLE:
-            yield "⚠️ aiohttp not installed"
-            return
+        if history is None:
+            history = self.conversation_history[-self.max_history:]
+        if self.prompt_builder is not None:
+            return self.prompt_builder.build(message, history, system_prompt)
         
-        try:
-            # Build messages
-            messages = []
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-            
-            for msg in self.conversation_history[-self.max_history:]:
-                messages.append(msg)
-            
-            messages.append({"role": "user", "content": message})
-            
-            # Stream from Ollama
-            full_response = ""
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/api/chat",
-                    json={
-                        "model": self.model,
-                        "messages": messages,
-                        "stream": True,  # Enable streaming!
-                        "options": {
-                            "temperature": self.temperature,
-                            "num_predict": self.max_tokens
-                        }
-                    }
-                ) as response:
-                    async for line in response.content:
-                        if line:
-                            try:
-                                data = json.loads(line)
-                                chunk = data.get('message', {}).get('content', '')
-                                if chunk:
-                                    full_response += chunk
-                                    yield chunk
-                            except json.JSONDecodeError:
-                                continue
-            
-            # Update history
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.extend(history)
+        messages.append({"role": "user", "content": message})
+        return messages
+    
+    def _remember_turn(self, message: str, ai_response: str, history: Optional[List[Dict]]):
+        """Add a turn to this instance's history (callers with their own history skip this)."""
+        if history is None:
             self.conversation_history.append({"role": "user", "content": message})
-            self.conversation_history.append({"role": "assistant", "content": full_response})
-            
-        except Exception as e:
-            yield f"\n\nStreaming Error: {str(e)}"
+            self.conversation_history.append({"role": "assistant", "content": ai_response})
     
-    # ========================================================================
-    # OPENAI INTEGRATION (Cloud, Paid)
-    # ========================================================================
-    
-    async def generate_response_openai(self, message: str) -> str:
-        """
-        Generate response using OpenAI (GPT-4, GPT-3.5).
-        
-        REQUIREMENTS:
-        1. Get API key from https://platform.openai.com
-        2. Add to .env: OPENAI_API_KEY=sk-...
-        3. Set AI_MODEL=openai
-        
-        COST: ~$0.002 per message (GPT-3.5)
-        """
-        if not AIOHTTP_AVAILABLE:
-            return "⚠️ aiohttp not installed"
-        
-        if not self.api_key:
-            return "❌ OpenAI API key not set. Add OPENAI_API_KEY to .env file"
-        
-        try:
-            # Build messages
-            messages = []
-            for msg in self.conversation_history[-self.max_history:]:
-                messages.append(msg)
-            messages.append({"role": "user", "content": message})
-            
-            # Call OpenAI API
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": messages,
-                        "temperature": self.temperature,
-                        "max_tokens": self.max_tokens
-                    }
-                ) as response:
-                    data = await response.json()
-                    
-                    if response.status != 200:
-                        return f"OpenAI Error: {data.get('error', {}).get('message', 'Unknown error')}"
-                    
-                    ai_response = data['choices'][0]['message']['content']
-                    
-                    # Update history
-                    self.conversation_history.append({"role": "user", "content": message})
-                    self.conversation_history.append({"role": "assistant", "content": ai_response})
-                    
-                    return ai_response
-                    
-        except Exception as e:
-            return f"OpenAI Error: {str(e)}"
+    def _record_route(self, decision, start_time: float, success: bool):
+        """Tell the model router how a routed request went."""
+        if decision is not None:
+            self.router.record(decision, time.time() - start_time, success)
     
     # ========================================================================
     # UNIVERSAL INTERFACE
@@ -318,7 +212,9 @@ class ChatAI:
     async def generate_response(
         self,
         message: str,
-        system_prompt: Optional[str] = None
+        system_prompt: Optional[str] = None,
+        history: Optional[List[Dict]] = None,
+        session_id: Optional[str] = None
     ) -> str:
         """
         Generate response (automatically uses configured model).
@@ -326,23 +222,34 @@ class ChatAI:
         Args:
             message: User message
             system_prompt: System instructions (optional)
+            history: Conversation history from the caller (optional)
+            session_id: Conversation ID (optional)
             
         Returns:
             AI response text
         """
-        if self.model_name == "ollama":
-            return await self.generate_response_ollama(message, system_prompt)
-        elif self.model_name == "openai":
-            return await self.generate_response_openai(message)
-        elif self.model_name == "dummy":
-            return self._dummy_response(message)
-        else:
-            return f"Unknown model: {self.model_name}. Use 'ollama', 'openai', or 'dummy'"
+        messages = self._build_messages(message, system_prompt, history)
+        model, decision = self._select_model(message, history)
+        start_time = time.time()
+        ai_response = await self.backend.generate(
+            messages,
+            model=model,
+            options={"temperature": self.temperature, "max_tokens": self.max_tokens},
+            session_id=session_id
+        )
+        self._record_route(decision, start_time, bool(ai_response))
+        if not ai_response:
+            return f"❌ No response from the {self.backend.name} backend.\n\n{self.backend.setup_hint}".strip()
+        
+        self._remember_turn(message, ai_response, history)
+        return ai_response
     
     async def stream_response(
         self,
         message: str,
-        system_prompt: Optional[str] = None
+        system_prompt: Optional[str] = None,
+        history: Optional[List[Dict]] = None,
+        session_id: Optional[str] = None
     ) -> AsyncGenerator[str, None]:
         """
         Stream response (automatically uses configured model).
@@ -350,28 +257,43 @@ class ChatAI:
         Args:
             message: User message
             system_prompt: System instructions (optional)
+            history: Conversation history from the caller (optional)
+            session_id: Conversation ID (optional)
             
         Yields:
             Response chunks
+        
+        Raises:
+            LLMBackendError: If the backend can't be reached or refuses the request
         """
-        if self.model_name == "ollama":
-            async for chunk in self.stream_response_ollama(message, system_prompt):
+        messages = self._build_messages(message, system_prompt, history)
+        model, decision = self._select_model(message, history)
+        # Chunks are collected in a list and joined once at the end
+        response_parts: List[str] = []
+        start_time = time.time()
+        
+        stream = self.backend.stream(
+            messages,
+            model=model,
+            options={"temperature": self.temperature, "max_tokens": self.max_tokens},
+            session_id=session_id
+        )
+        try:
+            async for chunk in stream:
+                response_parts.append(chunk)
                 yield chunk
-        else:
-            # For non-streaming models, yield all at once
-            response = await self.generate_response(message, system_prompt)
-            yield response
-    
-    def _dummy_response(self, message: str) -> str:
-        """Dummy response for testing (no AI needed)."""
-        responses = [
-            f"This is a dummy response to: '{message[:30]}...'",
-            "I'm a placeholder AI. To use real AI, set up Ollama or OpenAI!",
-            "Real AI integration coming soon! This is just a test response.",
-            f"You said: '{message}'. I would respond intelligently if AI was enabled!"
-        ]
-        import random
-        return random.choice(responses)
+        except Exception:
+            # Not turned into answer text: the caller reports it as an error
+            # event (and doesn't save it as the assistant's message)
+            self._record_route(decision, start_time, False)
+            raise
+        finally:
+            # `async for` doesn't close the inner generator on its own; closing
+            # it when the client is gone makes the backend drop its connection
+            await stream.aclose()
+        
+        self._record_route(decision, start_time, True)
+        self._remember_turn(message, "".join(response_parts), history)
     
     # ========================================================================
     # CONTEXT MANAGEMENT
@@ -420,7 +342,11 @@ def create_chat_ai(
             model=config.get("model", "llama2"),
             base_url=config.get("base_url", "http://localhost:11434"),
             temperature=config.get("temperature", 0.7),
-            max_tokens=config.get("max_tokens", 500)
+            max_tokens=config.get("max_tokens", 500),
+            router=config.get("router"),
+            prompt_builder=config.get("prompt_builder"),
+            backend=config.get("backend"),
+            generation_stats=config.get("generation_stats")
         )
     elif model_type == "openai":
         return ChatAI(
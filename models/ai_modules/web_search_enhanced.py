@@ -1,11 +1,30 @@
 """
 Web Search AI Module - Perplexity-style Search with AI Summarization
 Optimized for low-compute laptops
+
+HTML parsing (results page and result pages) is pure CPU work, so it runs in
+a worker pool instead of on the event loop, using lxml (C parser) when it is
+installed and BeautifulSoup's html.parser otherwise. Both produce the same
+text; benchmarks/parse_bench.py checks that on saved pages.
+
+Result pages are read as a stream, at most max_page_bytes of each. With
+lxml the text is extracted while the page arrives (PageTextExtractor) and
+the download stops as soon as enough text was found - usually within the
+first few KB after the page header. Each chunk parses in about a
+millisecond, so this happens on the event loop between reads.
+
+With a cache (backend/search_cache.py), repeated queries reuse their result
+list and pages already read reuse their text; expired pages are revalidated
+with a conditional request instead of being downloaded again.
 """
 
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime
+import asyncio
 import logging
+import multiprocessing
 import re
 
 logger = logging.getLogger(__name__)
@@ -25,6 +44,307 @@ except ImportError:
     BS4_AVAILABLE = False
     logger.info("⚠️  BeautifulSoup not available. Install with: pip install beautifulsoup4")
 
+try:
+    import lxml.html
+    from lxml import etree
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+    logger.info("⚠️  lxml not available (HTML parsing will be slower). Install with: pip install lxml")
+
+
+# ============================================================================
+# HTML PARSING (module-level functions so a process pool can run them)
+# ============================================================================
+
+PAGE_TEXT_MAX_LINES = 50  # Lines of text kept per page
+PAGE_TEXT_MAX_CHARS = 2000  # Characters of text kept per page
+PAGE_CHUNK_BYTES = 16 * 1024  # Page bytes parsed per step while downloading
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+# Page chrome removed before extracting text
+_REMOVED_TAGS = ("script", "style", "nav", "footer", "header")
+# Text BeautifulSoup's get_text() never returns (scripts, styles, templates, ruby annotations)
+_HIDDEN_TEXT_TAGS = frozenset(("script", "style", "template", "rt", "rp"))
+_PAGE_SKIPPED_TAGS = _HIDDEN_TEXT_TAGS | frozenset(_REMOVED_TAGS)
+_XML_DECLARATION = re.compile(r"^\s*<\?xml[^>]*\?>")
+_CLASS_XPATH = './/{tag}[contains(concat(" ", normalize-space(@class), " "), " {name} ")]'
+
+
+def _lxml_document(html: str):
+    """Parse HTML with lxml (None for an empty document)."""
+    try:
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        # lxml refuses str input with an <?xml encoding=...?> declaration
+        return lxml.html.document_fromstring(_XML_DECLARATION.sub("", html, count=1))
+    except etree.ParserError:
+        return None
+
+
+def _lxml_strings(element, skipped_tags=_HIDDEN_TEXT_TAGS):
+    """
+    Text nodes under an element in document order, like BeautifulSoup's
+    _all_strings(): comments and text inside skipped tags are left out,
+    and the element's own tail is not part of it.
+    """
+    todo = [element]
+    while todo:
+        item = todo.pop()
+        if isinstance(item, str):
+            yield item
+            continue
+        if item.tail and item is not element:
+            todo.append(item.tail)  # After the children (stack: pushed first, popped last)
+        if not isinstance(item.tag, str) or item.tag in skipped_tags:
+            continue  # Comment, processing instruction or skipped tag: only its tail counts
+        todo.extend(reversed(item))
+        if item.text:
+            yield item.text
+
+
+def _lxml_get_text(element) -> str:
+    """Same as BeautifulSoup's element.get_text(strip=True)."""
+    return "".join(text.strip() for text in _lxml_strings(element) if text.strip())
+
+
+def html_to_text(html: str, max_lines: int = PAGE_TEXT_MAX_LINES) -> str:
+    """
+    Clean text of a web page: no scripts, styles or page chrome, first max_lines lines.
+    
+    Args:
+        html: Page HTML
+        max_lines: Lines to keep
+        
+    Returns:
+        Text, one paragraph per line
+    """
+    if LXML_AVAILABLE:
+        root = _lxml_document(html)
+        if root is None:
+            return ""
+        lines = []
+        # Stops reading the page as soon as enough lines are found
+        for text in _lxml_strings(root, _PAGE_SKIPPED_TAGS):
+            for line in text.split("\n"):
+                line = line.strip()
+                if line:
+                    lines.append(line)
+                    if len(lines) >= max_lines:
+                        return "\n".join(lines)
+        return "\n".join(lines)
+    
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Remove script and style elements
+    for script in soup(list(_REMOVED_TAGS)):
+        script.decompose()
+    
+    # Get text
+    text = soup.get_text(separator='\n', strip=True)
+    
+    # Clean text
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+    return '\n'.join(lines[:max_lines])
+
+
+class _PageTextTarget:
+    """
+    lxml parser target collecting text like html_to_text(): callbacks arrive
+    in document order while the page is fed, so text is known before the
+    page is complete.
+    """
+    
+    def __init__(self, max_lines: int, max_chars: int):
+        self.max_lines = max_lines
+        self.max_chars = max_chars
+        self.lines: List[str] = []
+        self.chars = 0
+        self._skipped = 0  # Depth inside skipped tags (script, nav, ...)
+        self._text: List[str] = []  # Pieces of the current text node
+    
+    @property
+    def enough(self) -> bool:
+        # chars counts a newline per line, so the joined text is chars - 1 long
+        return len(self.lines) >= self.max_lines or self.chars > self.max_chars
+    
+    def _flush(self):
+        # A text node ends at the next tag or comment
+        if not self._text:
+            return
+        text = "".join(self._text)
+        self._text = []
+        if self._skipped:
+            return
+        for line in text.split("\n"):
+            line = line.strip()
+            if line and not self.enough:
+                self.lines.append(line)
+                self.chars += len(line) + 1
+    
+    def start(self, tag, attrib):
+        self._flush()
+        if tag in _PAGE_SKIPPED_TAGS:
+            self._skipped += 1
+    
+    def end(self, tag):
+        self._flush()
+        if tag in _PAGE_SKIPPED_TAGS:
+            self._skipped = max(0, self._skipped - 1)
+    
+    def data(self, data):
+        self._text.append(data)
+    
+    def comment(self, text):
+        self._flush()
+    
+    def pi(self, target, data=None):
+        self._flush()
+    
+    def close(self):
+        self._flush()
+
+
+class PageTextExtractor:
+    """
+    html_to_text() for a page that is still downloading.
+    
+    Feed the raw bytes as they arrive; feed() returns True once enough text
+    was found and the rest of the page isn't needed. Without lxml the bytes
+    are only collected, and html_to_text() parses them afterwards.
+    
+    Usage:
+        >>> extractor = PageTextExtractor(encoding=response.charset)
+        >>> async for chunk in response.content.iter_chunked(PAGE_CHUNK_BYTES):
+        ...     if extractor.feed(chunk):
+        ...         break
+        >>> text = extractor.close() if extractor.incremental else html_to_text(extractor.received_html())
+    """
+    
+    def __init__(
+        self,
+        encoding: Optional[str] = None,
+        max_lines: int = PAGE_TEXT_MAX_LINES,
+        max_chars: int = PAGE_TEXT_MAX_CHARS
+    ):
+        """
+        Args:
+            encoding: Charset from the Content-Type header (None = detect
+                      from the page, e.g. <meta charset>)
+            max_lines: Lines of text wanted
+            max_chars: Characters of text wanted
+        """
+        self.encoding = encoding
+        self.incremental = LXML_AVAILABLE
+        self._chunks: List[bytes] = []
+        self._pending = b""  # From the last "<" on, held back until the next chunk
+        if self.incremental:
+            self._target = _PageTextTarget(max_lines, max_chars)
+            try:
+                self._parser = etree.HTMLParser(target=self._target, encoding=encoding)
+            except LookupError:
+                self._parser = etree.HTMLParser(target=self._target)  # Unknown charset name: let lxml detect
+    
+    def feed(self, chunk: bytes) -> bool:
+        """Add the next piece of the page; True when enough text was found."""
+        if not self.incremental:
+            self._chunks.append(chunk)
+            return False
+        # libxml2 loses the end of a <script>/<style> when "</script>" is
+        # split between two feeds, so chunks are only cut before a "<"
+        data = self._pending + chunk
+        cut = data.rfind(b"<")
+        if cut < 0:
+            cut = len(data)
+        self._pending = data[cut:]
+        if cut:
+            self._parser.feed(data[:cut])
+        return self._target.enough
+    
+    def close(self) -> str:
+        """Text found so far, one paragraph per line (lxml only)."""
+        try:
+            if self._pending:
+                self._parser.feed(self._pending)
+            self._parser.close()
+        except etree.LxmlError:
+            pass  # Nothing parseable received
+        return "\n".join(self._target.lines)
+    
+    def received_html(self) -> str:
+        """The bytes received so far as text (for html_to_text without lxml)."""
+        return b"".join(self._chunks).decode(self.encoding or "utf-8", errors="replace")
+
+
+def parse_search_results(html: str) -> List[Dict]:
+    """
+    Read the results of a DuckDuckGo HTML results page.
+    
+    Args:
+        html: Results page HTML
+        
+    Returns:
+        List of search results with title, url, snippet
+    """
+    results = []
+    
+    if LXML_AVAILABLE:
+        root = _lxml_document(html)
+        if root is None:
+            return results
+        for result in root.xpath(_CLASS_XPATH.format(tag="div", name="result")):
+            title_elem = result.xpath(_CLASS_XPATH.format(tag="a", name="result__a"))
+            if not title_elem:
+                continue
+            snippet_elem = result.xpath(_CLASS_XPATH.format(tag="a", name="result__snippet"))
+            results.append({
+                "title": _lxml_get_text(title_elem[0]),
+                "url": title_elem[0].get('href', ''),
+                "snippet": _lxml_get_text(snippet_elem[0]) if snippet_elem else ""
+            })
+        return results
+    
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Extract search results
+    for result in soup.find_all('div', class_='result'):
+        try:
+            title_elem = result.find('a', class_='result__a')
+            snippet_elem = result.find('a', class_='result__snippet')
+            
+            if title_elem:
+                title = title_elem.get_text(strip=True)
+                url = title_elem.get('href', '')
+                snippet = snippet_elem.get_text(strip=True) if snippet_elem else ""
+                
+                results.append({
+                    "title": title,
+                    "url": url,
+                    "snippet": snippet
+                })
+        except:
+            continue
+    
+    return results
+
+
+def create_parse_executor(workers: int = 2, kind: str = "thread") -> Executor:
+    """
+    Worker pool for HTML parsing.
+    
+    Args:
+        workers: Parallel parses
+        kind: "thread" (lxml parses in C, so threads barely hold up the
+              event loop) or "process" (fully separate CPUs; workers are
+              started with "spawn" and import this module fresh)
+              
+    Returns:
+        concurrent.futures Executor
+    """
+    if kind == "process":
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="html-parse")
+
 
 class WebSearchAI:
     """
@@ -48,7 +368,17 @@ class WebSearchAI:
         self,
         chat_ai=None,
         max_results: int = 5,
-        timeout: int = 10
+        timeout: int = 10,
+        llm_backend=None,
+        search_url: str = "https://html.duckduckgo.com/html/",
+        span: Optional[Callable] = None,
+        max_concurrency: int = 5,
+        per_host_limit: int = 2,
+        deadline: float = 8.0,
+        parse_executor: Optional[Executor] = None,
+        max_page_bytes: int = 256 * 1024,
+        max_content_length: int = 5 * 1024 * 1024,
+        cache=None
     ):
         """
         Initialize Web Search AI.
@@ -57,10 +387,37 @@ class WebSearchAI:
             chat_ai: ChatAI instance for summarization
             max_results: Number of search results to process
             timeout: Request timeout in seconds
+            llm_backend: LLM backend (backend/llm_backends.py) for summarization;
+                         used instead of chat_ai when set
+            search_url: DuckDuckGo HTML endpoint (point it at a mock for benchmarks)
+            span: span(name) -> context manager that times a phase
+                  (backend/request_timing.py: search_fetch, search_parse, llm)
+            max_concurrency: Result pages downloaded at the same time
+            per_host_limit: Connections to any one site at the same time
+            deadline: Seconds the page downloads of one search may take;
+                      pages that haven't arrived by then are skipped
+            parse_executor: Worker pool for HTML parsing (see
+                            create_parse_executor; None = asyncio's default
+                            thread pool)
+            max_page_bytes: Bytes read of each result page at most
+            max_content_length: Pages announcing a larger Content-Length
+                                are skipped without reading them
+            cache: SearchCache (backend/search_cache.py) for result lists
+                   and page texts (None = no caching)
         """
         self.chat_ai = chat_ai
+        self.span = span or (lambda name: nullcontext())
+        self.llm_backend = llm_backend
+        self.search_url = search_url
         self.max_results = max_results
         self.timeout = timeout
+        self.max_concurrency = max(1, max_concurrency)
+        self.per_host_limit = max(1, per_host_limit)
+        self.deadline = deadline
+        self.parse_executor = parse_executor
+        self.max_page_bytes = max_page_bytes
+        self.max_content_length = max_content_length
+        self.cache = cache
         
         logger.info(f"WebSearchAI initialized: max_results={max_results}")
     
@@ -115,7 +472,7 @@ class WebSearchAI:
             }
             
             # Optionally summarize with AI
-            if summarize and self.chat_ai and contents:
+            if summarize and (self.llm_backend or self.chat_ai) and contents:
                 summary = await self._summarize_results(query, contents, search_results)
                 response["summary"] = summary
                 response["ai_generated"] = True
@@ -146,103 +503,176 @@ class WebSearchAI:
             List of search results with title, url, snippet
         """
         try:
+            if self.cache:
+                cached = await self.cache.get_results(query)
+                if cached is not None:
+                    logger.info("Search results from cache: %.50s", query)
+                    return cached
+            
             # DuckDuckGo HTML search
-            url = "https://html.duckduckgo.com/html/"
             params = {"q": query}
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    url,
-                    data=params,
-                    timeout=aiohttp.ClientTimeout(total=self.timeout)
-                ) as response:
-                    html = await response.text()
-            
-            # Parse results
-            soup = BeautifulSoup(html, 'html.parser')
-            results = []
+            with self.span("search_fetch"):
+                async with aiohttp.ClientSession() as session:
+                    async with session.post(
+                        self.search_url,
+                        data=params,
+                        timeout=aiohttp.ClientTimeout(total=self.timeout)
+                    ) as response:
+                        html = await response.text()
             
-            # Extract search results
-            for result in soup.find_all('div', class_='result'):
-                try:
-                    title_elem = result.find('a', class_='result__a')
-                    snippet_elem = result.find('a', class_='result__snippet')
-                    
-                    if title_elem:
-                        title = title_elem.get_text(strip=True)
-                        url = title_elem.get('href', '')
-                        snippet = snippet_elem.get_text(strip=True) if snippet_elem else ""
-                        
-                        results.append({
-                            "title": title,
-                            "url": url,
-                            "snippet": snippet
-                        })
-                except:
-                    continue
+            # Parse results (off the event loop)
+            with self.span("search_parse"):
+                results = await self._parse(parse_search_results, html)
             
+            if self.cache:
+                await self.cache.put_results(query, results)
             return results
             
         except Exception as e:
             logger.error(f"DuckDuckGo search error: {e}")
             return []
     
+    async def _parse(self, function: Callable, html: str):
+        """Run an HTML parsing function in the parse pool, keeping the event loop free."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.parse_executor, function, html)
+    
+    def close(self):
+        """Shut down the parse pool (app shutdown)."""
+        if self.parse_executor is not None:
+            self.parse_executor.shutdown(cancel_futures=True)
+    
+    async def _fetch_page(self, session, semaphore: asyncio.Semaphore, result: Dict) -> Optional[Dict]:
+        """
+        Download one search result page and extract its text.
+        
+        Only HTML pages are read, and only until enough text was found or
+        max_page_bytes arrived; the rest of the page is never downloaded.
+        A fresh cached text is used without any request; an expired one is
+        revalidated (304 Not Modified = use the cached text).
+        
+        Args:
+            session: Shared aiohttp session of this search
+            semaphore: Limits how many pages download at once
+            result: Search result (title, url, snippet)
+            
+        Returns:
+            {"url", "title", "content"}, or None if the page couldn't be used
+        """
+        url = result.get('url', '')
+        
+        # Skip invalid URLs
+        if not url or not url.startswith('http'):
+            return None
+        
+        try:
+            cached = await self.cache.get_page(url) if self.cache else None
+            if cached and cached["fresh"]:
+                return {"url": url, "title": result['title'], "content": cached["text"]}
+            
+            headers = {'User-Agent': 'Mozilla/5.0'}
+            if cached:
+                if cached["etag"]:
+                    headers['If-None-Match'] = cached["etag"]
+                if cached["last_modified"]:
+                    headers['If-Modified-Since'] = cached["last_modified"]
+            
+            async with semaphore:
+                logger.info("Extracting content from: %.50s...", url)
+                async with session.get(url, headers=headers) as response:
+                    cache_control = response.headers.get('Cache-Control')
+                    if response.status == 304 and cached:
+                        await self.cache.revalidated(url, cache_control)
+                        return {"url": url, "title": result['title'], "content": cached["text"]}
+                    if response.status != 200:
+                        return None
+                    # No Content-Type header: try it as HTML
+                    if 'Content-Type' in response.headers and response.content_type not in HTML_CONTENT_TYPES:
+                        logger.info("Skipping %.50s: not HTML (%s)", url, response.content_type)
+                        return None
+                    if response.content_length and response.content_length > self.max_content_length:
+                        logger.info("Skipping %.50s: %d KB page", url, response.content_length // 1024)
+                        return None
+                    
+                    extractor = PageTextExtractor(encoding=response.charset)
+                    received = 0
+                    enough = False
+                    async for chunk in response.content.iter_chunked(PAGE_CHUNK_BYTES):
+                        chunk = chunk[:self.max_page_bytes - received]
+                        received += len(chunk)
+                        with self.span("search_parse"):
+                            enough = extractor.feed(chunk)
+                        if enough or received >= self.max_page_bytes:
+                            break
+                    # Leaving the block early closes the connection: the rest isn't downloaded
+                    logger.debug("Read %d KB of %.50s%s", received // 1024, url, " (enough text)" if enough else "")
+                    etag = response.headers.get('ETag')
+                    last_modified = response.headers.get('Last-Modified')
+            
+            with self.span("search_parse"):
+                if extractor.incremental:
+                    clean_text = extractor.close()
+                else:
+                    # BeautifulSoup can't parse a stream: parse what was received
+                    clean_text = await self._parse(html_to_text, extractor.received_html())
+            clean_text = clean_text[:PAGE_TEXT_MAX_CHARS]
+            
+            if self.cache:
+                await self.cache.put_page(url, clean_text, cache_control, etag, last_modified)
+            
+            return {
+                "url": url,
+                "title": result['title'],
+                "content": clean_text
+            }
+        
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Failed to extract from %s: %s", url, str(e) or type(e).__name__)
+            return None
+    
     async def _extract_contents(self, search_results: List[Dict]) -> List[Dict]:
         """
         Extract clean text content from search result URLs.
         
+        Pages are fetched concurrently over one session: at most
+        max_concurrency at a time and per_host_limit per site. Whatever has
+        arrived when the deadline passes is used and slower pages are
+        cancelled, so a search takes about as long as its slowest page
+        (at most `deadline`), not the sum of all pages.
+        
         Args:
             search_results: List of search results
             
         Returns:
-            List of extracted contents
+            List of extracted contents, in search result order
         """
-        contents = []
+        if not search_results:
+            return []
         
-        for result in search_results:
-            try:
-                url = result['url']
-                
-                # Skip invalid URLs
-                if not url or not url.startswith('http'):
-                    continue
-                
-                logger.info(f"Extracting content from: {url[:50]}...")
-                
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(
-                        url,
-                        timeout=aiohttp.ClientTimeout(total=self.timeout),
-                        headers={'User-Agent': 'Mozilla/5.0'}
-                    ) as response:
-                        if response.status == 200:
-                            html = await response.text()
-                            
-                            # Parse HTML
-                            soup = BeautifulSoup(html, 'html.parser')
-                            
-                            # Remove script and style elements
-                            for script in soup(["script", "style", "nav", "footer", "header"]):
-                                script.decompose()
-                            
-                            # Get text
-                            text = soup.get_text(separator='\n', strip=True)
-                            
-                            # Clean text
-                            lines = [line.strip() for line in text.split('\n') if line.strip()]
-                            clean_text = '\n'.join(lines[:50])  # First 50 lines
-                            
-                            contents.append({
-                                "url": url,
-                                "title": result['title'],
-                                "content": clean_text[:2000]  # Max 2000 chars per source
-                            })
-                
-            except Exception as e:
-                logger.warning(f"Failed to extract from {url}: {e}")
-                continue
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.per_host_limit)
+        client_timeout = aiohttp.ClientTimeout(total=min(self.timeout, self.deadline))
         
-        return contents
+        async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+            tasks = [
+                asyncio.ensure_future(self._fetch_page(session, semaphore, result))
+                for result in search_results
+            ]
+            # Wall time of all downloads together (they overlap)
+            with self.span("search_fetch"):
+                done, pending = await asyncio.wait(tasks, timeout=self.deadline)
+            
+            if pending:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                logger.warning(f"⏱️ {len(pending)} page(s) skipped: not loaded within the {self.deadline}s search deadline")
+        
+        # Search ranking order, not arrival order
+        return [task.result() for task in tasks if task in done and task.result()]
     
     async def _summarize_results(
         self,
@@ -282,10 +712,21 @@ Include:
 
 Answer:"""
             
-            if self.chat_ai:
+            system_prompt = "You are a helpful research assistant. Summarize web search results accurately and cite sources using [1], [2], etc."
+            
+            if self.llm_backend:
+                # One-off request: no conversation history, no model routing
+                with self.span("llm"):
+                    summary = await self.llm_backend.generate([
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": prompt}
+                    ])
+                return summary or f"AI summarization failed ({self.llm_backend.name} backend did not answer)"
+            elif self.chat_ai:
                 summary = await self.chat_ai.generate_response(
                     message=prompt,
-                    system_prompt="You are a helpful research assistant. Summarize web search results accurately and cite sources using [1], [2], etc."
+                    system_prompt=system_prompt,
+                    history=[]
                 )
                 return summary
             else:
@@ -311,7 +752,18 @@ Answer:"""
 
 def create_web_search_ai(
     chat_ai=None,
-    max_results: int = 5
+    max_results: int = 5,
+    llm_backend=None,
+    search_url: str = "https://html.duckduckgo.com/html/",
+    span: Optional[Callable] = None,
+    max_concurrency: int = 5,
+    per_host_limit: int = 2,
+    deadline: float = 8.0,
+    parse_workers: int = 2,
+    parse_pool: str = "thread",
+    max_page_bytes: int = 256 * 1024,
+    max_content_length: int = 5 * 1024 * 1024,
+    cache=None
 ) -> WebSearchAI:
     """
     Factory function for web search AI.
@@ -319,11 +771,32 @@ def create_web_search_ai(
     Args:
         chat_ai: ChatAI instance for summarization
         max_results: Number of results to process
+        llm_backend: LLM backend for summarization (preferred over chat_ai)
+        search_url: DuckDuckGo HTML endpoint
+        span: Phase timer for Server-Timing (optional)
+        max_concurrency: Result pages downloaded at the same time
+        per_host_limit: Connections to any one site at the same time
+        deadline: Seconds allowed for a search's page downloads
+        parse_workers: HTML parsing workers
+        parse_pool: "thread" or "process" (see create_parse_executor)
+        max_page_bytes: Bytes read of each result page at most
+        max_content_length: Larger pages (by Content-Length) are skipped
+        cache: SearchCache for result lists and page texts (optional)
         
     Returns:
         WebSearchAI instance
     """
     return WebSearchAI(
         chat_ai=chat_ai,
-        max_results=max_results
+        max_results=max_results,
+        llm_backend=llm_backend,
+        search_url=search_url,
+        span=span,
+        max_concurrency=max_concurrency,
+        per_host_limit=per_host_limit,
+        deadline=deadline,
+        parse_executor=create_parse_executor(parse_workers, parse_pool),
+        max_page_bytes=max_page_bytes,
+        max_content_length=max_content_length,
+        cache=cache
     )